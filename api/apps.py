@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from appliance_module.servicies_factories.request_metrics import RequestMetrics
+
+        connection_created.connect(RequestMetrics.install, dispatch_uid="request_metrics_install")
@@ -0,0 +1,193 @@
+"""
+Async variants of the auth and appliance endpoints for the ASGI server.
+
+Lookups use Django's async ORM; only the transactional start/finish core
+runs through sync_to_async. Responses match the synchronous views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from appliance_module.model.room import Room
+from appliance_module.servicies_factories.appliance_catalog import ApplianceCatalog
+from appliance_module.servicies_factories.appliance_service import ApplianceService
+from appliance_module.servicies_factories.appliance_service_factory import ApplianceServiceFactory
+from appliance_module.servicies_factories.auth_service import AuthService
+from appliance_module.servicies_factories.db_router import ReadConsistency
+from appliance_module.servicies_factories.endpoint_events import EndpointEvents
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+from appliance_module.servicies_factories.token_registry import EndpointTokenRegistry
+from .serializers.serializer import (
+    StartApplianceSerializer,
+    FinishApplianceSerializer,
+    AuthenticateRoomSerializer,
+    AuthorizeRoomSerializer,
+    HeartbeatSerializer,
+)
+
+
+def _validated(request, serializer_class):
+    """
+    Returns (validated data, None) or (None, error response).
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None, JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        return None, JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncEndpointHeartbeatView(View):
+
+    async def post(self, request):
+        data, error = _validated(request, HeartbeatSerializer)
+        if error:
+            return error
+        try:
+            await AuthService.averify_endpoint(data["token"], data["endpoint_id"])
+            await EndpointPresence.abeat(data["endpoint_id"], request.META.get("REMOTE_ADDR"))
+            return JsonResponse({"status": "online"},
+                                status=status.HTTP_200_OK)
+        except Exception as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncEndpointEventsView(View):
+    """
+    Server-sent events for one endpoint: start / finish / abort of its
+    appliances, so the endpoint does not have to poll. The endpoint token
+    comes as "Authorization: Bearer <token>" (not in the URL, which ends up
+    in access logs); it is checked again with every keep-alive, so a
+    rotation closes open streams. An open stream also counts as a heartbeat.
+    """
+
+    async def get(self, request, endpoint_id):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        try:
+            await AuthService.averify_endpoint(token, endpoint_id)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_403_FORBIDDEN)
+
+        ip = request.META.get("REMOTE_ADDR")
+
+        async def stream():
+            await EndpointPresence.abeat(endpoint_id, ip)
+            yield "retry: 5000\n\n"
+            async for event in EndpointEvents.listen(endpoint_id, settings.ENDPOINT_EVENTS_KEEPALIVE):
+                if event is None:
+                    try:
+                        await AuthService.averify_endpoint(token, endpoint_id)
+                    except ValueError:
+                        return
+                    await EndpointPresence.abeat(endpoint_id, ip)
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+        return StreamingHttpResponse(
+            stream(),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAuthChallengeView(View):
+
+    async def post(self, request):
+        data, error = _validated(request, AuthenticateRoomSerializer)
+        if error:
+            return error
+        try:
+            with ReadConsistency.replica():
+                if not await Room.objects.filter(key=data["room_num"]).aexists():
+                    raise Room.DoesNotExist("Room matching query does not exist.")
+                version = await EndpointTokenRegistry.aversion(data["endpoint_id"])
+            challenge_token = AuthService.encode({**data, "ver": version}, "challenge")
+            return JsonResponse({"token": challenge_token},
+                                status=status.HTTP_200_OK)
+        except Exception as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAuthVerifyView(View):
+
+    async def post(self, request):
+        data, error = _validated(request, AuthorizeRoomSerializer)
+        if error:
+            return error
+        try:
+            with ReadConsistency.replica():
+                decoded = await AuthService.averify_token(data["token"])
+                access_token, balance = await AuthService.aauthorize_room(decoded, data["auth_code"])
+                appliances = await ApplianceCatalog.aitems()
+            return JsonResponse({"token": access_token,
+                                 "balance": balance,
+                                 "appliances": appliances},
+                                status=status.HTTP_200_OK)
+        except Exception as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncApplianceStartView(View):
+
+    async def post(self, request):
+        data, error = _validated(request, StartApplianceSerializer)
+        if error:
+            return error
+        try:
+            token_payload = await AuthService.averify_token(data["token"])
+            appliance = await ApplianceCatalog.aget(data["appliance_name"])
+            remaining = await sync_to_async(ApplianceService.claim_start)(
+                endpoint_id=token_payload["endpoint_id"],
+                appliance_id=appliance.appliance_id,
+                room_num=token_payload["room_num"],
+                units=data["units"],
+                price=100*data["price"],
+            )
+            token = AuthService.encode(token_payload, "start", data)
+            return JsonResponse({"newbalance": remaining, "token": token},
+                                status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncApplianceFinishView(View):
+
+    async def post(self, request):
+        data, error = _validated(request, FinishApplianceSerializer)
+        if error:
+            return error
+        try:
+            token_payload = await AuthService.averify_token(data["token"])
+            await sync_to_async(ApplianceServiceFactory.finish_run)(
+                appliance_name=token_payload["appliance_name"],
+                endpoint_id=token_payload["endpoint_id"],
+                final_units=data["units"],
+                final_price=100*data["price"],
+                aborted=data["aborted"],
+            )
+            return JsonResponse({"status": "finished"},
+                                status=status.HTTP_200_OK)
+        except Exception as e:
+            return JsonResponse({"error": str(e)},
+                                status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,96 @@
+"""
+Seed data shared by the benchmark commands.
+
+Everything is created under recognizable keys (appliance BENCH_APPLIANCE,
+rooms from BENCH_ROOM_BASE) so cleanup() removes only benchmark rows.
+"""
+import random
+
+import pyotp
+
+from appliance_module.model.appliance import Appliance
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.roomtotp import RoomTOTP
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.model.usage import DailyUsage
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+
+
+BENCH_APPLIANCE = "bench-washer"
+BENCH_ROOM_BASE = 9_000_000_000
+BASE32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+
+
+def seed(terminals: int, rooms: int, seed: int | None = None):
+    """
+    Creates one benchmark appliance, `terminals` endpoints with a state row
+    each and `rooms` funded rooms with TOTP secrets.
+
+    Returns:
+        (endpoint ids, [(room key, pyotp.TOTP)])
+    """
+    cleanup()
+    rng = random.Random(seed)
+
+    appliance = Appliance.objects.create(name=BENCH_APPLIANCE, price_per_unit=1)
+    endpoints = Endpoint.objects.bulk_create(Endpoint() for _ in range(terminals))
+    EndpointApplianceStateRoom.objects.bulk_create(
+        EndpointApplianceStateRoom(endpoint=e, appliance=appliance) for e in endpoints
+    )
+    for e in endpoints:
+        EndpointPresence.beat(e.endpoint_id, "127.0.0.1")
+
+    room_objs = Room.objects.bulk_create(
+        Room(key=BENCH_ROOM_BASE + i, balance=10_000_000) for i in range(rooms)
+    )
+    RoomLedger.objects.bulk_create(
+        RoomLedger(room=r, amount=r.balance, kind=RoomLedger.Kind.OPENING) for r in room_objs
+    )
+    totps = RoomTOTP.objects.bulk_create(
+        RoomTOTP(room=r, secret="".join(rng.choice(BASE32) for _ in range(32))) for r in room_objs
+    )
+    return (
+        [e.endpoint_id for e in endpoints],
+        [(t.room.key, pyotp.TOTP(t.secret)) for t in totps],
+    )
+
+
+def cleanup() -> None:
+    rooms = Room.objects.filter(key__gte=BENCH_ROOM_BASE)
+    appliances = Appliance.objects.filter(name=BENCH_APPLIANCE)
+    endpoint_ids = list(
+        EndpointApplianceStateRoom.objects.filter(appliance__in=appliances)
+        .values_list("endpoint_id", flat=True)
+    )
+    EndpointApplianceStateRoom.objects.filter(appliance__in=appliances).delete()
+    RoomLedger.objects.filter(room__in=rooms).delete()
+    DailyUsage.objects.filter(appliance__in=appliances).delete()
+    RunsLog.objects.filter(appliance__in=appliances).delete()
+    RoomTOTP.objects.filter(room__in=rooms).delete()
+    rooms.delete()
+    Endpoint.objects.filter(pk__in=endpoint_ids).delete()
+    appliances.delete()
+
+
+def flow_steps(prefix: str = ""):
+    return [
+        ("challenge", f"/api/{prefix}auth/challenge/"),
+        ("verify", f"/api/{prefix}auth/verify/"),
+        ("start", f"/api/{prefix}appliance/start/"),
+        ("finish", f"/api/{prefix}appliance/finish/"),
+    ]
+
+
+def flow_bodies(endpoint_id: int, room):
+    """
+    Request bodies of one flow; all but the first take the token returned
+    by the previous step.
+    """
+    key, totp = room
+    yield {"room_num": key, "endpoint_id": endpoint_id}
+    yield lambda token: {"token": token, "auth_code": int(totp.now())}
+    yield lambda token: {"token": token, "appliance_name": BENCH_APPLIANCE, "units": 60, "price": 1}
+    yield lambda token: {"token": token, "units": 60, "price": 1}
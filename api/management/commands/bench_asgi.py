@@ -0,0 +1,102 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from api.management.bench_data import cleanup, flow_bodies, flow_steps, seed
+
+
+HEADERS = {"host": "localhost"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the synchronous (WSGI) and async (ASGI) API paths by running "
+        "challenge -> verify -> start -> finish for N concurrent terminals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--terminals", type=int, default=50)
+        parser.add_argument("--rounds", type=int, default=3)
+        parser.add_argument("--keep", action="store_true",
+                            help="Keep seeded rooms/endpoints after the run.")
+
+    def handle(self, *args, **options):
+        terminals = options["terminals"]
+        rounds = options["rounds"]
+
+        endpoints, rooms = seed(terminals, rooms=2 * terminals * rounds)
+        try:
+            sync_rooms, async_rooms = rooms[: len(rooms) // 2], rooms[len(rooms) // 2:]
+            self._report("wsgi", self._run_sync(endpoints, sync_rooms, rounds))
+            self._report("asgi", asyncio.run(self._run_async(endpoints, async_rooms, rounds)))
+        finally:
+            if not options["keep"]:
+                cleanup()
+
+    # -----------------------------
+
+    def _run_sync(self, endpoints, rooms, rounds):
+        timings = {name: [] for name, _ in flow_steps("")}
+
+        def flow(endpoint_id, room):
+            client = Client(headers=HEADERS)
+            token = None
+            for (name, url), body in zip(flow_steps(""), flow_bodies(endpoint_id, room)):
+                payload = body if token is None else body(token)
+                began = time.perf_counter()
+                response = client.post(url, payload, content_type="application/json")
+                timings[name].append(time.perf_counter() - began)
+                token = response.json().get("token")
+                if response.status_code >= 300:
+                    return False
+            return True
+
+        began = time.perf_counter()
+        ok = 0
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as pool:
+            for r in range(rounds):
+                batch = rooms[r * len(endpoints):(r + 1) * len(endpoints)]
+                ok += sum(pool.map(flow, endpoints, batch))
+        return ok, time.perf_counter() - began, timings
+
+    async def _run_async(self, endpoints, rooms, rounds):
+        timings = {name: [] for name, _ in flow_steps("async/")}
+        client = AsyncClient(headers=HEADERS)
+
+        async def flow(endpoint_id, room):
+            token = None
+            for (name, url), body in zip(flow_steps("async/"), flow_bodies(endpoint_id, room)):
+                payload = body if token is None else body(token)
+                began = time.perf_counter()
+                response = await client.post(url, payload, content_type="application/json")
+                timings[name].append(time.perf_counter() - began)
+                token = response.json().get("token")
+                if response.status_code >= 300:
+                    return False
+            return True
+
+        began = time.perf_counter()
+        ok = 0
+        for r in range(rounds):
+            batch = rooms[r * len(endpoints):(r + 1) * len(endpoints)]
+            ok += sum(await asyncio.gather(*(flow(e, room) for e, room in zip(endpoints, batch))))
+        return ok, time.perf_counter() - began, timings
+
+    # -----------------------------
+
+    def _report(self, label, result):
+        ok, elapsed, timings = result
+        self.stdout.write(f"{label}: {ok} flows in {elapsed:.2f}s ({ok / elapsed:.1f} flows/s)")
+        for name, samples in timings.items():
+            if not samples:
+                continue
+            samples.sort()
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            self.stdout.write(
+                f"  {name:<10} p50={statistics.median(samples) * 1000:7.1f}ms "
+                f"p95={p95 * 1000:7.1f}ms"
+            )
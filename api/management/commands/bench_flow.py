@@ -0,0 +1,240 @@
+import json
+import platform
+import threading
+import time
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+
+from api.management.bench_data import cleanup, flow_bodies, flow_steps, seed
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+
+
+HEADERS = {"host": "localhost"}
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: list[float], p: int) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, -(-p * len(samples) // 100))
+    return samples[rank - 1]
+
+
+class QueryCounter:
+    """
+    execute_wrapper counting statements and their time on one connection.
+    """
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - began
+            self.queries += 1
+
+
+class LockWaitSampler(threading.Thread):
+    """
+    Samples pg_stat_activity for backends of this database waiting on a
+    heavyweight lock; waiting backends x interval estimates total lock wait.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.waiting_samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self._stop_event.wait(self.interval):
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                    )
+                    self.waiting_samples += cursor.fetchone()[0]
+        finally:
+            connection.close()
+
+    def stop(self) -> float:
+        self._stop_event.set()
+        self.join()
+        return self.waiting_samples * self.interval
+
+
+class Command(BaseCommand):
+    help = (
+        "End-to-end benchmark: N concurrent terminals each run challenge -> verify -> "
+        "start -> finish for R rounds. Reports throughput, p50/p95/p99 latency, "
+        "queries per request and lock wait per step; --save writes a JSON baseline, "
+        "--compare checks a run against one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--terminals", type=int, default=20)
+        parser.add_argument("--rounds", type=int, default=10)
+        parser.add_argument("--warmup", type=int, default=1,
+                            help="Rounds per terminal run before measuring.")
+        parser.add_argument("--seed", type=int, default=1, help="Seed for generated TOTP secrets.")
+        parser.add_argument("--save", metavar="PATH", help="Write the result as JSON baseline.")
+        parser.add_argument("--compare", metavar="PATH", help="Baseline JSON to compare against.")
+        parser.add_argument("--threshold", type=float, default=20.0,
+                            help="Allowed p95 / queries regression in percent for --compare.")
+        parser.add_argument("--keep", action="store_true",
+                            help="Keep seeded rooms/endpoints after the run.")
+
+    def handle(self, *args, **options):
+        terminals = options["terminals"]
+        rounds = options["rounds"]
+        warmup = options["warmup"]
+
+        endpoints, rooms = seed(terminals, terminals * (rounds + warmup), seed=options["seed"])
+        try:
+            if warmup:
+                self._run(endpoints, rooms[: terminals * warmup], warmup)
+            result = self._run(endpoints, rooms[terminals * warmup:], rounds)
+        finally:
+            if not options["keep"]:
+                cleanup()
+
+        result["config"] = {
+            "terminals": terminals,
+            "rounds": rounds,
+            "warmup": warmup,
+            "seed": options["seed"],
+            "database": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        self._report(result)
+
+        if options["save"]:
+            with open(options["save"], "w", encoding="utf-8") as out:
+                json.dump(result, out, indent=2)
+            self.stdout.write(f"Baseline written to {options['save']}")
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline:
+                self._compare(json.load(baseline), result, options["threshold"])
+
+    # -----------------------------
+
+    def _run(self, endpoints, rooms, rounds):
+        steps = flow_steps("")
+        samples = {name: [] for name, _ in steps}
+        queries = {name: [] for name, _ in steps}
+        db_time = {name: 0.0 for name, _ in steps}
+        failures = []
+        lock = threading.Lock()
+
+        def terminal(index, endpoint_id):
+            client = Client(headers=HEADERS)
+            try:
+                for r in range(rounds):
+                    room = rooms[r * len(endpoints) + index]
+                    EndpointPresence.beat(endpoint_id, "127.0.0.1")
+                    token = None
+                    for (name, url), body in zip(steps, flow_bodies(endpoint_id, room)):
+                        payload = body if token is None else body(token)
+                        counter = QueryCounter()
+                        with connection.execute_wrapper(counter):
+                            began = time.perf_counter()
+                            response = client.post(url, payload, content_type="application/json")
+                            elapsed = time.perf_counter() - began
+                        with lock:
+                            samples[name].append(elapsed)
+                            queries[name].append(counter.queries)
+                            db_time[name] += counter.seconds
+                        if response.status_code >= 300:
+                            with lock:
+                                failures.append(f"{name}: {response.status_code} {response.content[:200]!r}")
+                            break
+                        token = response.json().get("token")
+            finally:
+                connections.close_all()
+
+        sampler = LockWaitSampler() if connection.vendor == "postgresql" else None
+        if sampler:
+            sampler.start()
+        threads = [
+            threading.Thread(target=terminal, args=(i, endpoint_id))
+            for i, endpoint_id in enumerate(endpoints)
+        ]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        lock_wait = sampler.stop() if sampler else None
+
+        flows = len(samples["finish"]) - sum(f.startswith("finish") for f in failures)
+        result = {
+            "elapsed_s": round(elapsed, 3),
+            "flows": flows,
+            "flows_per_s": round(flows / elapsed, 2),
+            "requests_per_s": round(sum(map(len, samples.values())) / elapsed, 2),
+            "lock_wait_s": None if lock_wait is None else round(lock_wait, 4),
+            "failures": failures[:20],
+            "steps": {},
+        }
+        for name, values in samples.items():
+            values.sort()
+            count = len(values) or 1
+            result["steps"][name] = {
+                "requests": len(values),
+                **{f"p{p}_ms": round(percentile(values, p) * 1000, 2) for p in PERCENTILES},
+                "queries_per_request": round(sum(queries[name]) / count, 2),
+                "max_queries": max(queries[name], default=0),
+                "db_ms_per_request": round(db_time[name] * 1000 / count, 3),
+            }
+        return result
+
+    # -----------------------------
+
+    def _report(self, result):
+        self.stdout.write(
+            f"{result['flows']} flows in {result['elapsed_s']}s: "
+            f"{result['flows_per_s']} flows/s, {result['requests_per_s']} req/s"
+        )
+        if result["lock_wait_s"] is not None:
+            self.stdout.write(f"lock wait (sampled): {result['lock_wait_s']}s")
+        for name, step in result["steps"].items():
+            self.stdout.write(
+                f"  {name:<10} p50={step['p50_ms']:7.1f}ms p95={step['p95_ms']:7.1f}ms "
+                f"p99={step['p99_ms']:7.1f}ms queries={step['queries_per_request']:5.2f} "
+                f"db={step['db_ms_per_request']:6.2f}ms"
+            )
+        for failure in result["failures"]:
+            self.stderr.write(f"  failed {failure}")
+
+    def _compare(self, baseline, result, threshold):
+        regressions = []
+        for name, step in result["steps"].items():
+            base = baseline["steps"].get(name)
+            if not base:
+                continue
+            for metric in ("p95_ms", "queries_per_request"):
+                before, after = base[metric], step[metric]
+                change = (after - before) / before * 100 if before else 0.0
+                self.stdout.write(f"  {name:<10} {metric:<20} {before:9.2f} -> {after:9.2f} ({change:+.1f}%)")
+                if change > threshold:
+                    regressions.append(f"{name} {metric} {change:+.1f}%")
+
+        if regressions:
+            raise CommandError("Regressed over baseline: " + ", ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Within baseline"))
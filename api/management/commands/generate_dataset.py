@@ -0,0 +1,448 @@
+import json
+import random
+import tempfile
+import time as clock
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from api.management.bench_data import BASE32
+from appliance_module.model.appliance import Appliance
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.roomtotp import RoomTOTP
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.servicies_factories.runs_partitions import RunsLogPartitions, month_start
+from bank_module.addBalance import update_rooms_from_stream
+from bank_module.models import ValidPayments
+
+
+# name, price per unit, programs (units = seconds), program weights, share of endpoints
+APPLIANCES = (
+    ("washer", 1, (1800, 2700, 3600, 5400), (2, 4, 3, 1), 0.6),
+    ("dryer", 1, (1800, 2700, 3600), (3, 3, 2), 0.4),
+)
+# Monday .. Sunday
+WEEKDAY_WEIGHTS = (0.9, 0.9, 0.95, 1.0, 0.9, 1.25, 1.3)
+HOUR_WEIGHTS = (
+    0.3, 0.15, 0.05, 0.02, 0.02, 0.05, 0.3, 0.8, 1.2, 1.3, 1.1, 1.0,
+    1.0, 1.0, 1.1, 1.2, 1.4, 1.7, 2.0, 2.2, 2.0, 1.6, 1.0, 0.6,
+)
+ABORTED_SHARE = 0.04
+# top-ups in CZK and their weights
+PAYMENT_AMOUNTS = ((100, 1), (200, 3), (300, 2), (500, 3), (1000, 1))
+INVALID_PAYMENT_SHARE = 0.02
+FOREIGN_CURRENCY_SHARE = 0.01
+
+
+def season(day: date) -> float:
+    """
+    Relative load of a day: summer break and the Christmas holidays are quiet.
+    """
+    if day.month in (7, 8):
+        return 0.25
+    if (day.month == 12 and day.day >= 20) or (day.month == 1 and day.day <= 5):
+        return 0.4
+    return 1.0
+
+
+def allocate(total: int, weights: list[float]) -> list[int]:
+    """
+    Splits total into integer parts proportional to weights (largest remainder).
+    """
+    scale = total / sum(weights)
+    parts = [w * scale for w in weights]
+    counts = [int(p) for p in parts]
+    by_remainder = sorted(range(len(parts)), key=lambda i: counts[i] - parts[i])
+    for i in by_remainder[: total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class TableWriter:
+    """
+    Bulk row writer: COPY on PostgreSQL (psycopg 3), batched executemany
+    elsewhere. Rows are written as given, so auto_now_add columns keep the
+    generated historical times.
+    """
+
+    def __init__(self, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.copy = connection.vendor == "postgresql"
+
+    def write(self, table: str, columns: tuple[str, ...], rows) -> int:
+        qn = connection.ops.quote_name
+        column_list = ", ".join(qn(c) for c in columns)
+        count = 0
+        with connection.cursor() as cursor:
+            if self.copy and hasattr(cursor.cursor, "copy"):
+                with cursor.cursor.copy(f"COPY {qn(table)} ({column_list}) FROM STDIN") as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                        count += 1
+                return count
+
+            adapt = connection.ops.adapt_datetimefield_value
+            sql = f"INSERT INTO {qn(table)} ({column_list}) VALUES ({', '.join(['%s'] * len(columns))})"
+            batch = []
+            for row in rows:
+                batch.append([adapt(v) if isinstance(v, datetime) else v for v in row])
+                if len(batch) >= self.batch_size:
+                    cursor.executemany(sql, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        return count
+
+    def reserve_ids(self, model, count: int) -> int:
+        """
+        Reserves count primary keys of model for explicit inserts. Call in
+        a transaction that also writes the rows.
+
+        Returns:
+            The first reserved id.
+        """
+        table = model._meta.db_table
+        pk = model._meta.pk.column
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # blocks concurrent inserts, which take their ids from the same sequence
+                cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, %s), "
+                    "nextval(pg_get_serial_sequence(%s, %s)) + %s - 1)",
+                    [table, pk, table, pk, count],
+                )
+                return cursor.fetchone()[0] - count + 1
+            cursor.execute(f"SELECT COALESCE(MAX({pk}), 0) FROM {table}")
+            return cursor.fetchone()[0] + 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a deterministic synthetic dataset for scale testing: rooms with "
+        "TOTP secrets and opening balances, endpoints, appliances and states, runs "
+        "(with ledger debits/refunds) spread over --days with weekly, daily and "
+        "semester patterns, and bank statements in the accountStatement JSON shape "
+        "that are ingested through the regular statement import."
+    )
+
+    RUN_COLUMNS = (
+        "logid", "endpoint_id", "appliance_id", "room_id", "created_at", "inic_units",
+        "inic_price", "state", "finished_at", "final_units", "final_price",
+    )
+    LEDGER_COLUMNS = ("room_id", "amount", "kind", "log_id", "reference", "created_at")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=2000)
+        parser.add_argument("--endpoints", type=int, default=100)
+        parser.add_argument("--runs", type=int, default=1_000_000)
+        parser.add_argument("--payments", type=int, default=50_000)
+        parser.add_argument("--days", type=int, default=365, help="History length in days before --end-date.")
+        parser.add_argument("--end-date", type=date.fromisoformat,
+                            help="YYYY-MM-DD the history ends before (default: today); with the same "
+                                 "--seed and --end-date the dataset is identical.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--room-base", type=int, default=100_000, help="Key of the first room.")
+        parser.add_argument("--prefix", default="gen", help="Prefix of generated appliance names.")
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--statement-dir",
+                            help="Keep the generated statement files here (default: temporary).")
+        parser.add_argument("--no-ingest", action="store_true",
+                            help="Only write statement files, do not import them.")
+        parser.add_argument("--skip-usage", action="store_true",
+                            help="Do not rebuild the daily_usage rollup afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        self.writer = TableWriter(options["batch_size"])
+        self.batch_size = options["batch_size"]
+        end = options["end_date"] or timezone.localdate()
+        self.start = end - timedelta(days=options["days"])
+        self.days = [self.start + timedelta(days=i) for i in range(options["days"])]
+        self.tz = timezone.get_current_timezone()
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1")
+        if options["no_ingest"] and not options["statement_dir"]:
+            raise CommandError("--no-ingest needs --statement-dir")
+
+        began = clock.perf_counter()
+        self.stdout.write(f"History {self.start}..{self.days[-1]} (--end-date {end.isoformat()})")
+        rooms = self._rooms(rng, options["rooms"], options["room_base"])
+        pairs = self._endpoints(options["endpoints"], options["prefix"])
+        self._partitions()
+
+        spent = self._runs(rng, options["runs"], rooms, pairs)
+        self._opening_balances(rng, rooms, spent)
+
+        if options["statement_dir"]:
+            directory = Path(options["statement_dir"])
+            directory.mkdir(parents=True, exist_ok=True)
+            self._statements(rng, options["payments"], rooms, directory, not options["no_ingest"])
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                self._statements(rng, options["payments"], rooms, Path(directory), True)
+
+        if not options["skip_usage"]:
+            call_command("rebuild_usage", since=self.start.isoformat(), stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {clock.perf_counter() - began:.1f}s"))
+
+    # -----------------------------
+
+    def _rooms(self, rng, count, room_base):
+        """
+        Rooms start with a zero balance; balances and OPENING entries are
+        written once the runs are known (see _opening_balances).
+
+        Returns:
+            [(room_id, key)]
+        """
+        if Room.objects.filter(key__gte=room_base, key__lt=room_base + count).exists():
+            raise CommandError(f"Rooms with keys {room_base}..{room_base + count - 1} already exist")
+
+        rooms = []
+        with transaction.atomic():
+            for offset in range(0, count, self.batch_size):
+                created = Room.objects.bulk_create(
+                    Room(key=room_base + i, balance=0)
+                    for i in range(offset, min(offset + self.batch_size, count))
+                )
+                RoomTOTP.objects.bulk_create(
+                    RoomTOTP(room=room, secret="".join(rng.choice(BASE32) for _ in range(32)))
+                    for room in created
+                )
+                rooms += [(room.room_id, room.key) for room in created]
+        self.stdout.write(f"{len(rooms)} rooms with TOTP secrets")
+        return rooms
+
+    def _endpoints(self, count, prefix):
+        """
+        Returns:
+            [(endpoint_id, appliance_id, price per unit, programs, program cum weights)]
+        """
+        names = [f"{prefix}-{name}" for name, *_ in APPLIANCES]
+        if Appliance.objects.filter(name__in=names).exists():
+            raise CommandError(f"Appliances {', '.join(names)} already exist, use another --prefix")
+
+        with transaction.atomic():
+            appliances = Appliance.objects.bulk_create(
+                Appliance(name=name, price_per_unit=spec[1]) for name, spec in zip(names, APPLIANCES)
+            )
+            endpoints = Endpoint.objects.bulk_create(Endpoint() for _ in range(count))
+            hosted = [
+                (appliance, spec)
+                for appliance, spec, share in zip(appliances, APPLIANCES, allocate(count, [a[4] for a in APPLIANCES]))
+                for _ in range(share)
+            ]
+            EndpointApplianceStateRoom.objects.bulk_create(
+                EndpointApplianceStateRoom(endpoint=endpoint, appliance=appliance)
+                for endpoint, (appliance, _) in zip(endpoints, hosted)
+            )
+        self.stdout.write(f"{len(endpoints)} endpoints with {len(appliances)} appliances")
+        return [
+            (endpoint.endpoint_id, appliance.appliance_id, spec[1], spec[2], list(accumulate(spec[3])))
+            for endpoint, (appliance, spec) in zip(endpoints, hosted)
+        ]
+
+    def _partitions(self):
+        if not RunsLogPartitions.supported():
+            return
+        # rows for a month without its partition would land in the default partition
+        month = month_start(self.start)
+        with connection.cursor() as cursor:
+            while month <= self.days[-1]:
+                cursor.execute(RunsLogPartitions.create_sql(month))
+                month = month_start(month, 1)
+
+    # -----------------------------
+
+    def _runs(self, rng, total, rooms, pairs):
+        """
+        Writes total runs in time order with their DEBIT and REFUND ledger
+        entries.
+
+        Returns:
+            Net amount spent per room, by index in rooms.
+        """
+        day_counts = allocate(total, [WEEKDAY_WEIGHTS[d.weekday()] * season(d) for d in self.days])
+        hour_cum = list(accumulate(HOUR_WEIGHTS))
+        # a few heavy users, a long tail of occasional ones
+        room_cum = list(accumulate(rng.paretovariate(1.2) for _ in rooms))
+        room_indexes = range(len(rooms))
+        spent = [0] * len(rooms)
+
+        began = clock.perf_counter()
+        written = 0
+        pending = []
+        for day, count in zip(self.days, day_counts):
+            hours = rng.choices(range(24), cum_weights=hour_cum, k=count)
+            picked_rooms = rng.choices(room_indexes, cum_weights=room_cum, k=count)
+            picked_pairs = rng.choices(pairs, k=count)
+            runs = sorted(
+                (hour * 3600 + int(rng.random() * 3600), room, pair)
+                for hour, room, pair in zip(hours, picked_rooms, picked_pairs)
+            )
+            midnight = datetime.combine(day, time.min, tzinfo=self.tz)
+            for second, room, pair in runs:
+                pending.append((midnight + timedelta(seconds=second), room, pair))
+            if len(pending) >= self.batch_size:
+                written += self._write_runs(rng, pending, rooms, spent)
+                pending = []
+                self.stdout.write(f"  {written} runs ({written / (clock.perf_counter() - began):.0f}/s)")
+        written += self._write_runs(rng, pending, rooms, spent)
+
+        self.stdout.write(f"{written} runs in {clock.perf_counter() - began:.1f}s")
+        return spent
+
+    def _write_runs(self, rng, pending, rooms, spent) -> int:
+        if not pending:
+            return 0
+        runs = []
+        ledger = []
+        with transaction.atomic():
+            logid = self.writer.reserve_ids(RunsLog, len(pending))
+            for created_at, room, (endpoint_id, appliance_id, price, programs, program_cum) in pending:
+                room_id = rooms[room][0]
+                units = rng.choices(programs, cum_weights=program_cum)[0]
+                inic_price = units * price
+                if rng.random() < ABORTED_SHARE:
+                    state = RunsLog.State.ABORTED
+                    final_units = rng.randrange(units)
+                else:
+                    state = RunsLog.State.FINISHED
+                    final_units = units
+                final_price = final_units * price
+                finished_at = created_at + timedelta(seconds=final_units)
+
+                runs.append((logid, endpoint_id, appliance_id, room_id, created_at, units,
+                             inic_price, state, finished_at, final_units, final_price))
+                ledger.append((room_id, -inic_price, RoomLedger.Kind.DEBIT, logid, "", created_at))
+                if final_price < inic_price:
+                    ledger.append((room_id, inic_price - final_price, RoomLedger.Kind.REFUND, logid, "", finished_at))
+                spent[room] += final_price
+                logid += 1
+
+            self.writer.write(RunsLog._meta.db_table, self.RUN_COLUMNS, runs)
+            self.writer.write(RoomLedger._meta.db_table, self.LEDGER_COLUMNS, ledger)
+        return len(runs)
+
+    def _opening_balances(self, rng, rooms, spent):
+        """
+        Opens every room with what it spent plus a remainder, so balances
+        end non-negative and the ledger reconciles.
+        """
+        opened_at = datetime.combine(self.start - timedelta(days=1), time(12), tzinfo=self.tz)
+        balances = [rng.randrange(0, 50_000) for _ in rooms]
+        with transaction.atomic():
+            self.writer.write(
+                RoomLedger._meta.db_table,
+                self.LEDGER_COLUMNS,
+                (
+                    (room_id, spent[i] + balances[i], RoomLedger.Kind.OPENING, None, "", opened_at)
+                    for i, (room_id, _key) in enumerate(rooms)
+                ),
+            )
+            Room.objects.bulk_update(
+                (Room(room_id=room_id, balance=balances[i]) for i, (room_id, _key) in enumerate(rooms)),
+                ["balance"],
+                batch_size=1000,
+            )
+        self.stdout.write(f"{len(rooms)} opening balances")
+
+    # -----------------------------
+
+    def _statements(self, rng, total, rooms, directory, ingest):
+        """
+        Writes one statement file per month (accountStatement JSON) and
+        imports it with update_rooms_from_stream.
+        """
+        day_counts = allocate(total, [WEEKDAY_WEIGHTS[d.weekday()] * season(d) for d in self.days])
+        amount_cum = list(accumulate(w for _, w in PAYMENT_AMOUNTS))
+        amounts = [a for a, _ in PAYMENT_AMOUNTS]
+        # room key ranges of separate runs do not overlap, so neither do their ids
+        transaction_id = rooms[0][1] * 1_000_000
+
+        by_month: dict[date, list] = {}
+        for day, count in zip(self.days, day_counts):
+            by_month.setdefault(month_start(day), []).append((day, count))
+
+        for month, month_days in by_month.items():
+            path = directory / f"statement-{month:%Y-%m}.json"
+            items = []
+            for day, count in month_days:
+                midnight = datetime.combine(day, time.min, tzinfo=self.tz)
+                for second in sorted(rng.randrange(86_400) for _ in range(count)):
+                    transaction_id += 1
+                    vs = rng.choice(rooms)[1]
+                    if rng.random() < INVALID_PAYMENT_SHARE:
+                        vs = rng.randrange(1, 99_999)
+                    currency = "EUR" if rng.random() < FOREIGN_CURRENCY_SHARE else "CZK"
+                    items.append(self._payment(
+                        transaction_id, midnight + timedelta(seconds=second),
+                        rng.choices(amounts, cum_weights=amount_cum)[0], vs, currency,
+                    ))
+            self._write_statement(path, month, items)
+            if ingest:
+                with open(path, "rb") as stream:
+                    update_rooms_from_stream(stream)
+        if ingest:
+            self._date_credits(rooms)
+        self.stdout.write(f"{total} payments in {len(by_month)} statements in {directory}")
+
+    @staticmethod
+    def _date_credits(rooms):
+        """
+        The import stamps CREDIT entries with the time of the import; move
+        them to the payment time so the ledger history spans --days too.
+        """
+        room_ids = [room_id for room_id, _key in rooms]
+        RoomLedger.objects.filter(
+            kind=RoomLedger.Kind.CREDIT, room_id__gte=min(room_ids), room_id__lte=max(room_ids),
+        ).update(
+            created_at=Subquery(
+                ValidPayments.objects.filter(transaction_id=OuterRef("reference")).values("payment_time")[:1]
+            )
+        )
+
+    @staticmethod
+    def _payment(transaction_id, moment, amount, vs, currency):
+        return {
+            "column22": {"value": transaction_id, "name": "ID pohybu", "id": 22},
+            "column0": {"value": int(moment.timestamp() * 1000), "name": "Datum", "id": 0},
+            "column1": {"value": amount, "name": "Objem", "id": 1},
+            "column14": {"value": currency, "name": "Měna", "id": 14},
+            "column5": {"value": str(vs), "name": "VS", "id": 5},
+            "column8": {"value": "Bezhotovostní příjem", "name": "Typ", "id": 8},
+        }
+
+    @staticmethod
+    def _write_statement(path, month, items):
+        info = {
+            "accountId": "2400222222",
+            "bankId": "2010",
+            "currency": "CZK",
+            "dateStart": int(datetime.combine(month, time.min).timestamp() * 1000),
+            "dateEnd": int(datetime.combine(month_start(month, 1), time.min).timestamp() * 1000),
+            "idFrom": items[0]["column22"]["value"] if items else None,
+            "idTo": items[-1]["column22"]["value"] if items else None,
+        }
+        with open(path, "w", encoding="utf-8") as out:
+            out.write('{"accountStatement":{"info":')
+            json.dump(info, out)
+            out.write(',"transactionList":{"transaction":[')
+            for i, item in enumerate(items):
+                if i:
+                    out.write(",")
+                json.dump(item, out, ensure_ascii=False)
+            out.write("]}}}")
@@ -0,0 +1,47 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from appliance_module.servicies_factories.request_metrics import RequestMetrics
+
+
+class MetricsMiddleware:
+    """
+    Records per route the latency of each request together with the SQL,
+    token, TOTP and appliance transaction time spent on it.
+
+    Routes are labelled by their URL pattern (api/usage/rooms/<int:key>/),
+    so the number of series stays bounded. For streaming responses only
+    the time to the first byte is measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _route(request) -> str:
+        match = getattr(request, "resolver_match", None)
+        return match.route if match else "unmatched"
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        cost, token = RequestMetrics.begin()
+        began = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            RequestMetrics.end(self._route(request), cost, token, time.perf_counter() - began)
+
+    async def __acall__(self, request):
+        cost, token = RequestMetrics.begin()
+        began = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            RequestMetrics.end(self._route(request), cost, token, time.perf_counter() - began)
@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
 
 class AuthenticateRoomSerializer(serializers.Serializer):
@@ -9,16 +12,59 @@ class AuthorizeRoomSerializer(serializers.Serializer):
     auth_code = serializers.IntegerField()
 
 
+class HeartbeatSerializer(serializers.Serializer):
+    endpoint_id = serializers.IntegerField()
+    token = serializers.CharField()
+
+
 class StartApplianceSerializer(serializers.Serializer):
     token = serializers.CharField()
     appliance_name = serializers.CharField()
     units = serializers.IntegerField(min_value=1, max_value=14400)
-    price = serializers.IntegerField(max_digits=4, min_value=1)
+    price = serializers.IntegerField(min_value=1, max_value=9999)
 
 
 class FinishApplianceSerializer(serializers.Serializer):
     token = serializers.CharField()
     units = serializers.IntegerField(min_value=1, max_value=14400)
-    price = serializers.IntegerField(max_digits=4, min_value=1)
+    price = serializers.IntegerField(min_value=1, max_value=9999)
     aborted = serializers.BooleanField(default=False)
 
+
+class BatchStartApplianceSerializer(serializers.Serializer):
+    operations = StartApplianceSerializer(many=True, allow_empty=False, max_length=200)
+
+
+class BatchFinishApplianceSerializer(serializers.Serializer):
+    operations = FinishApplianceSerializer(many=True, allow_empty=False, max_length=200)
+
+
+class UsageQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        until = attrs.get("until") or timezone.localdate()
+        since = attrs.get("since") or until - timedelta(days=30)
+        if since > until:
+            raise serializers.ValidationError("since must not be after until")
+        if (until - since).days > 366:
+            raise serializers.ValidationError("At most 366 days per request")
+        return {"since": since, "until": until}
+
+
+class StatementQuerySerializer(serializers.Serializer):
+    room = serializers.IntegerField(required=False)
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    # not "format", DRF reserves that query parameter for renderer selection
+    output = serializers.ChoiceField(choices=["csv", "jsonl"], default="csv")
+
+
+class RoomProvisioningSerializer(serializers.Serializer):
+    rooms = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=20000
+    )
+    balance = serializers.IntegerField(min_value=0, default=0)
+    rotate = serializers.BooleanField(default=False)
+    output = serializers.ChoiceField(choices=["csv", "jsonl"], default="csv")
@@ -1,3 +1,773 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import time
+from contextlib import ExitStack
+from io import StringIO
+from functools import partial
+from pathlib import Path
+from datetime import date, datetime, timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pyotp
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, connections, router, transaction
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+
+from appliance_module.model.appliance import Appliance
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.roomtotp import RoomTOTP
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.model.usage import DailyUsage
+from appliance_module.servicies_factories.appliance_catalog import ApplianceCatalog
+from appliance_module.servicies_factories.auth_service import AuthService
+from appliance_module.servicies_factories.db_router import ReadConsistency, ReplicaRouter
+from appliance_module.servicies_factories.endpoint_events import EndpointEvents, RedisBroker
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+from appliance_module.servicies_factories.request_metrics import RequestMetrics
+from appliance_module.servicies_factories.room_provisioning import RoomProvisioning
+from appliance_module.servicies_factories.token_registry import EndpointTokenRegistry, VerifiedTokenCache
+from bank_module.addBalance import update_rooms_from_json
+from bank_module.models import InvalidPayments, ValidPayments
+from bank_module.room_statement import astream
+
+
+class QueryBudget:
+    """
+    Captures the SQL statements executed on all connections (primary and
+    replicas) and the rows fetched by them.
+
+    Rows are counted at the DB-API fetch calls, so rows the database sends
+    but Django never reads are not included.
+    """
+
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, list[int]]] = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql == "BEGIN":
+            # explicit on SQLite only, implicit in the driver on PostgreSQL
+            return execute(sql, params, many, context)
+        fetched = [0]
+        self.statements.append((sql, fetched))
+        cursor = context["cursor"]
+        for name in ("fetchone", "fetchmany", "fetchall"):
+            setattr(cursor, name, self._counting(getattr(cursor.cursor, name), fetched, name == "fetchone"))
+        return execute(sql, params, many, context)
+
+    @staticmethod
+    def _counting(fetch, fetched, single):
+        def counted(*args):
+            result = fetch(*args)
+            if single:
+                fetched[0] += result is not None
+            else:
+                fetched[0] += len(result)
+            return result
+        return counted
+
+    @property
+    def queries(self) -> int:
+        return len(self.statements)
+
+    @property
+    def rows(self) -> int:
+        return sum(fetched[0] for _, fetched in self.statements)
+
+    def report(self) -> str:
+        return "\n".join(
+            f"  {i}. [{fetched[0]} rows] {sql}"
+            for i, (sql, fetched) in enumerate(self.statements, 1)
+        )
+
+
+class QueryBudgetMixin:
+
+    def assertWithinBudget(self, budget: QueryBudget, queries: int, rows: int, label: str = "") -> None:
+        if budget.queries > queries or budget.rows > rows:
+            self.fail(
+                f"{label} over query budget: {budget.queries} statements (max {queries}), "
+                f"{budget.rows} rows fetched (max {rows})\n{budget.report()}"
+            )
+
+    @staticmethod
+    def bulk_batches(model, count: int) -> int:
+        """
+        Statements bulk_create needs for count rows on this backend.
+        """
+        if not count:
+            return 0
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        batch = max(connection.ops.bulk_batch_size(fields, [model()] * count), 1)
+        return -(-count // batch)
+
+
+def reset_caches() -> None:
+    """
+    Drops process-level caches so ids reused after a table flush do not
+    hit entries of the previous test.
+    """
+    caches[settings.TOTP_REPLAY_CACHE].clear()
+    ApplianceCatalog.invalidate()
+    VerifiedTokenCache.clear()
+    EndpointTokenRegistry.refresh()
+
+
+class FlowQueryBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    SQL budgets of the challenge -> verify -> start -> finish flow with warm
+    process caches. TransactionTestCase, so transactions are real (a
+    TestCase wraps every atomic block in extra SAVEPOINT statements).
+    """
+
+    databases = "__all__"
+
+    # (statements, rows fetched) per request
+    BUDGETS = {
+        # Room existence check
+        "challenge": (1, 1),
+        # RoomTOTP joined with the room balance; the catalog is cached
+        "verify": (1, 1),
+        # claim, debit ... RETURNING, runs log, ledger entry, state update
+        "start": (5, 3),
+        # state read, runs log, usage upsert, state reset + 2 savepoints
+        "finish": (8, 1),
+    }
+    APPLIANCES = 5
+
+    def setUp(self):
+        reset_caches()
+        appliances = [
+            Appliance.objects.create(name=f"washer-{i}", price_per_unit=1)
+            for i in range(self.APPLIANCES)
+        ]
+        self.appliance = appliances[0]
+        self.endpoint = Endpoint.objects.create()
+        EndpointApplianceStateRoom.objects.create(endpoint=self.endpoint, appliance=self.appliance)
+        EndpointPresence.beat(self.endpoint.endpoint_id, "127.0.0.1")
+
+        self.rooms = []
+        for key in (101, 102):
+            room = Room.objects.create(key=key, balance=100_000)
+            secret = pyotp.random_base32()
+            RoomTOTP.objects.create(room=room, secret=secret)
+            self.rooms.append((key, pyotp.TOTP(secret)))
+
+        self.client = Client()
+        # first flow loads the appliance catalog and endpoint versions
+        list(self._flow(self.rooms[0]))
+
+    def _post(self, url, body):
+        return self.client.post(url, body, content_type="application/json")
+
+    def _flow(self, room):
+        """
+        Runs one flow, yielding (step, response, budget) per request.
+        """
+        key, totp = room
+        steps = [
+            ("challenge", "/api/auth/challenge/",
+             lambda token: {"room_num": key, "endpoint_id": self.endpoint.endpoint_id}),
+            ("verify", "/api/auth/verify/",
+             lambda token: {"token": token, "auth_code": int(totp.now())}),
+            ("start", "/api/appliance/start/",
+             lambda token: {"token": token, "appliance_name": self.appliance.name, "units": 60, "price": 1}),
+            ("finish", "/api/appliance/finish/",
+             lambda token: {"token": token, "units": 60, "price": 1}),
+        ]
+        token = None
+        for name, url, body in steps:
+            with QueryBudget() as budget:
+                response = self._post(url, body(token))
+            self.assertLess(response.status_code, 300, f"{name}: {response.content!r}")
+            token = response.json().get("token")
+            yield name, response, budget
+
+    def test_flow_within_budget(self):
+        for name, _response, budget in self._flow(self.rooms[1]):
+            with self.subTest(step=name):
+                queries, rows = self.BUDGETS[name]
+                self.assertWithinBudget(budget, queries, rows, label=name)
+
+    def test_verify_does_not_scale_with_catalog(self):
+        for i in range(self.APPLIANCES, 4 * self.APPLIANCES):
+            Appliance.objects.create(name=f"washer-{i}", price_per_unit=1)
+        ApplianceCatalog.items()
+
+        for name, _response, budget in self._flow(self.rooms[1]):
+            if name == "verify":
+                queries, rows = self.BUDGETS[name]
+                self.assertWithinBudget(budget, queries, rows, label=name)
+
+
+class StatementIngestQueryBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    update_rooms_from_json has to stay a constant number of statements
+    whatever the statement size; rows fetched grow only with the payments
+    actually inserted.
+    """
+
+    ROOMS = 50
+    SIZES = (1, 10, 100, 1000)
+
+    def setUp(self):
+        reset_caches()
+        Room.objects.bulk_create(Room(key=1000 + i, balance=0) for i in range(self.ROOMS))
+
+    @classmethod
+    def _statement(cls, size: int, first_id: int = 1) -> str:
+        """
+        size transactions: 9 of 10 credit a room, every tenth has an unknown VS.
+        """
+        items = []
+        for i in range(size):
+            vs = 1000 + i % cls.ROOMS if i % 10 else 999_999
+            items.append({
+                "column22": {"value": first_id + i},
+                "column0": {"value": int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000) + i},
+                "column1": {"value": 10.5},
+                "column5": {"value": str(vs)},
+                "column14": {"value": "CZK"},
+            })
+        return json.dumps({"accountStatement": {"transactionList": {"transaction": items}}})
+
+    def test_budget_by_statement_size(self):
+        first_id = 1
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                statement = self._statement(size, first_id)
+                first_id += size
+                valid = sum(1 for i in range(size) if i % 10)
+                credited_rooms = min(valid, self.ROOMS)
+
+                with QueryBudget() as budget:
+                    update_rooms_from_json(statement)
+                # known ids x2, room map, payments insert, room credit + bulk_create batches;
+                # rows: room map, RETURNING of inserted payments and of their ledger entries
+                self.assertWithinBudget(
+                    budget,
+                    5 + self.bulk_batches(RoomLedger, valid) + self.bulk_batches(InvalidPayments, size - valid),
+                    credited_rooms + 2 * valid,
+                    label=f"ingest of {size}",
+                )
+
+                with QueryBudget() as budget:
+                    update_rooms_from_json(statement)
+                # nothing new: known ids x2 and the room map only
+                self.assertWithinBudget(
+                    budget, 3, credited_rooms + size, label=f"re-ingest of {size}",
+                )
+
+
+class RoomProvisioningTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    Provisioning costs a fixed number of statements per batch, not per room.
+    """
+
+    BATCH = 100
+
+    def setUp(self):
+        reset_caches()
+
+    def test_budget_and_rotation(self):
+        keys = list(range(5000, 5500))
+        batches = len(keys) // self.BATCH
+        with QueryBudget() as budget:
+            created = RoomProvisioning.provision(keys, balance=300, batch_size=self.BATCH)
+        # per batch: room and secret lookup, rooms insert, OPENING entries, secrets upsert;
+        # rows: RETURNING of the three inserts
+        self.assertWithinBudget(
+            budget,
+            batches * (1 + sum(self.bulk_batches(model, self.BATCH) for model in (Room, RoomLedger, RoomTOTP))),
+            3 * len(keys),
+            label="create",
+        )
+        self.assertEqual({room.status for room in created}, {RoomProvisioning.CREATED})
+        self.assertEqual(RoomLedger.objects.filter(kind=RoomLedger.Kind.OPENING).count(), len(keys))
+
+        again = RoomProvisioning.provision(keys[:10] + [6000], batch_size=self.BATCH)
+        self.assertEqual([room.secret for room in again[:10]], [room.secret for room in created[:10]])
+        self.assertEqual(again[-1].status, RoomProvisioning.CREATED)
+
+        rotated = RoomProvisioning.provision(keys[:10], rotate=True, batch_size=self.BATCH)
+        self.assertEqual({room.status for room in rotated}, {RoomProvisioning.ROTATED})
+        self.assertEqual(
+            dict(RoomTOTP.objects.filter(room__key__in=keys[:10]).values_list("room__key", "secret")),
+            {room.key: room.secret for room in rotated},
+        )
+        self.assertEqual(Room.objects.get(key=keys[0]).balance, 300)
+
+    def test_api_streams_provisioning_uris(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        client = Client()
+        client.force_login(admin)
+
+        response = client.post(
+            "/api/rooms/provision/", {"rooms": [7001, 7002], "output": "jsonl"}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["room"] for row in rows], [7001, 7002])
+        self.assertTrue(all(row["uri"].startswith("otpauth://totp/") for row in rows))
+
+        self.assertEqual(Client().post("/api/rooms/provision/", {"rooms": [7003]}).status_code, 401)
+
+
+class EndpointTokenRotationTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    Fleet rotation is one read and one UPDATE, and workers that have not
+    seen it yet pick up the published versions without a database query.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        reset_caches()
+        self.endpoints = Endpoint.objects.bulk_create(Endpoint() for _ in range(50))
+
+    def test_rotation_is_set_based(self):
+        with QueryBudget() as budget:
+            versions = EndpointTokenRegistry.rotate()
+        # versions read, UPDATE ... CASE; then the published table
+        self.assertWithinBudget(budget, 3, 2 * len(self.endpoints), label="rotate")
+        self.assertEqual(len(versions), len(self.endpoints))
+        self.assertTrue(all(version != 1 for version in versions.values()))
+        self.assertEqual(dict(Endpoint.objects.values_list("endpoint_id", "token")), versions)
+
+        first = self.endpoints[0].endpoint_id
+        rotated = EndpointTokenRegistry.rotate(Endpoint.objects.filter(pk=first))
+        self.assertEqual(list(rotated), [first])
+        self.assertNotEqual(rotated[first], versions[first])
+
+    def test_other_workers_adopt_published_versions(self):
+        endpoint_id = self.endpoints[0].endpoint_id
+        self.assertEqual(EndpointTokenRegistry.version(endpoint_id), 1)
+        stale = (dict(EndpointTokenRegistry._versions), EndpointTokenRegistry._generation)
+
+        versions = EndpointTokenRegistry.rotate()
+
+        # a worker that still has the old table, past its sync interval
+        EndpointTokenRegistry._store(*stale)
+        EndpointTokenRegistry._synced_at = 0.0
+        with QueryBudget() as budget:
+            self.assertEqual(EndpointTokenRegistry.version(endpoint_id), versions[endpoint_id])
+        self.assertEqual(budget.queries, 0, budget.report())
+
+    def test_table_is_never_read_from_a_replica(self):
+        hints = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **kwargs):
+            if model is Endpoint:
+                hints.append(ReadConsistency.allows_replica())
+            return db_for_read(router, model, **kwargs)
+
+        with mock.patch.object(ReplicaRouter, "db_for_read", record), ReadConsistency.replica():
+            EndpointTokenRegistry.version(self.endpoints[0].endpoint_id)
+            EndpointTokenRegistry.publish()
+        self.assertEqual(hints, [False, False])
+
+    def test_command_refuses_unshared_cache(self):
+        with self.assertRaisesMessage(CommandError, "the token cache is the presence cache ('presence')"):
+            call_command("rotate_endpoint_tokens", "--all")
+        with override_settings(ENDPOINT_TOKEN_CACHE="default"), \
+                self.assertRaisesMessage(CommandError, "point ENDPOINT_TOKEN_CACHE at a shared (Redis) cache"):
+            call_command("rotate_endpoint_tokens", "--all")
+        self.assertEqual(set(Endpoint.objects.values_list("token", flat=True)), {1})
+
+        call_command("rotate_endpoint_tokens", "--all", "--force", stdout=StringIO())
+        self.assertNotIn(1, set(Endpoint.objects.values_list("token", flat=True)))
+
+
+class AdminQueryBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    Admin changelists of the large tables cost the same number of
+    statements whatever the page size, and the date hierarchy never
+    runs SELECT DISTINCT over the table.
+    """
+
+    RUNS = 120
+
+    def setUp(self):
+        reset_caches()
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client = Client()
+        self.client.force_login(admin)
+
+        appliance = Appliance.objects.create(name="washer", price_per_unit=1)
+        endpoint = Endpoint.objects.create()
+        rooms = Room.objects.bulk_create(Room(key=100 + i, balance=0) for i in range(10))
+        RunsLog.objects.bulk_create(
+            RunsLog(endpoint=endpoint, appliance=appliance, room=rooms[i % len(rooms)],
+                    inic_units=60, inic_price=60, state=RunsLog.State.FINISHED)
+            for i in range(self.RUNS)
+        )
+        ValidPayments.objects.bulk_create(
+            ValidPayments(transaction_id=str(i), amount=100, key=rooms[i % len(rooms)],
+                          payment_time=datetime(2025, 1, 1 + i % 28, tzinfo=timezone.utc))
+            for i in range(self.RUNS)
+        )
+
+    def _get(self, url):
+        with QueryBudget() as budget:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertFalse([sql for sql, _ in budget.statements if "DISTINCT" in sql], budget.report())
+        return budget
+
+    def test_changelists_within_budget(self):
+        today = datetime.now()
+        # session, user, (list filter choices), count, page, date hierarchy MIN/MAX
+        # (twice when the admin first picks the start level)
+        for url, queries in (
+            ("/admin/appliance_module/room/", 4),
+            ("/admin/appliance_module/runslog/", 7),
+            (f"/admin/appliance_module/runslog/?created_at__year={today.year}", 6),
+            (f"/admin/appliance_module/runslog/?created_at__year={today.year}&created_at__month={today.month}", 6),
+            ("/admin/appliance_module/endpointappliancestateroom/", 5),
+            ("/admin/bank_module/validpayments/", 6),
+            ("/admin/bank_module/validpayments/?payment_time__year=2025&payment_time__month=1", 5),
+        ):
+            with self.subTest(url=url):
+                # rows: one page plus the appliance filter choices
+                self.assertWithinBudget(self._get(url), queries, 60, label=url)
+
+
+class BatchEndpointTests(TestCase):
+
+    def setUp(self):
+        reset_caches()
+
+        self.endpoint = Endpoint.objects.create()
+        for name in ("washer", "dryer"):
+            appliance = Appliance.objects.create(name=name, price_per_unit=1)
+            EndpointApplianceStateRoom.objects.create(endpoint=self.endpoint, appliance=appliance)
+        EndpointPresence.beat(self.endpoint.endpoint_id, "127.0.0.1")
+        self.rich = self._room(601, 1000)
+        self.poor = self._room(602, 100)
+
+    def _room(self, key, balance):
+        room = Room.objects.create(key=key, balance=balance)
+        totp = pyotp.TOTP(pyotp.random_base32())
+        RoomTOTP.objects.create(room=room, secret=totp.secret)
+        payload = {
+            "room_num": key,
+            "endpoint_id": self.endpoint.endpoint_id,
+            "ver": EndpointTokenRegistry.version(self.endpoint.endpoint_id),
+        }
+        room.access_token, _balance = AuthService.authorize_room(payload, totp.now())
+        return room
+
+    def _post(self, url, operations):
+        response = self.client.post(url, {"operations": operations}, content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def _start(self, *operations):
+        return self._post("/api/appliance/start/batch/", [
+            {"token": room.access_token, "appliance_name": name, "units": 60, "price": 2}
+            for room, name in operations
+        ])
+
+    def test_start_operations_succeed_or_fail_on_their_own(self):
+        results = self._start((self.rich, "washer"), (self.poor, "dryer"), (self.rich, "washer"))
+
+        self.assertEqual([result["status"] for result in results], [201, 400, 400])
+        self.assertEqual(results[0]["newbalance"], 800)
+        self.assertEqual(results[1]["error"], "Insufficient balance")
+        self.assertEqual(results[2]["error"], "Appliance already running")
+        self.assertEqual(RunsLog.objects.count(), 1)
+        self.assertFalse(EndpointApplianceStateRoom.objects.get(appliance__name="dryer").is_occupied)
+        self.poor.refresh_from_db()
+        self.assertEqual(self.poor.balance, 100)
+
+    def test_finish_refunds_unused_units(self):
+        [started] = self._start((self.rich, "washer"))
+
+        results = self._post("/api/appliance/finish/batch/", [
+            {"token": started["token"], "units": 30, "price": 1},
+            {"token": "garbage", "units": 30, "price": 1},
+        ])
+
+        self.assertEqual(results[0], {"status": 200, "result": "finished"})
+        self.assertEqual((results[1]["status"], results[1]["error"]), (400, "Invalid token"))
+        log = RunsLog.objects.get()
+        self.assertEqual((log.state, log.final_units, log.final_price), (RunsLog.State.FINISHED, 30, 100))
+        self.rich.refresh_from_db()
+        self.assertEqual(self.rich.balance, 900)
+        self.assertFalse(EndpointApplianceStateRoom.objects.get(appliance__name="washer").is_occupied)
+
+class EndpointHeartbeatTests(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.endpoint = Endpoint.objects.create()
+        self.token = AuthService.encode({"endpoint_id": self.endpoint.pk}, "endpoint")
+
+    def _beat(self, token, endpoint_id=None, url="/api/endpoint/heartbeat/"):
+        body = {"endpoint_id": endpoint_id or self.endpoint.pk, "token": token}
+        return self.client.post(url, body, content_type="application/json")
+
+    def test_endpoint_token_marks_online(self):
+        for url in ("/api/endpoint/heartbeat/", "/api/async/endpoint/heartbeat/"):
+            caches[settings.ENDPOINT_PRESENCE_CACHE].clear()
+            self.assertEqual(self._beat(self.token, url=url).status_code, 200)
+            self.assertTrue(EndpointPresence.is_online(self.endpoint.pk))
+
+    def test_rejected_tokens(self):
+        other = Endpoint.objects.create()
+        room_token = AuthService.encode({"room_num": 1, "endpoint_id": self.endpoint.pk}, "challenge")
+        self.assertEqual(self._beat("").status_code, 400)
+        self.assertEqual(self._beat(room_token).status_code, 400)
+        self.assertEqual(self._beat(self.token, endpoint_id=other.pk).status_code, 400)
+        self.assertFalse(EndpointPresence.is_online(self.endpoint.pk))
+        self.assertFalse(EndpointPresence.is_online(other.pk))
+
+    def test_rotation_revokes_endpoint_token(self):
+        Endpoint.objects.filter(pk=self.endpoint.pk).rotate_tokens()
+        EndpointTokenRegistry.refresh()
+        response = self._beat(self.token)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Token has been revoked")
+
+
+class EndpointEventsTests(TestCase):
+
+    def setUp(self):
+        reset_caches()
+        self.endpoint = Endpoint.objects.create()
+        self.url = f"/api/async/endpoint/{self.endpoint.pk}/events/"
+
+    @staticmethod
+    def _auth(token):
+        return {"Authorization": f"Bearer {token}"}
+
+    async def test_requires_endpoint_token(self):
+        other = await Endpoint.objects.acreate()
+        room_token = AuthService.encode({"room_num": 1, "endpoint_id": self.endpoint.pk, "ver": 1}, "challenge")
+        for token in ("", "1", room_token, AuthService.encode({"endpoint_id": other.pk, "ver": 1}, "endpoint")):
+            response = await self.async_client.get(self.url, headers=self._auth(token))
+            self.assertEqual(response.status_code, 403, token)
+        # the query string is not accepted, it ends up in access logs
+        token = AuthService.encode({"endpoint_id": self.endpoint.pk, "ver": 1}, "endpoint")
+        response = await self.async_client.get(self.url, {"token": token})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(EndpointPresence.is_online(self.endpoint.pk))
+
+    async def test_streams_events(self):
+        token = AuthService.encode({"endpoint_id": self.endpoint.pk, "ver": 1}, "endpoint")
+        response = await self.async_client.get(self.url, headers=self._auth(token))
+        self.assertEqual(response.status_code, 200)
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.1)  # let the stream subscribe
+        EndpointEvents.broker().publish(self.endpoint.pk, {"type": "start", "log_id": 1})
+        self.assertTrue((await pending).startswith(b"event: start\n"))
+        await response.streaming_content.aclose()
+
+    @override_settings(ENDPOINT_EVENTS_KEEPALIVE=0.05)
+    async def test_rotation_closes_stream(self):
+        token = AuthService.encode({"endpoint_id": self.endpoint.pk, "ver": 1}, "endpoint")
+        response = await self.async_client.get(self.url, headers=self._auth(token))
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        self.assertEqual(await anext(chunks), b": keepalive\n\n")
+
+        await Endpoint.objects.filter(pk=self.endpoint.pk).aupdate(token=2)
+        EndpointTokenRegistry.refresh()
+        self.assertEqual([chunk async for chunk in chunks], [])
+
+
+    async def test_redis_subscription_fans_out_to_streams(self):
+        broker = RedisBroker("redis://localhost:6379/0")
+        first = aiter(broker._local.listen(self.endpoint.pk, 1))
+        second = aiter(broker._local.listen(self.endpoint.pk, 1))
+        pending = [asyncio.ensure_future(anext(first)), asyncio.ensure_future(anext(second))]
+        await asyncio.sleep(0.05)  # let both subscribe
+        broker._dispatch({
+            "type": "pmessage",
+            "channel": f"endpoint-events:{self.endpoint.pk}".encode(),
+            "data": json.dumps({"type": "finish", "log_id": 7}).encode(),
+        })
+        self.assertEqual(await asyncio.gather(*pending), [{"type": "finish", "log_id": 7}] * 2)
+        await first.aclose()
+        await second.aclose()
+
+class MetricsTests(TestCase):
+
+    def test_closed_without_token_outside_debug(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            response = self.client.get("/metrics", headers={"Authorization": "Bearer secret"})
+            self.assertEqual(response.status_code, 200)
+
+    def test_sums_all_worker_processes(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory, METRICS_TOKEN="secret"):
+            # another worker (or one that has exited) served two requests of this route
+            buckets = len(RequestMetrics.request_seconds.buckets)
+            other = [2] + [0] * buckets + [0.0002]
+            Path(directory, "1-dead.json").write_text(json.dumps({"api_request_seconds": {"metrics": other}}))
+
+            self.client.get("/metrics", headers={"Authorization": "Bearer secret"})
+            response = self.client.get("/metrics", headers={"Authorization": "Bearer secret"})
+
+        # this process's requests so far, except the one being rendered, plus the other worker's
+        served = sum(RequestMetrics.request_seconds.snapshot()["metrics"][:-1]) - 1
+        self.assertIn(f'api_request_seconds_count{{route="metrics"}} {served + 2}', response.content.decode())
+
+
+    def test_exited_workers_are_compacted(self):
+        buckets = len(RequestMetrics.request_seconds.buckets)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            for name, count in (("4242-a.json", 2), ("4242-b.json", 3), ("4343-c.json", 5)):
+                series = [count] + [0] * buckets + [0.0001]
+                Path(directory, name).write_text(json.dumps({"api_request_seconds": {"start": series}}))
+            before = RequestMetrics._merged()
+
+            RequestMetrics.compact(4242)
+            RequestMetrics.compact(4343)
+
+            names = {path.name for path in Path(directory).glob("*.json")}
+            self.assertIn(RequestMetrics.ACCUMULATED, names)
+            self.assertFalse(names & {"4242-a.json", "4242-b.json", "4343-c.json"})
+            after = RequestMetrics._merged()
+        self.assertEqual(after["api_request_seconds"]["start"][0], 10)
+        self.assertEqual(after["api_request_seconds"]["start"][0], before["api_request_seconds"]["start"][0])
+
+class UsageViewTests(TestCase):
+
+    def setUp(self):
+        room = Room.objects.create(key=8001, balance=0)
+        washer = Appliance.objects.create(name="washer", price_per_unit=5)
+        endpoint = Endpoint.objects.create()
+        DailyUsage.objects.record_many([
+            (date(2026, 1, 1), room.pk, washer.pk, endpoint.pk, 1, 0, 10, 50, 0),
+            (date(2026, 1, 2), room.pk, washer.pk, endpoint.pk, 1, 1, 4, 20, 30),
+        ])
+        self.endpoint_id = endpoint.pk
+        admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+
+    def _total(self, url):
+        response = self.client.get(url, {"since": "2026-01-01", "until": "2026-01-31"})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["total"]
+
+    def test_every_dimension(self):
+        expected = {"runs": 2, "aborted": 1, "units": 14, "charged": 70, "refunded": 30}
+        self.assertEqual(self._total("/api/usage/rooms/8001/"), expected)
+        self.assertEqual(self._total("/api/usage/appliances/washer/"), expected)
+        self.assertEqual(self._total(f"/api/usage/endpoints/{self.endpoint_id}/"), expected)
+
+    def test_unknown_key(self):
+        self.assertEqual(self.client.get("/api/usage/rooms/9999/").status_code, 404)
+        self.assertEqual(self.client.get("/api/usage/appliances/dryer/").status_code, 404)
+
+
+class StatementExportTests(TestCase):
+
+    def setUp(self):
+        room = Room.objects.create(key=8101, balance=0)
+        ValidPayments.objects.bulk_create(
+            ValidPayments(transaction_id=str(i), amount=100 * i, key=room,
+                          payment_time=datetime(2026, 1, i, tzinfo=timezone.utc))
+            for i in range(1, 6)
+        )
+        self.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+
+    def _amounts(self, lines):
+        return [json.loads(line)["amount"] for line in lines.splitlines()]
+
+    def test_wsgi_streams_statement(self):
+        self.client.force_login(self.admin)
+        response = self.client.get("/api/statement/", {"room": 8101, "output": "jsonl"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        self.assertEqual(self._amounts(b"".join(response.streaming_content)), [100, 200, 300, 400, 500])
+
+    async def test_asgi_streams_in_batches(self):
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch("api.views.astream", partial(astream, batch_size=2)):
+            response = await self.async_client.get("/api/statement/", {"room": 8101, "output": "jsonl"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(self._amounts(b"".join(chunks)), [100, 200, 300, 400, 500])
+
+
+@skipUnless(len(settings.DATABASES) > 1, "needs a replica alias, e.g. DATABASE_REPLICAS=localhost:5433")
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Replicas mirror the default test database, so this checks where
+    queries are routed, not replication itself. TransactionTestCase, as
+    reads inside a transaction always go to the primary.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        reset_caches()
+        ReplicaRouter._lag.clear()
+        self.replicas = ReplicaRouter.replicas()
+
+    def test_reads_go_to_primary_without_hint(self):
+        self.assertEqual(router.db_for_read(Room), "default")
+
+    def test_hinted_reads_go_to_replica(self):
+        with ReadConsistency.replica():
+            self.assertIn(router.db_for_read(Room), self.replicas)
+            with ReadConsistency.primary():
+                self.assertEqual(router.db_for_read(Room), "default")
+        self.assertEqual(router.db_for_read(Room), "default")
+
+    def test_writes_and_transactions_stay_on_primary(self):
+        with ReadConsistency.replica():
+            self.assertEqual(router.db_for_write(Room), "default")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Room), "default")
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        now = time.monotonic()
+        ReplicaRouter._lag.update((alias, (settings.DATABASE_REPLICA_MAX_LAG + 1, now)) for alias in self.replicas)
+        with ReadConsistency.replica():
+            self.assertEqual(router.db_for_read(Room), "default")
+
+    def test_challenge_reads_from_replica(self):
+        endpoint = Endpoint.objects.create()
+        Room.objects.create(key=101, balance=0)
+        executed = []
+
+        def record(execute, sql, params, many, context):
+            executed.append(context["connection"].alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record))
+            response = Client().post(
+                "/api/auth/challenge/",
+                {"room_num": 101, "endpoint_id": endpoint.endpoint_id},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(executed)
+        self.assertTrue(all(alias in self.replicas for alias in executed), executed)
@@ -1,14 +1,46 @@
 from django.urls import path
+from .async_views import (
+    AsyncApplianceStartView,
+    AsyncApplianceFinishView,
+    AsyncAuthChallengeView,
+    AsyncAuthVerifyView,
+    AsyncEndpointEventsView,
+    AsyncEndpointHeartbeatView,
+)
 from .views import (
+    ApplianceCatalogView,
     ApplianceStartView,
     ApplianceFinishView,
+    ApplianceStartBatchView,
+    ApplianceFinishBatchView,
     AuthChallengeView,
     AuthVerifyView,
+    EndpointHeartbeatView,
+    RoomUsageView,
+    ApplianceUsageView,
+    EndpointUsageView,
+    StatementExportView,
+    RoomProvisioningView,
 )
 
 urlpatterns = [
     path("auth/challenge/", AuthChallengeView.as_view()),
     path("auth/verify/", AuthVerifyView.as_view()),
+    path("endpoint/heartbeat/", EndpointHeartbeatView.as_view()),
+    path("appliances/", ApplianceCatalogView.as_view()),
     path("appliance/start/", ApplianceStartView.as_view()),
     path("appliance/finish/", ApplianceFinishView.as_view()),
+    path("appliance/start/batch/", ApplianceStartBatchView.as_view()),
+    path("appliance/finish/batch/", ApplianceFinishBatchView.as_view()),
+    path("usage/rooms/<int:key>/", RoomUsageView.as_view()),
+    path("usage/appliances/<str:key>/", ApplianceUsageView.as_view()),
+    path("usage/endpoints/<int:key>/", EndpointUsageView.as_view()),
+    path("statement/", StatementExportView.as_view()),
+    path("rooms/provision/", RoomProvisioningView.as_view()),
+    path("async/endpoint/heartbeat/", AsyncEndpointHeartbeatView.as_view()),
+    path("async/endpoint/<int:endpoint_id>/events/", AsyncEndpointEventsView.as_view()),
+    path("async/auth/challenge/", AsyncAuthChallengeView.as_view()),
+    path("async/auth/verify/", AsyncAuthVerifyView.as_view()),
+    path("async/appliance/start/", AsyncApplianceStartView.as_view()),
+    path("async/appliance/finish/", AsyncApplianceFinishView.as_view()),
 ]
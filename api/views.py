@@ -3,18 +3,40 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.views import View
 
 
 from appliance_module.model.room import Room
-from appliance_module.model.endpoint import Endpoint
-from appliance_module.model.appliance import Appliance
+from appliance_module.model.usage import DailyUsage
+from appliance_module.servicies_factories.appliance_catalog import ApplianceCatalog
+from appliance_module.servicies_factories.appliance_service import ApplianceService
 from appliance_module.servicies_factories.appliance_service_factory import ApplianceServiceFactory
 from appliance_module.servicies_factories.auth_service import AuthService
+from appliance_module.servicies_factories.db_router import ReadConsistency
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+from appliance_module.servicies_factories.request_metrics import RequestMetrics
+from appliance_module.servicies_factories.room_provisioning import FORMATS as PROVISIONING_FORMATS, RoomProvisioning
+from bank_module.room_statement import FORMATS, astream, statement_rows
 from .serializers.serializer import (
     StartApplianceSerializer,
     FinishApplianceSerializer,
     AuthenticateRoomSerializer,
     AuthorizeRoomSerializer,
+    HeartbeatSerializer,
+    BatchStartApplianceSerializer,
+    BatchFinishApplianceSerializer,
+    UsageQuerySerializer,
+    StatementQuerySerializer,
+    RoomProvisioningSerializer,
 )
 class AuthChallengeView(APIView):
     """
@@ -27,9 +49,9 @@ class AuthChallengeView(APIView):
         room_num = serializer.validated_data["room_num"]
         endpoint_id = serializer.validated_data["endpoint_id"]
         try:
-            Room.objects.get(key=room_num)
-            Endpoint.objects.get(pk=endpoint_id)
-            challenge_token = AuthService.encode(serializer.validated_data, "challenge")
+            with ReadConsistency.replica():
+                Room.objects.get(key=room_num)
+                challenge_token = AuthService.encode(serializer.validated_data, "challenge")
             return Response({"token": challenge_token},
                             status=status.HTTP_200_OK)
         except Exception as e:
@@ -47,29 +69,71 @@ class AuthVerifyView(APIView):
         token = serializer.validated_data["token"]
         auth_code = serializer.validated_data["auth_code"]
         try:
-            decoded = AuthService.verify_token(token)
-            access_token = AuthService.verify_room(decoded, auth_code)
+            with ReadConsistency.replica():
+                decoded = AuthService.verify_token(token)
+                access_token, balance = AuthService.authorize_room(decoded, auth_code)
+                appliances = ApplianceCatalog.items()
             return Response({"token": str(access_token),
-                             "balance": Room.objects.get(key=decoded["room_num"]).balance,
-                             "appliances": [{"name": a.name, "value": a.price_per_unit} for a in Appliance.objects.all()]},
+                             "balance": balance,
+                             "appliances": appliances},
                             status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)},
                              status=status.HTTP_400_BAD_REQUEST)
 
+class EndpointHeartbeatView(APIView):
+    """
+    Records that an endpoint is online; the endpoint authenticates with
+    its endpoint token. Only the presence cache is written; the Celery
+    task flush_endpoint_presence copies it to Endpoint.connection.
+    """
+
+    def post(self, request):
+        serializer = HeartbeatSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        endpoint_id = serializer.validated_data["endpoint_id"]
+        try:
+            AuthService.verify_endpoint(serializer.validated_data["token"], endpoint_id)
+            EndpointPresence.beat(endpoint_id, request.META.get("REMOTE_ADDR"))
+            return Response({"status": "online"},
+                            status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+class ApplianceCatalogView(APIView):
+    """
+    Lists appliances; supports conditional GET via ETag / If-None-Match.
+    """
+
+    def get(self, request):
+        etag = ApplianceCatalog.etag()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response({"appliances": ApplianceCatalog.items()},
+                        status=status.HTTP_200_OK,
+                        headers=headers)
+
 class ApplianceStartView(APIView):
 
     def post(self, request):
         serializer = StartApplianceSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        token_payload = AuthService.verify_token(data["token"])
         try:
-            service = ApplianceServiceFactory.create(
-                appliance_name=data["appliance_name"],
-                endpoint_id = token_payload["endpoint_id"]
+            token_payload = AuthService.verify_token(data["token"])
+            appliance = ApplianceCatalog.get(data["appliance_name"])
+            remaining = ApplianceService.claim_start(
+                endpoint_id=token_payload["endpoint_id"],
+                appliance_id=appliance.appliance_id,
+                room_num=token_payload["room_num"],
+                units=data["units"],
+                price=100*data["price"],
             )
-            remaining =service.start(room_num=token_payload["room_num"], units=data["units"], price = 100*data["price"])
             token = AuthService.encode(token_payload, "start", data)
 
             return Response(
@@ -91,15 +155,11 @@ class ApplianceFinishView(APIView):
         serializer = FinishApplianceSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        token_payload = AuthService.verify_token(data["token"])
-
         try:
-            service = ApplianceServiceFactory.create(
+            token_payload = AuthService.verify_token(data["token"])
+            ApplianceServiceFactory.finish_run(
                 appliance_name=token_payload["appliance_name"],
                 endpoint_id=token_payload["endpoint_id"],
-            )
-
-            service.finish(
                 final_units=data["units"],
                 final_price=100*data["price"],
                 aborted=data["aborted"],
@@ -116,3 +176,242 @@ class ApplianceFinishView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+
+class ApplianceStartBatchView(APIView):
+    """
+    Starts many appliances in one request, e.g. for a gateway controller.
+    Each operation succeeds or fails on its own; the claims and debits of
+    the whole batch take a fixed number of statements.
+    """
+
+    def post(self, request):
+        serializer = BatchStartApplianceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data["operations"]
+
+        results = [None] * len(operations)
+        payloads = {}
+        claims = []
+        for i, data in enumerate(operations):
+            try:
+                token_payload = AuthService.verify_token(data["token"])
+                appliance = ApplianceCatalog.get(data["appliance_name"])
+            except Exception as e:
+                results[i] = e
+                continue
+            payloads[i] = token_payload
+            claims.append((i, {
+                "endpoint_id": token_payload["endpoint_id"],
+                "appliance_id": appliance.appliance_id,
+                "room_num": token_payload["room_num"],
+                "units": data["units"],
+                "price": 100*data["price"],
+            }))
+
+        claimed = ApplianceService.claim_start_many([claim for _, claim in claims])
+        for (i, _claim), result in zip(claims, claimed):
+            results[i] = result
+
+        response = []
+        for i, (data, result) in enumerate(zip(operations, results)):
+            if isinstance(result, Exception):
+                response.append({
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "error": str(result),
+                })
+            else:
+                response.append({
+                    "status": status.HTTP_201_CREATED,
+                    "newbalance": result,
+                    "token": AuthService.encode(payloads[i], "start", data),
+                })
+
+        return Response({"results": response}, status=status.HTTP_200_OK)
+
+
+class ApplianceFinishBatchView(APIView):
+    """
+    Finishes many appliance runs in one request.
+    Each operation succeeds or fails on its own.
+    """
+
+    def post(self, request):
+        serializer = BatchFinishApplianceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data["operations"]
+
+        payloads = []
+        for data in operations:
+            try:
+                payloads.append(AuthService.verify_token(data["token"]))
+            except Exception as e:
+                payloads.append(e)
+
+        results = []
+
+        with transaction.atomic():
+            services = ApplianceServiceFactory.create_many([
+                (payload["appliance_name"], payload["endpoint_id"])
+                for payload in payloads
+                if not isinstance(payload, Exception) and "appliance_name" in payload
+            ])
+
+            for data, token_payload in zip(operations, payloads):
+                try:
+                    if isinstance(token_payload, Exception):
+                        raise token_payload
+
+                    service = services.get((token_payload.get("appliance_name"), token_payload["endpoint_id"]))
+                    if service is None:
+                        raise RuntimeError("Appliance state not found")
+
+                    service.finish(
+                        final_units=data["units"],
+                        final_price=100*data["price"],
+                        aborted=data["aborted"],
+                    )
+                    results.append({
+                        "status": status.HTTP_200_OK,
+                        "result": "finished",
+                    })
+
+                except Exception as e:
+                    results.append({
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "error": str(e),
+                    })
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class UsageView(APIView):
+    """
+    Daily usage of one room, appliance or endpoint from the daily_usage
+    rollup; ?since=YYYY-MM-DD&until=YYYY-MM-DD, last 30 days by default.
+    Staff only.
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    # DailyUsage foreign key the URL key selects, optionally followed by the
+    # field of the related model it is matched against, e.g. "room__key"
+    dimension_field: str = ""
+
+    def dimension(self, key) -> dict:
+        """
+        Raises:
+            ObjectDoesNotExist: if a looked-up related row does not exist.
+        """
+        field, _, lookup = self.dimension_field.partition("__")
+        if not lookup:
+            return {f"{field}_id": key}
+        related = DailyUsage._meta.get_field(field).related_model
+        return {f"{field}_id": related._default_manager.values_list("pk", flat=True).get(**{lookup: key})}
+
+    def get(self, request, key):
+        serializer = UsageQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data["since"]
+        until = serializer.validated_data["until"]
+        try:
+            with ReadConsistency.replica():
+                days = list(DailyUsage.objects.daily(since, until, **self.dimension(key)))
+        except ObjectDoesNotExist as e:
+            return Response({"error": str(e)},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        total = {col: sum(day[col] for day in days) for col in DailyUsage.objects.COUNTERS}
+        return Response({"since": since,
+                         "until": until,
+                         "days": days,
+                         "total": total},
+                        status=status.HTTP_200_OK)
+
+
+class RoomUsageView(UsageView):
+    dimension_field = "room__key"
+
+
+class ApplianceUsageView(UsageView):
+    dimension_field = "appliance__name"
+
+
+class EndpointUsageView(UsageView):
+    dimension_field = "endpoint"
+
+
+class StatementExportView(APIView):
+    """
+    Streams a statement (run charges, refunds and bank payments ordered
+    by time) as CSV or JSON lines; ?room=&since=&until=&output=csv|jsonl.
+    Under ASGI the rows are pulled in batches through astream, so the
+    export is never buffered. Staff only.
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        serializer = StatementQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        render, content_type = FORMATS[data["output"]]
+        rows = statement_rows(
+            room_key=data.get("room"),
+            since=data.get("since"),
+            until=data.get("until"),
+        )
+        content = render(rows)
+        if isinstance(request._request, ASGIRequest):
+            content = astream(content)
+        filename = f"statement-{data.get('room', 'all')}.{data['output']}"
+        return StreamingHttpResponse(
+            content,
+            content_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+
+class RoomProvisioningView(APIView):
+    """
+    Creates rooms in bulk ({"rooms": [keys], "balance", "rotate", "output"})
+    and streams their TOTP provisioning URIs as CSV or JSON lines for
+    printing QR codes. Staff only.
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = RoomProvisioningSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        provisioned = RoomProvisioning.provision(data["rooms"], balance=data["balance"], rotate=data["rotate"])
+
+        render, content_type = PROVISIONING_FORMATS[data["output"]]
+        return StreamingHttpResponse(
+            render(provisioned),
+            content_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="rooms.{data["output"]}"'},
+        )
+
+
+class MetricsView(View):
+    """
+    Request cost histograms in Prometheus text format, summed over all
+    worker processes when METRICS_DIR is set. The scraper has to send
+    METRICS_TOKEN as a bearer token; without a token only DEBUG serves it.
+    """
+
+    def get(self, request):
+        expected = settings.METRICS_TOKEN
+        if expected:
+            given = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            if not constant_time_compare(given, expected):
+                return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        elif not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(RequestMetrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
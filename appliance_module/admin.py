@@ -1,3 +1,75 @@
 from django.contrib import admin
 
-# Register your models here.
+from .model.appliance import Appliance
+from .model.endpoint import Endpoint
+from .model.room import Room
+from .model.runslog import RunsLog
+from .model.state import EndpointApplianceStateRoom
+from .servicies_factories.large_table_admin import LargeTableAdmin
+
+
+class ReadOnlyAdmin(LargeTableAdmin):
+    """
+    Append-only history; rows are written by the services only.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Room)
+class RoomAdmin(LargeTableAdmin):
+    list_display = ("key", "room_id", "balance")
+    # "=" keeps the lookup on the unique index instead of a LIKE scan
+    search_fields = ("=key",)
+    ordering = ("key",)
+
+    def get_readonly_fields(self, request, obj=None):
+        # balance changes go through the ledger
+        return ("balance",) if obj else ()
+
+
+@admin.register(RunsLog)
+class RunsLogAdmin(ReadOnlyAdmin):
+    list_display = (
+        "logid", "created_at", "room", "appliance", "endpoint_id", "state",
+        "inic_units", "inic_price", "finished_at", "final_units", "final_price",
+    )
+    list_select_related = ("room", "appliance")
+    list_filter = ("state", "appliance")
+    search_fields = ("=room__key",)
+    # runs_logs_created_idx; on PostgreSQL the range also prunes monthly partitions
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+
+
+@admin.register(EndpointApplianceStateRoom)
+class EndpointApplianceStateRoomAdmin(admin.ModelAdmin):
+    list_display = ("endpoint_id", "appliance", "is_occupied", "room", "log_id")
+    list_select_related = ("appliance", "room")
+    list_filter = ("is_occupied", "appliance")
+    search_fields = ("=endpoint__endpoint_id", "=room__key")
+    ordering = ("endpoint_id", "appliance_id")
+    show_full_result_count = False
+    raw_id_fields = ("endpoint", "room", "log")
+
+
+@admin.register(Endpoint)
+class EndpointAdmin(admin.ModelAdmin):
+    list_display = ("endpoint_id", "ip_add", "connection")
+    list_filter = ("connection",)
+    search_fields = ("=endpoint_id", "ip_add")
+    # token versions change through change_token / rotate_endpoint_tokens only
+    exclude = ("token",)
+
+
+@admin.register(Appliance)
+class ApplianceAdmin(admin.ModelAdmin):
+    list_display = ("name", "price_per_unit")
+    search_fields = ("name",)
@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class ApplianceModuleConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appliance_module'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .model.appliance import Appliance
+        from .model.endpoint import Endpoint
+        from .model.ledger import record_opening_balance
+        from .model.room import Room
+        from .model.usage import DailyUsage  # noqa: F401  registers the model
+        from .servicies_factories.appliance_catalog import ApplianceCatalog
+        from .servicies_factories.token_registry import EndpointTokenRegistry
+
+        post_save.connect(ApplianceCatalog.invalidate, sender=Appliance,
+                          dispatch_uid="appliance_catalog_save")
+        post_delete.connect(ApplianceCatalog.invalidate, sender=Appliance,
+                            dispatch_uid="appliance_catalog_delete")
+        post_save.connect(EndpointTokenRegistry.refresh, sender=Endpoint,
+                          dispatch_uid="endpoint_token_save")
+        post_delete.connect(EndpointTokenRegistry.forget, sender=Endpoint,
+                            dispatch_uid="endpoint_token_delete")
+        post_save.connect(record_opening_balance, sender=Room,
+                          dispatch_uid="room_ledger_opening")
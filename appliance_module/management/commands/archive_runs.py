@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appliance_module.servicies_factories.runs_partitions import RunsLogPartitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates upcoming monthly runs_logs partitions, exports partitions older "
+        "than the retention period to <dir>/<partition>.jsonl.gz and drops them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retention-months", type=int,
+                            help="Keep this many full months (default RUNS_LOG_RETENTION_MONTHS).")
+        parser.add_argument("--output-dir",
+                            help="Archive directory (default RUNS_LOG_ARCHIVE_DIR).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only list the partitions that would be archived.")
+
+    def handle(self, *args, **options):
+        if not RunsLogPartitions.supported():
+            raise CommandError("runs_logs is not partitioned (PostgreSQL only)")
+
+        if not options["dry_run"]:
+            for name in RunsLogPartitions.ensure():
+                self.stdout.write(f"Created partition {name}")
+
+        archived = RunsLogPartitions.archive(
+            directory=options["output_dir"],
+            retention_months=options["retention_months"],
+            dry_run=options["dry_run"],
+        )
+        if options["dry_run"]:
+            for name, _ in archived:
+                self.stdout.write(f"Would archive {name}")
+            return
+
+        for name, rows in archived:
+            self.stdout.write(f"Archived {name} ({rows} rows)")
+        self.stdout.write(self.style.SUCCESS(f"{len(archived)} partitions archived"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.servicies_factories.auth_service import AuthService
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints endpoint credentials (endpoint_id,token) for the heartbeat and the "
+        "event stream. They stay valid until ENDPOINT_TOKEN_LIFETIME passes or the "
+        "endpoint token is rotated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", type=int, action="append", dest="endpoints",
+                            help="Endpoint id; repeat for more. Required unless --all.")
+        parser.add_argument("--all", action="store_true", help="Every endpoint.")
+
+    def handle(self, *args, **options):
+        if not (options["all"] or options["endpoints"]):
+            raise CommandError("Select endpoints with --endpoint, or pass --all")
+
+        endpoints = Endpoint.objects.order_by("endpoint_id")
+        if options["endpoints"]:
+            endpoints = endpoints.filter(pk__in=options["endpoints"])
+        versions = dict(endpoints.values_list("endpoint_id", "token"))
+        missing = set(options["endpoints"] or ()) - versions.keys()
+        if missing:
+            raise CommandError(f"Unknown endpoints: {', '.join(map(str, sorted(missing)))}")
+
+        for endpoint_id, version in versions.items():
+            token = AuthService.encode({"endpoint_id": endpoint_id, "ver": version}, "endpoint")
+            self.stdout.write(f"{endpoint_id},{token}")
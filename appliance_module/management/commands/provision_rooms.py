@@ -0,0 +1,71 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from appliance_module.servicies_factories.room_provisioning import FORMATS, RoomProvisioning
+
+
+def read_keys(lines):
+    """
+    Room keys from the first column of a room list (plain or CSV); blank
+    lines, # comments and a header line are skipped.
+    """
+    keys = []
+    for number, line in enumerate(lines, 1):
+        value = line.split(",", 1)[0].strip().strip('"')
+        if not value or value.startswith("#"):
+            continue
+        try:
+            keys.append(int(value))
+        except ValueError:
+            if number == 1:
+                continue
+            raise CommandError(f"Line {number}: {value!r} is not a room key")
+    return keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates rooms from a room list (one key per line) with TOTP secrets in one "
+        "transaction and writes their provisioning URIs (QR payloads) for printing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Room list, or - for stdin.")
+        parser.add_argument("--balance", type=int, default=0, help="Opening balance of new rooms.")
+        parser.add_argument("--rotate", action="store_true",
+                            help="Replace the secrets of existing rooms too.")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", default="-", help="Output file, or - for stdout.")
+        parser.add_argument("--batch-size", type=int, default=settings.ROOM_PROVISIONING_BATCH)
+
+    def handle(self, *args, **options):
+        if options["balance"] < 0:
+            raise CommandError("--balance must not be negative")
+
+        if options["path"] == "-":
+            keys = read_keys(sys.stdin)
+        else:
+            with open(options["path"], encoding="utf-8-sig") as room_list:
+                keys = read_keys(room_list)
+
+        began = time.perf_counter()
+        provisioned = RoomProvisioning.provision(
+            keys, balance=options["balance"], rotate=options["rotate"], batch_size=options["batch_size"],
+        )
+        elapsed = time.perf_counter() - began
+
+        render, _ = FORMATS[options["format"]]
+        if options["output"] == "-":
+            sys.stdout.writelines(render(provisioned))
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                out.writelines(render(provisioned))
+
+        counts = {}
+        for room in provisioned:
+            counts[room.status] = counts.get(room.status, 0) + 1
+        summary = ", ".join(f"{status}={count}" for status, count in counts.items())
+        self.stderr.write(f"Provisioned {len(provisioned)} rooms in {elapsed:.2f}s ({summary})")
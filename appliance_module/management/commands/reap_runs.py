@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from appliance_module.servicies_factories.run_reaper import RunReaper
+
+
+class Command(BaseCommand):
+    help = "Finalizes RUNNING runs whose start token has expired and frees their machines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", choices=[RunReaper.CHARGE, RunReaper.REFUND])
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        reaped = RunReaper.reap(policy=options["policy"], batch_size=options["batch_size"])
+        self.stdout.write(f"Reaped {reaped} runs")
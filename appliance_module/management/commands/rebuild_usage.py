@@ -0,0 +1,84 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.usage import DailyUsage
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes daily_usage from runs_logs. Days before --since (by default "
+        "the first day still present in runs_logs) are kept, so rollups of "
+        "archived partitions survive."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First day to rebuild, YYYY-MM-DD.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        finished = RunsLog.objects.exclude(state=RunsLog.State.RUNNING)
+
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+        else:
+            first = finished.order_by("finished_at").values_list("finished_at", flat=True).first()
+            if first is None:
+                self.stdout.write("No finished runs")
+                return
+            since = timezone.localdate(first)
+
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        rollup = (
+            finished.filter(finished_at__gte=start)
+            .annotate(day=TruncDate("finished_at"))
+            .values("day", "room_id", "appliance_id", "endpoint_id")
+            .annotate(
+                run_count=Count("logid"),
+                aborted_count=Count("logid", filter=Q(state=RunsLog.State.ABORTED)),
+                unit_total=Sum("final_units"),
+                charged_total=Sum("final_price"),
+                refunded_total=Sum(Greatest(F("inic_price") - F("final_price"), Value(0))),
+            )
+            .order_by()
+        )
+
+        batch = []
+        rows = 0
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # finishing runs wait for the rebuild and then add on top of it
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"LOCK TABLE {DailyUsage._meta.db_table} IN SHARE ROW EXCLUSIVE MODE"
+                    )
+            deleted, _ = DailyUsage.objects.filter(day__gte=since).delete()
+
+            for row in rollup.iterator(chunk_size=options["batch_size"]):
+                batch.append(DailyUsage(
+                    day=row["day"],
+                    room_id=row["room_id"],
+                    appliance_id=row["appliance_id"],
+                    endpoint_id=row["endpoint_id"],
+                    runs=row["run_count"],
+                    aborted=row["aborted_count"],
+                    units=row["unit_total"] or 0,
+                    charged=row["charged_total"] or 0,
+                    refunded=row["refunded_total"] or 0,
+                ))
+                if len(batch) >= options["batch_size"]:
+                    rows += len(DailyUsage.objects.bulk_create(batch))
+                    batch = []
+            rows += len(DailyUsage.objects.bulk_create(batch))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt daily usage since {since}: removed {deleted}, inserted {rows} rows"
+        ))
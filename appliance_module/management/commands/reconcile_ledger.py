@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+
+
+class Command(BaseCommand):
+    help = "Verifies that every Room.balance equals the sum of its ledger entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=50,
+                            help="How many mismatching rooms to print.")
+
+    def handle(self, *args, **options):
+        rooms = Room._meta.db_table
+        ledger = RoomLedger._meta.db_table
+
+        # one hash join of the per-room sums against the snapshot
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT r.room_id, r."key", r.balance, COALESCE(l.total, 0)
+                FROM {rooms} r
+                LEFT JOIN (
+                    SELECT room_id, SUM(amount) AS total
+                    FROM {ledger}
+                    GROUP BY room_id
+                ) l ON l.room_id = r.room_id
+                WHERE r.balance <> COALESCE(l.total, 0)
+                ORDER BY r.room_id
+                """
+            )
+            mismatches = cursor.fetchall()
+
+        checked = Room.objects.count()
+        for room_id, key, balance, total in mismatches[: options["limit"]]:
+            self.stdout.write(
+                f"Room {room_id} (key={key}): balance={balance} ledger={total} diff={balance - total}"
+            )
+
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} of {checked} rooms do not match the ledger")
+        self.stdout.write(self.style.SUCCESS(f"All {checked} rooms match the ledger"))
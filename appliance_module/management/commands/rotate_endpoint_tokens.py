@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.servicies_factories.shared_state import cache_is_shared
+from appliance_module.servicies_factories.token_registry import EndpointTokenRegistry
+
+
+class Command(BaseCommand):
+    help = (
+        "Rotates endpoint token versions in one UPDATE, revoking every token issued "
+        "for them, and publishes the new versions to all workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", type=int, action="append", dest="endpoints",
+                            help="Endpoint id; repeat for more. Required unless --all.")
+        parser.add_argument("--appliance", action="append", dest="appliances",
+                            help="Endpoints hosting this appliance; repeat for more.")
+        parser.add_argument("--all", action="store_true", help="Rotate the whole fleet.")
+        parser.add_argument("--force", action="store_true",
+                            help="Rotate even though ENDPOINT_TOKEN_CACHE is per process; "
+                                 "workers then notice only on their next reload.")
+
+    def handle(self, *args, **options):
+        endpoints = Endpoint.objects.all()
+        if options["endpoints"]:
+            endpoints = endpoints.filter(pk__in=options["endpoints"])
+        if options["appliances"]:
+            endpoints = endpoints.filter(
+                endpointappliancestateroom__appliance__name__in=options["appliances"]
+            ).distinct()
+        if not (options["all"] or options["endpoints"] or options["appliances"]):
+            raise CommandError("Select endpoints with --endpoint / --appliance, or pass --all")
+        # this command is a process of its own, a per-process cache publishes to nobody
+        if not (options["force"] or cache_is_shared(settings.ENDPOINT_TOKEN_CACHE)):
+            if settings.ENDPOINT_TOKEN_CACHE == settings.ENDPOINT_PRESENCE_CACHE:
+                fix = (f"the token cache is the presence cache ({settings.ENDPOINT_PRESENCE_CACHE!r}), "
+                       f"set PRESENCE_REDIS_URL to put it in Redis")
+            else:
+                fix = "point ENDPOINT_TOKEN_CACHE at a shared (Redis) cache"
+            raise CommandError(
+                f"ENDPOINT_TOKEN_CACHE ({settings.ENDPOINT_TOKEN_CACHE!r}) is per process, the new "
+                f"versions would reach no worker and revoked tokens would stay valid for up to "
+                f"{EndpointTokenRegistry.TTL}s; {fix}, or pass --force"
+            )
+
+        versions = EndpointTokenRegistry.rotate(endpoints)
+        self.stdout.write(self.style.SUCCESS(f"Rotated tokens of {len(versions)} endpoints"))
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliance_module', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomLedger',
+            fields=[
+                ('entry_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('amount', models.IntegerField()),
+                ('kind', models.IntegerField(choices=[(1, 'Opening balance'), (2, 'Appliance start'), (3, 'Appliance refund'), (4, 'Bank payment')])),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.runslog')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='appliance_module.room')),
+            ],
+            options={
+                'db_table': 'room_ledger',
+            },
+        ),
+        # existing balances become the opening entry of each room's ledger
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO room_ledger (room_id, amount, kind, reference, created_at)
+                SELECT room_id, balance, 1, '', CURRENT_TIMESTAMP FROM rooms
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
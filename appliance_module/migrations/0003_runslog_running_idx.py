@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliance_module', '0002_roomledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='runslog',
+            index=models.Index(condition=models.Q(('state', 1)), fields=['created_at'], name='runs_logs_running_idx'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def month_start(day, shift=0):
+    months = day.year * 12 + day.month - 1 + shift
+    return day.replace(year=months // 12, month=months % 12 + 1, day=1)
+
+
+def partition_runs_logs(apps, schema_editor):
+    """
+    Rebuilds runs_logs as a table range partitioned by month on created_at.
+
+    PostgreSQL requires the partition key in the primary key, so the table
+    key becomes (logid, created_at); logid keeps its own sequence and stays
+    unique. Existing rows are copied into their monthly partitions.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    from django.utils import timezone
+
+    RunsLog = apps.get_model("appliance_module", "RunsLog")
+    qn = schema_editor.quote_name
+    table = RunsLog._meta.db_table
+
+    def fk(column, model):
+        target = model._meta
+        return (
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_{column}_fk')} "
+            f"FOREIGN KEY ({qn(column)}) REFERENCES {qn(target.db_table)} ({qn(target.pk.column)}) "
+            f"DEFERRABLE INITIALLY DEFERRED"
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO runs_logs_legacy")
+        cursor.execute("SELECT MIN(created_at), COALESCE(MAX(logid), 0) FROM runs_logs_legacy")
+        first, last_id = cursor.fetchone()
+
+        cursor.execute("ALTER TABLE runs_logs_legacy ALTER COLUMN logid DROP IDENTITY IF EXISTS")
+        cursor.execute("ALTER TABLE runs_logs_legacy ALTER COLUMN logid DROP DEFAULT")
+        cursor.execute("CREATE SEQUENCE runs_logs_logid_seq")
+        cursor.execute("SELECT setval('runs_logs_logid_seq', %s + 1, false)", [last_id])
+
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE runs_logs_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN logid SET DEFAULT nextval('runs_logs_logid_seq')")
+        cursor.execute(f"ALTER SEQUENCE runs_logs_logid_seq OWNED BY {qn(table)}.logid")
+        cursor.execute(f"CREATE TABLE runs_logs_default PARTITION OF {qn(table)} DEFAULT")
+
+        today = timezone.now().date()
+        month = month_start(first.date() if first else today)
+        while month <= month_start(today, 2):
+            end = month_start(month, 1)
+            cursor.execute(
+                f"CREATE TABLE {qn(f'runs_logs_y{month.year:04d}m{month.month:02d}')} "
+                f"PARTITION OF {qn(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+            )
+            month = end
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM runs_logs_legacy")
+        cursor.execute("DROP TABLE runs_logs_legacy")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (logid, created_at)")
+
+        cursor.execute(fk("endpoint_id", apps.get_model("appliance_module", "Endpoint")))
+        cursor.execute(fk("appliance_id", apps.get_model("appliance_module", "Appliance")))
+        cursor.execute(fk("room_id", apps.get_model("appliance_module", "Room")))
+        cursor.execute(f"CREATE INDEX runs_logs_appliance_id_idx ON {qn(table)} (appliance_id)")
+
+    for index in RunsLog._meta.indexes:
+        schema_editor.add_index(RunsLog, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliance_module', '0003_runslog_running_idx'),
+    ]
+
+    operations = [
+        # partitioned runs_logs cannot be the target of a foreign key on logid alone
+        migrations.AlterField(
+            model_name='roomledger',
+            name='log',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.runslog'),
+        ),
+        migrations.AlterField(
+            model_name='endpointappliancestateroom',
+            name='log',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.runslog'),
+        ),
+        migrations.AlterField(
+            model_name='runslog',
+            name='endpoint',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.endpoint'),
+        ),
+        migrations.AlterField(
+            model_name='runslog',
+            name='room',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.room'),
+        ),
+        migrations.RunPython(partition_runs_logs, elidable=False),
+        migrations.AddIndex(
+            model_name='runslog',
+            index=models.Index(fields=['room', 'created_at'], name='runs_logs_room_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runslog',
+            index=models.Index(fields=['endpoint', 'appliance', 'created_at'], name='runs_logs_ep_app_created_idx'),
+        ),
+    ]
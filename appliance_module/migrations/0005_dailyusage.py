@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliance_module', '0004_partition_runslog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('runs', models.IntegerField(default=0)),
+                ('aborted', models.IntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('charged', models.BigIntegerField(default=0)),
+                ('refunded', models.BigIntegerField(default=0)),
+                ('appliance', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.appliance')),
+                ('endpoint', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.endpoint')),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='appliance_module.room')),
+            ],
+            options={
+                'db_table': 'daily_usage',
+                'indexes': [
+                    models.Index(fields=['room', 'day'], name='daily_usage_room_day_idx'),
+                    models.Index(fields=['appliance', 'day'], name='daily_usage_appliance_day_idx'),
+                    models.Index(fields=['endpoint', 'day'], name='daily_usage_endpoint_day_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('day', 'room', 'appliance', 'endpoint'), name='daily_usage_key'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliance_module', '0005_dailyusage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='endpointappliancestateroom',
+            name='time_passed',
+        ),
+    ]
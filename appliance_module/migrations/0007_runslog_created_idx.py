@@ -0,0 +1,95 @@
+from django.db import migrations, models
+
+
+INDEX = models.Index(fields=['created_at'], name='runs_logs_created_idx')
+
+
+def _partitions(cursor, table):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass ORDER BY c.relname",
+        [table],
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def _drop_invalid(cursor, qn, name):
+    # an interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind
+    cursor.execute(
+        "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(%s) AND NOT indisvalid", [name]
+    )
+    if cursor.fetchone():
+        cursor.execute(f"DROP INDEX CONCURRENTLY {qn(name)}")
+
+
+def create_index(apps, schema_editor):
+    """
+    Indexes runs_logs(created_at) without blocking inserts.
+
+    A plain CREATE INDEX on the partitioned table holds a SHARE lock on
+    every partition until the whole index is built. Instead the parent
+    index is created ON ONLY runs_logs (instantly, invalid), each partition
+    is indexed with CREATE INDEX CONCURRENTLY and attached to it; once all
+    partitions are attached the parent index becomes valid. Partitions
+    created later get the index automatically. Re-running after an
+    interruption continues where it stopped.
+    """
+    RunsLog = apps.get_model('appliance_module', 'RunsLog')
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        schema_editor.add_index(RunsLog, INDEX)
+        return
+
+    qn = schema_editor.quote_name
+    table = RunsLog._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+        if cursor.fetchone() is None:
+            _drop_invalid(cursor, qn, INDEX.name)
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {qn(INDEX.name)} ON {qn(table)} (created_at)")
+            return
+
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {qn(INDEX.name)} ON ONLY {qn(table)} (created_at)")
+        for partition in _partitions(cursor, table):
+            cursor.execute(
+                "SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass AND x.indrelid = %s::regclass",
+                [INDEX.name, partition],
+            )
+            if cursor.fetchone():
+                continue
+            name = f'{partition}_created_idx'
+            _drop_invalid(cursor, qn, name)
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {qn(name)} ON {qn(partition)} (created_at)")
+            cursor.execute(f"ALTER INDEX {qn(INDEX.name)} ATTACH PARTITION {qn(name)}")
+
+
+def drop_index(apps, schema_editor):
+    RunsLog = apps.get_model('appliance_module', 'RunsLog')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_index(RunsLog, INDEX)
+        return
+    # dropping the parent index drops the attached partition indexes with it
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(INDEX.name)}")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('appliance_module', '0006_remove_endpointappliancestateroom_time_passed'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='runslog', index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_index, drop_index, elidable=False),
+            ],
+        ),
+    ]
@@ -1,7 +1,46 @@
 from __future__ import annotations
 
-import random
-from django.db import models
+import secrets
+from django.db import models, transaction
+from django.db.models import Case, IntegerField, Value, When
+
+
+# token versions fit a 32-bit signed column
+MAX_TOKEN_VERSION = 2**31 - 1
+
+
+def new_token_version(current: int | None = None) -> int:
+    """
+    Cryptographically random token version different from current.
+    """
+    while True:
+        version = secrets.randbelow(MAX_TOKEN_VERSION) + 1
+        if version != current:
+            return version
+
+
+class EndpointQuerySet(models.QuerySet["Endpoint"]):
+
+    def rotate_tokens(self) -> dict[int, int]:
+        """
+        Gives every endpoint of the queryset a new random token version in
+        one UPDATE, revoking all tokens issued for the old versions.
+
+        Returns:
+            endpoint_id -> new version.
+        """
+        with transaction.atomic(using=self.db):
+            current = dict(self.values_list("endpoint_id", "token"))
+            if not current:
+                return {}
+            versions = {endpoint_id: new_token_version(token) for endpoint_id, token in current.items()}
+            self.model.objects.filter(pk__in=versions).update(
+                token=Case(
+                    *(When(pk=endpoint_id, then=Value(version)) for endpoint_id, version in versions.items()),
+                    output_field=IntegerField(),
+                )
+            )
+        return versions
 
 
 class Endpoint(models.Model):
@@ -14,6 +53,8 @@ class Endpoint(models.Model):
     connection: bool = models.BooleanField(default=False)
     token: int = models.IntegerField(default=1)
 
+    objects = EndpointQuerySet.as_manager()
+
     class Meta:
         db_table = "endpoints"
 
@@ -24,5 +65,5 @@ class Endpoint(models.Model):
         """
         Regenerates token version.
         """
-        self.token = random.randint(1, 1_000_000)
+        self.token = new_token_version(self.token)
         self.save(update_fields=["token"])
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from django.db import models
+
+from .room import Room
+from .runslog import RunsLog
+
+
+class RoomLedgerManager(models.Manager["RoomLedger"]):
+
+    def record(
+        self,
+        room_id: int,
+        amount: int,
+        kind: int,
+        log_id: int | None = None,
+        reference: str = "",
+    ) -> "RoomLedger":
+        return self.create(
+            room_id=room_id,
+            amount=amount,
+            kind=kind,
+            log_id=log_id,
+            reference=reference,
+        )
+
+
+def record_opening_balance(sender, instance: Room, created: bool, raw: bool = False, **kwargs) -> None:
+    """
+    post_save receiver: a new room starts its ledger with its balance.
+    """
+    if created and not raw:
+        RoomLedger.objects.record(instance.pk, instance.balance, RoomLedger.Kind.OPENING)
+
+
+class RoomLedger(models.Model):
+    """
+    Append-only record of every balance change of a room.
+
+    Room.balance is a materialized snapshot; the sum of amounts for a
+    room must always equal it (see manage.py reconcile_ledger).
+    """
+
+    class Kind(models.IntegerChoices):
+        OPENING = 1, "Opening balance"
+        DEBIT = 2, "Appliance start"
+        REFUND = 3, "Appliance refund"
+        CREDIT = 4, "Bank payment"
+
+    entry_id: int = models.BigAutoField(primary_key=True)
+
+    room = models.ForeignKey(Room, on_delete=models.PROTECT)
+    amount: int = models.IntegerField()
+    kind: int = models.IntegerField(choices=Kind.choices)
+
+    # not enforced by the database: runs_logs is partitioned and archived runs are dropped
+    log = models.ForeignKey(
+        RunsLog, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False
+    )
+    reference: str = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RoomLedgerManager()
+
+    class Meta:
+        db_table = "room_ledger"
+
+    def __str__(self) -> str:
+        return f"Ledger {self.entry_id} room={self.room_id} {self.amount:+d} ({self.get_kind_display()})"
@@ -1,6 +1,48 @@
 from __future__ import annotations
-from django.db import models
-from django.db.models import Q, CheckConstraint
+from django.db import connections, models, router
+from django.db.models import Case, CheckConstraint, F, IntegerField, Q, Value, When
+
+
+class RoomManager(models.Manager["Room"]):
+    """
+    Custom manager for conditional balance updates.
+    """
+
+    def debit(self, key: int, amount: int) -> tuple[int, int] | None:
+        """
+        Withdraws amount from the room in a single conditional UPDATE.
+
+        Returns:
+            (room_id, new balance), or None if the room does not exist
+            or its balance is insufficient.
+        """
+        table = self.model._meta.db_table
+        db = router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET balance = balance - %s '
+                f'WHERE "key" = %s AND balance >= %s '
+                f'RETURNING room_id, balance',
+                [amount, key, amount],
+            )
+            return cursor.fetchone()
+
+    def credit_many(self, amounts: dict[int, int]) -> int:
+        """
+        Adds amounts (room_id -> amount) to many rooms in one UPDATE.
+
+        Returns:
+            Number of rooms updated.
+        """
+        if not amounts:
+            return 0
+
+        return self.filter(pk__in=amounts).update(
+            balance=F("balance") + Case(
+                *(When(pk=room_id, then=Value(amount)) for room_id, amount in amounts.items()),
+                output_field=IntegerField(),
+            )
+        )
 
 
 class Room(models.Model):
@@ -12,6 +54,8 @@ class Room(models.Model):
     balance: int = models.IntegerField()
     key: int = models.BigIntegerField(unique=True)
 
+    objects = RoomManager()
+
     class Meta:
         db_table = "rooms"
         constraints = [
@@ -24,22 +68,28 @@ class Room(models.Model):
     def __str__(self) -> str:
         return f"Room {self.room_id} — balance={self.balance} - key={self.key}"
 
-    def withdraw(self, amount: int) -> None:
+    def withdraw(self, amount: int, log_id: int | None = None) -> None:
         """
-        Withdraw funds from the room.
+        Withdraw funds from the room and record the debit in its ledger.
 
         Raises:
             RuntimeError: if insufficient balance.
         """
+        from .ledger import RoomLedger
+
         if amount > self.balance:
             raise RuntimeError("Insufficient balance")
 
         self.balance -= amount
         self.save(update_fields=["balance"])
+        RoomLedger.objects.record(self.pk, -amount, RoomLedger.Kind.DEBIT, log_id=log_id)
 
-    def deposit(self, amount: int) -> None:
+    def deposit(self, amount: int, log_id: int | None = None) -> None:
         """
-        Deposit funds back to the room.
+        Deposit funds back to the room and record the refund in its ledger.
         """
+        from .ledger import RoomLedger
+
         self.balance += amount
         self.save(update_fields=["balance"])
+        RoomLedger.objects.record(self.pk, amount, RoomLedger.Kind.REFUND, log_id=log_id)
@@ -20,9 +20,10 @@ class RunsLog(models.Model):
 
     logid: int = models.BigAutoField(primary_key=True)
 
-    endpoint = models.ForeignKey(Endpoint, on_delete=models.PROTECT)
+    # endpoint and room lookups are served by the composite indexes below
+    endpoint = models.ForeignKey(Endpoint, on_delete=models.PROTECT, db_index=False)
     appliance = models.ForeignKey(Appliance, on_delete=models.PROTECT)
-    room = models.ForeignKey(Room, on_delete=models.PROTECT)
+    room = models.ForeignKey(Room, on_delete=models.PROTECT, db_index=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -39,7 +40,24 @@ class RunsLog(models.Model):
     final_price: int | None = models.IntegerField(null=True, blank=True)
 
     class Meta:
+        # On PostgreSQL the table is range partitioned by month on created_at
+        # (see RunsLogPartitions); the primary key there is (logid, created_at).
         db_table = "runs_logs"
+        indexes = [
+            models.Index(fields=["room", "created_at"], name="runs_logs_room_created_idx"),
+            models.Index(
+                fields=["endpoint", "appliance", "created_at"],
+                name="runs_logs_ep_app_created_idx",
+            ),
+            # time ranges over all rooms (admin date hierarchy and ordering)
+            models.Index(fields=["created_at"], name="runs_logs_created_idx"),
+            # only RUNNING rows are indexed, so the reaper never scans finished history
+            models.Index(
+                fields=["created_at"],
+                name="runs_logs_running_idx",
+                condition=models.Q(state=1),
+            ),
+        ]
 
     def finish(
         self,
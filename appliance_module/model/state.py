@@ -25,6 +25,22 @@ class EndpointApplianceStateRoomManager(models.Manager["EndpointApplianceStateRo
             .get(endpoint_id=endpoint_id, appliance_id=appliance_id)
         )
 
+    def claim(self, endpoint_id: int, appliance_id: int) -> bool:
+        """
+        Marks the state as occupied in one conditional UPDATE.
+
+        Returns:
+            True if this call flipped is_occupied from False to True.
+        """
+
+        return bool(
+            self.filter(
+                endpoint_id=endpoint_id,
+                appliance_id=appliance_id,
+                is_occupied=False,
+            ).update(is_occupied=True)
+        )
+
 
 class EndpointApplianceStateRoom(models.Model):
     """
@@ -37,7 +53,8 @@ class EndpointApplianceStateRoom(models.Model):
     is_occupied: bool = models.BooleanField(default=False)
 
     room = models.ForeignKey(Room, null=True, on_delete=models.PROTECT)
-    log = models.ForeignKey(RunsLog, null=True, on_delete=models.PROTECT)
+    # runs_logs is partitioned, so the reference is not enforced by the database
+    log = models.ForeignKey(RunsLog, null=True, on_delete=models.PROTECT, db_constraint=False)
 
     objects = EndpointApplianceStateRoomManager()
 
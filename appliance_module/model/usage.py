@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from datetime import date
+
+from django.db import connections, models, router
+from django.utils import timezone
+
+from .appliance import Appliance
+from .endpoint import Endpoint
+from .room import Room
+from .runslog import RunsLog
+
+
+class DailyUsageManager(models.Manager["DailyUsage"]):
+
+    COUNTERS = ("runs", "aborted", "units", "charged", "refunded")
+
+    @staticmethod
+    def entry(log: RunsLog) -> tuple:
+        """
+        Rollup entry of one finished run:
+        (day, room_id, appliance_id, endpoint_id, runs, aborted, units, charged, refunded)
+        """
+        return (
+            timezone.localdate(log.finished_at),
+            log.room_id,
+            log.appliance_id,
+            log.endpoint_id,
+            1,
+            int(log.state == RunsLog.State.ABORTED),
+            log.final_units or 0,
+            log.final_price or 0,
+            max(log.inic_price - (log.final_price or 0), 0),
+        )
+
+    def record_run(self, log: RunsLog) -> None:
+        self.record_many([self.entry(log)])
+
+    def record_many(self, entries) -> None:
+        """
+        Adds entries to their daily rows with one INSERT ... ON CONFLICT DO
+        UPDATE, so concurrent finishes only ever increment the counters.
+        """
+        totals: dict[tuple, list[int]] = {}
+        for day, room_id, appliance_id, endpoint_id, *counters in entries:
+            key = (day, room_id, appliance_id, endpoint_id)
+            row = totals.setdefault(key, [0] * len(self.COUNTERS))
+            for i, value in enumerate(counters):
+                row[i] += value
+        if not totals:
+            return
+
+        connection = connections[router.db_for_write(self.model)]
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+
+        rows = []
+        params = []
+        # a stable order keeps concurrent upserts from deadlocking
+        for (day, room_id, appliance_id, endpoint_id), counters in sorted(totals.items()):
+            rows.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s)")
+            params += [connection.ops.adapt_datefield_value(day), room_id, appliance_id, endpoint_id, *counters]
+
+        updates = ", ".join(f"{col} = {table}.{col} + excluded.{col}" for col in self.COUNTERS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f"(day, room_id, appliance_id, endpoint_id, {', '.join(self.COUNTERS)}) "
+                f"VALUES {', '.join(rows)} "
+                f"ON CONFLICT (day, room_id, appliance_id, endpoint_id) DO UPDATE SET {updates}",
+                params,
+            )
+
+    def daily(self, since: date, until: date, **dimension):
+        """
+        Per-day totals for one room, appliance or endpoint, e.g.
+        daily(since, until, room_id=1). Reads at most one row per day and
+        appliance/endpoint combination, never the runs themselves.
+        """
+        return (
+            self.filter(day__range=(since, until), **dimension)
+            .values("day")
+            .annotate(**{col: models.Sum(col) for col in self.COUNTERS})
+            .order_by("day")
+        )
+
+
+class DailyUsage(models.Model):
+    """
+    Finished runs aggregated per day, room, appliance and endpoint.
+
+    Maintained in the transaction that finishes (or reaps) a run; money
+    is in haléře like everywhere else. Rebuild with manage.py rebuild_usage.
+    """
+
+    day = models.DateField()
+
+    # every lookup is by one of the composite indexes below
+    room = models.ForeignKey(Room, on_delete=models.PROTECT, db_index=False)
+    appliance = models.ForeignKey(Appliance, on_delete=models.PROTECT, db_index=False)
+    endpoint = models.ForeignKey(Endpoint, on_delete=models.PROTECT, db_index=False)
+
+    runs: int = models.IntegerField(default=0)
+    aborted: int = models.IntegerField(default=0)
+    units: int = models.BigIntegerField(default=0)
+    charged: int = models.BigIntegerField(default=0)
+    refunded: int = models.BigIntegerField(default=0)
+
+    objects = DailyUsageManager()
+
+    class Meta:
+        db_table = "daily_usage"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "room", "appliance", "endpoint"],
+                name="daily_usage_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["room", "day"], name="daily_usage_room_day_idx"),
+            models.Index(fields=["appliance", "day"], name="daily_usage_appliance_day_idx"),
+            models.Index(fields=["endpoint", "day"], name="daily_usage_endpoint_day_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Usage {self.day} room={self.room_id} appliance={self.appliance_id} runs={self.runs}"
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import NamedTuple
+
+from django.db import transaction
+
+from appliance_module.model.appliance import Appliance
+
+
+class CatalogEntry(NamedTuple):
+    appliance_id: int
+    name: str
+    price_per_unit: int
+
+
+class ApplianceCatalog:
+    """
+    In-process, versioned cache of the appliance catalog.
+
+    The catalog is loaded with one query and kept until an Appliance is
+    saved or deleted in this process. Invalidation is in-process only:
+    other worker processes (and Celery workers) keep serving the old
+    catalog until their TTL runs out, i.e. for up to TTL seconds.
+    """
+
+    TTL = 300
+
+    _lock = threading.Lock()
+    _version: int = 0
+    _loaded_at: float | None = None
+    _entries: dict[str, CatalogEntry] = {}
+    _items: list[dict] = []
+    _etag: str = ""
+
+    @classmethod
+    def invalidate(cls, **kwargs) -> None:
+        """
+        Drops the cached catalog. Usable directly as a signal receiver.
+
+        The drop is repeated on commit, so a reload that happened before
+        the change became visible is not kept.
+        """
+        cls._drop()
+        transaction.on_commit(cls._drop)
+
+    @classmethod
+    def _drop(cls) -> None:
+        with cls._lock:
+            cls._version += 1
+            cls._loaded_at = None
+
+    @classmethod
+    def _fresh(cls) -> bool:
+        return cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls.TTL
+
+    @classmethod
+    def _rows(cls):
+        return Appliance.objects.order_by("name").values_list(
+            "appliance_id", "name", "price_per_unit"
+        )
+
+    @classmethod
+    def _store(cls, rows) -> None:
+        entries = {row[1]: CatalogEntry(*row) for row in rows}
+        items = [{"name": e.name, "value": e.price_per_unit} for e in entries.values()]
+        digest = hashlib.sha1(
+            json.dumps(items, separators=(",", ":")).encode()
+        ).hexdigest()
+
+        cls._entries = entries
+        cls._items = items
+        cls._etag = f'"{digest}"'
+        cls._loaded_at = time.monotonic()
+
+    @classmethod
+    def _load(cls) -> None:
+        if cls._fresh():
+            return
+
+        with cls._lock:
+            if cls._fresh():
+                return
+            cls._store(list(cls._rows()))
+
+    @classmethod
+    async def _aload(cls) -> None:
+        if cls._fresh():
+            return
+
+        # the query runs without the lock, so an invalidate() during it would be
+        # overwritten by the rows read before it; those are thrown away and reread
+        while True:
+            version = cls._version
+            rows = [row async for row in cls._rows()]
+            with cls._lock:
+                if cls._version == version:
+                    cls._store(rows)
+                    return
+
+    @classmethod
+    def _lookup(cls, name: str) -> CatalogEntry:
+        try:
+            return cls._entries[name]
+        except KeyError:
+            raise Appliance.DoesNotExist("Appliance matching query does not exist.")
+
+    @classmethod
+    def get(cls, name: str) -> CatalogEntry:
+        """
+        Raises:
+            Appliance.DoesNotExist: if no appliance has this name.
+        """
+        cls._load()
+        return cls._lookup(name)
+
+    @classmethod
+    async def aget(cls, name: str) -> CatalogEntry:
+        # get() would reload synchronously if the TTL ran out in between
+        await cls._aload()
+        return cls._lookup(name)
+
+    @classmethod
+    def items(cls) -> list[dict]:
+        """
+        Catalog in the API shape [{"name": ..., "value": ...}].
+        """
+        cls._load()
+        return cls._items
+
+    @classmethod
+    async def aitems(cls) -> list[dict]:
+        await cls._aload()
+        return cls._items
+
+    @classmethod
+    def etag(cls) -> str:
+        cls._load()
+        return cls._etag
+
+    @classmethod
+    def version(cls) -> int:
+        return cls._version
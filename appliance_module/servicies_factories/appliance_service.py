@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import BigIntegerField, Case, IntegerField, Q, Value, When
 
+from appliance_module.model.ledger import RoomLedger
 from appliance_module.model.room import Room
 from appliance_module.model.runslog import RunsLog
 from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.model.usage import DailyUsage
+from .endpoint_events import EndpointEvents
+from .endpoint_presence import EndpointPresence
+from .request_metrics import timed
 
 
 
@@ -22,35 +29,194 @@ class ApplianceService:
 
     # -----------------------------
 
-    @transaction.atomic
     def start(self, room_num: int, units: int, price: int) -> int:
         """
-        Starts appliance run.
+        Starts appliance run on this state, see claim_start.
+        """
+
+        return ApplianceService.claim_start(
+            endpoint_id=self.state.endpoint_id,
+            appliance_id=self.state.appliance_id,
+            room_num=room_num,
+            units=units,
+            price=price,
+        )
+
+    # -----------------------------
+
+    @staticmethod
+    @timed("txn")
+    @transaction.atomic
+    def claim_start(
+        endpoint_id: int,
+        appliance_id: int,
+        room_num: int,
+        units: int,
+        price: int,
+    ) -> int:
+        """
+        Starts appliance run without loading the state first.
+
+        The state row is claimed and the room debited with conditional
+        UPDATEs, so two concurrent starts can never both succeed.
         """
 
-        if self.state.is_occupied:
+        ApplianceService._check_online(endpoint_id)
+
+        states = EndpointApplianceStateRoom.objects
+        if not states.claim(endpoint_id, appliance_id):
+            if not states.filter(endpoint_id=endpoint_id, appliance_id=appliance_id).exists():
+                raise EndpointApplianceStateRoom.DoesNotExist(
+                    "EndpointApplianceStateRoom matching query does not exist."
+                )
             raise RuntimeError("Appliance already running")
 
-        room = Room.objects.select_for_update().get(key=room_num)
-        room.withdraw(price)
+        debited = Room.objects.debit(room_num, price)
+        if debited is None:
+            if not Room.objects.filter(key=room_num).exists():
+                raise Room.DoesNotExist("Room matching query does not exist.")
+            raise RuntimeError("Insufficient balance")
+        room_id, balance = debited
 
         log = RunsLog.objects.create(
-            endpoint=self.state.endpoint,
-            appliance=self.state.appliance,
-            room=room,
+            endpoint_id=endpoint_id,
+            appliance_id=appliance_id,
+            room_id=room_id,
             inic_units=units,
             inic_price=price,
         )
+        RoomLedger.objects.record(room_id, -price, RoomLedger.Kind.DEBIT, log_id=log.pk)
 
-        self.state.is_occupied = True
-        self.state.room = room
-        self.state.log = log
-        self.state.save()
+        states.filter(endpoint_id=endpoint_id, appliance_id=appliance_id).update(
+            room_id=room_id,
+            log_id=log.pk,
+        )
+        EndpointEvents.emit(
+            endpoint_id, EndpointEvents.START,
+            appliance_id=appliance_id, log_id=log.pk, units=units,
+        )
+
+        return balance
+
+    # -----------------------------
+
+    @staticmethod
+    @timed("txn")
+    @transaction.atomic
+    def claim_start_many(operations: list[dict]) -> list[int | Exception]:
+        """
+        Starts many appliance runs with a fixed number of statements.
+
+        operations are dicts with the claim_start arguments. State rows
+        are locked ordered by (endpoint, appliance) and rooms by key, so
+        concurrent batches (and single starts, which lock a state before
+        a room too) cannot deadlock. Each operation is checked like
+        claim_start and fails on its own.
+
+        Returns:
+            New room balance, or the exception, for each operation.
+        """
+
+        if not operations:
+            return []
+
+        results: list[int | Exception | None] = [None] * len(operations)
+        offline = {
+            op["endpoint_id"] for op in operations
+            if settings.ENDPOINT_REQUIRE_PRESENCE and not EndpointPresence.is_online(op["endpoint_id"])
+        }
+
+        lookup = Q()
+        for op in operations:
+            lookup |= Q(endpoint_id=op["endpoint_id"], appliance_id=op["appliance_id"])
+        states = {
+            (state.endpoint_id, state.appliance_id): state
+            for state in EndpointApplianceStateRoom.objects
+            .select_for_update()
+            .filter(lookup)
+            .order_by("endpoint_id", "appliance_id")
+        }
+        rooms = {
+            room.key: room
+            for room in Room.objects
+            .select_for_update()
+            .filter(key__in={op["room_num"] for op in operations})
+            .order_by("key")
+            .only("room_id", "key", "balance")
+        }
+
+        accepted = []
+        for i, op in enumerate(operations):
+            state = states.get((op["endpoint_id"], op["appliance_id"]))
+            room = rooms.get(op["room_num"])
+            if op["endpoint_id"] in offline:
+                results[i] = RuntimeError("Endpoint is offline")
+            elif state is None:
+                results[i] = EndpointApplianceStateRoom.DoesNotExist(
+                    "EndpointApplianceStateRoom matching query does not exist."
+                )
+            elif state.is_occupied:
+                results[i] = RuntimeError("Appliance already running")
+            elif room is None:
+                results[i] = Room.DoesNotExist("Room matching query does not exist.")
+            elif room.balance < op["price"]:
+                results[i] = RuntimeError("Insufficient balance")
+            else:
+                state.is_occupied = True
+                room.balance -= op["price"]
+                results[i] = room.balance
+                accepted.append((op, state, room))
 
-        return room.balance
+        if not accepted:
+            return results
+
+        debits = {}
+        for op, _state, room in accepted:
+            debits[room.room_id] = debits.get(room.room_id, 0) - op["price"]
+        Room.objects.credit_many(debits)
+
+        logs = RunsLog.objects.bulk_create(
+            RunsLog(
+                endpoint_id=op["endpoint_id"],
+                appliance_id=op["appliance_id"],
+                room_id=room.room_id,
+                inic_units=op["units"],
+                inic_price=op["price"],
+            )
+            for op, _state, room in accepted
+        )
+        RoomLedger.objects.bulk_create(
+            RoomLedger(room_id=log.room_id, amount=-log.inic_price, kind=RoomLedger.Kind.DEBIT, log_id=log.pk)
+            for log in logs
+        )
+        EndpointApplianceStateRoom.objects.filter(pk__in=[state.pk for _op, state, _room in accepted]).update(
+            is_occupied=True,
+            room_id=Case(
+                *(When(pk=state.pk, then=Value(room.room_id)) for _op, state, room in accepted),
+                output_field=IntegerField(),
+            ),
+            log_id=Case(
+                *(When(pk=state.pk, then=Value(log.pk)) for (_op, state, _room), log in zip(accepted, logs)),
+                output_field=BigIntegerField(),
+            ),
+        )
+        for log in logs:
+            EndpointEvents.emit(
+                log.endpoint_id, EndpointEvents.START,
+                appliance_id=log.appliance_id, log_id=log.pk, units=log.inic_units,
+            )
+        return results
 
     # -----------------------------
 
+    @staticmethod
+    def _check_online(endpoint_id: int) -> None:
+        if settings.ENDPOINT_REQUIRE_PRESENCE and not EndpointPresence.is_online(endpoint_id):
+            raise RuntimeError("Endpoint is offline")
+
+    # -----------------------------
+
+    @timed("txn")
     @transaction.atomic
     def finish(self, final_units: int,final_price: int, aborted: bool = False) -> None:
         """
@@ -69,17 +235,22 @@ class ApplianceService:
             final_price=final_price,
             aborted=aborted
         )
+        DailyUsage.objects.record_run(log)
 
         diff = log.inic_price - final_price
 
         if diff > 0:
-            room = Room.objects.select_for_update().get(pk=log.room.pk)
-            room.deposit(diff)
+            room = Room.objects.select_for_update().get(pk=log.room_id)
+            room.deposit(diff, log_id=log.pk)
 
         self.state.is_occupied = False
         self.state.room = None
         self.state.log = None
         self.state.save()
+        EndpointEvents.emit(
+            self.state.endpoint_id, EndpointEvents.ABORT if aborted else EndpointEvents.FINISH,
+            appliance_id=self.state.appliance_id, log_id=log.pk, units=final_units,
+        )
 
     # -----------------------------
 
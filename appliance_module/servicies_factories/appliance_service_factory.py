@@ -1,32 +1,114 @@
 from __future__ import annotations
 from django.db import transaction
+from django.db.models import Q
+from django.db.transaction import TransactionManagementError
 
 from appliance_module.model.appliance import Appliance
-from appliance_module.model.endpoint import Endpoint
 from appliance_module.model.state import EndpointApplianceStateRoom   
+from .appliance_catalog import ApplianceCatalog
 from .appliance_service import ApplianceService
+from .request_metrics import timed
 
 
 class ApplianceServiceFactory:
     """
     Responsible for constructing ApplianceService with locked DB rows.
+
+    The row locks last until the end of the caller's transaction, so the
+    services have to be built and used inside one.
     """
 
     @staticmethod
-    @transaction.atomic
+    def _require_transaction() -> None:
+        if not transaction.get_connection().in_atomic_block:
+            raise TransactionManagementError(
+                "ApplianceServiceFactory locks state rows; call it inside transaction.atomic()"
+            )
+
+    @staticmethod
     def create(
         appliance_name: str,
         endpoint_id: int
     ) -> ApplianceService:
+        """
+        Rows are locked, so call it inside a transaction.
+        """
 
-        appliance = Appliance.objects.get(name=appliance_name)
-        endpoint = Endpoint.objects.get(pk=endpoint_id)
-
+        ApplianceServiceFactory._require_transaction()
         state = (
             EndpointApplianceStateRoom.objects
-            .get(endpoint=endpoint, appliance=appliance)
+            .select_related("endpoint", "appliance", "room", "log")
+            .select_for_update(of=("self",))
+            .get(
+                endpoint_id=endpoint_id,
+                appliance_id=ApplianceCatalog.get(appliance_name).appliance_id,
+            )
         )
 
         return ApplianceService(
             state=state
         )
+
+    @staticmethod
+    @timed("txn")
+    @transaction.atomic
+    def finish_run(
+        appliance_name: str,
+        endpoint_id: int,
+        final_units: int,
+        final_price: int,
+        aborted: bool = False,
+    ) -> None:
+        """
+        Finishes a run while holding the state row lock, so the run
+        reaper cannot finalize the same run concurrently.
+        """
+
+        ApplianceServiceFactory.create(
+            appliance_name=appliance_name,
+            endpoint_id=endpoint_id,
+        ).finish(
+            final_units=final_units,
+            final_price=final_price,
+            aborted=aborted,
+        )
+
+    @staticmethod
+    def create_many(
+        keys: list[tuple[str, int]]
+    ) -> dict[tuple[str, int], ApplianceService]:
+        """
+        Builds services for many (appliance_name, endpoint_id) pairs
+        with a single query. Pairs without a state are left out.
+
+        Rows are locked, so call it inside a transaction.
+        """
+
+        if not keys:
+            return {}
+        ApplianceServiceFactory._require_transaction()
+
+        lookup = Q()
+        for appliance_name, endpoint_id in set(keys):
+            try:
+                appliance_id = ApplianceCatalog.get(appliance_name).appliance_id
+            except Appliance.DoesNotExist:
+                continue
+            lookup |= Q(endpoint_id=endpoint_id, appliance_id=appliance_id)
+
+        if not lookup:
+            return {}
+
+        states = (
+            EndpointApplianceStateRoom.objects
+            .select_related("endpoint", "appliance", "room", "log")
+            .select_for_update(of=("self",))
+            .filter(lookup)
+            # a fixed lock order, so concurrent batches cannot deadlock on the states
+            .order_by("endpoint_id", "appliance_id")
+        )
+
+        return {
+            (state.appliance.name, state.endpoint_id): ApplianceService(state=state)
+            for state in states
+        }
@@ -1,8 +1,10 @@
 from django.conf import settings
-import jwt, pyotp
+import jwt
 from datetime import datetime, timedelta
-from appliance_module.model.room import Room
-from appliance_module.model.roomtotp import RoomTOTP
+from appliance_module.model.endpoint import Endpoint
+from .token_registry import EndpointTokenRegistry, VerifiedTokenCache
+from .request_metrics import timed
+from .totp_verifier import TOTPVerifier
 
 
 
@@ -10,33 +12,100 @@ class AuthService:
 
     @staticmethod
     def verify_room(payload, code):
-        room = Room.objects.get(key=payload["room_num"])
-        room_secret = RoomTOTP.objects.get(room=room).secret
-        totp = pyotp.TOTP(room_secret)
+        access, _balance = AuthService.authorize_room(payload, code)
+        return access
 
-        if not totp.verify(code, valid_window=1):
-            raise ValueError("Invalid authorization code")
-        
+    @staticmethod
+    def authorize_room(payload, code):
+        """
+        Verifies the room TOTP code and returns (access token, room balance).
+        """
+        balance = TOTPVerifier.verify(payload["room_num"], code)
+        return AuthService._access_token(payload), balance
+
+    @staticmethod
+    async def aauthorize_room(payload, code):
+        balance = await TOTPVerifier.averify(payload["room_num"], code)
+        return AuthService._access_token(payload), balance
+
+    @staticmethod
+    @timed("token")
+    def _access_token(payload):
         payload = {
             "iss"  : "Backend",
             "token_type": "access",
             "room_num": payload["room_num"],
             "endpoint_id": payload["endpoint_id"],
+            "ver": payload["ver"],
             "exp": int((datetime.now() + settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]).timestamp()),
         }
         access = jwt.encode(payload, settings.SIMPLE_JWT["SIGNING_KEY"], algorithm=settings.SIMPLE_JWT["ALGORITHM"])
 
         return str(access)
+
     @staticmethod
     def verify_token(token):
+        payload = AuthService._decode(token)
+        try:
+            current = EndpointTokenRegistry.version(payload["endpoint_id"])
+        except (KeyError, Endpoint.DoesNotExist):
+            raise ValueError("Invalid token")
+        return AuthService._check_version(payload, current)
+
+    @staticmethod
+    async def averify_token(token):
+        payload = AuthService._decode(token)
         try:
-            payload = jwt.decode(token, settings.SIMPLE_JWT["SIGNING_KEY"], algorithms=[settings.SIMPLE_JWT["ALGORITHM"]])
-            return payload
-        except jwt.ExpiredSignatureError:
-            raise ValueError("Token has expired")
-        except jwt.InvalidTokenError:
+            current = await EndpointTokenRegistry.aversion(payload["endpoint_id"])
+        except (KeyError, Endpoint.DoesNotExist):
             raise ValueError("Invalid token")
+        return AuthService._check_version(payload, current)
+
     @staticmethod
+    def verify_endpoint(token, endpoint_id):
+        """
+        Verifies an endpoint credential (see encode(..., "endpoint")) for
+        endpoint_id; revoked by rotating the endpoint token version.
+        """
+        payload = AuthService.verify_token(token)
+        return AuthService._check_endpoint(payload, endpoint_id)
+
+    @staticmethod
+    async def averify_endpoint(token, endpoint_id):
+        payload = await AuthService.averify_token(token)
+        return AuthService._check_endpoint(payload, endpoint_id)
+
+    @staticmethod
+    def _check_endpoint(payload, endpoint_id):
+        # room tokens carry endpoint_id and ver too, so the type has to match
+        if payload.get("token_type") != "endpoint" or payload.get("endpoint_id") != endpoint_id:
+            raise ValueError("Invalid token")
+        return payload
+
+    @staticmethod
+    @timed("token")
+    def _decode(token):
+        payload = VerifiedTokenCache.get(token)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, settings.SIMPLE_JWT["SIGNING_KEY"], algorithms=[settings.SIMPLE_JWT["ALGORITHM"]])
+            except jwt.ExpiredSignatureError:
+                raise ValueError("Token has expired")
+            except jwt.InvalidTokenError:
+                raise ValueError("Invalid token")
+            VerifiedTokenCache.put(token, payload)
+            payload = dict(payload)
+        return payload
+
+    @staticmethod
+    def _check_version(payload, current):
+        # endpoint version is checked on every call so that change_token revokes cached tokens too
+        if payload.get("ver") != current:
+            raise ValueError("Token has been revoked")
+        return payload
+
+    @staticmethod
+    @timed("token")
     def encode(old_payload, case, dict={}):
         match case:
             case "challenge":
@@ -45,6 +114,7 @@ class AuthService:
                     "token_type": "challenge",
                     "room_num": old_payload["room_num"],
                     "endpoint_id": old_payload["endpoint_id"],
+                    "ver": old_payload["ver"] if "ver" in old_payload else EndpointTokenRegistry.version(old_payload["endpoint_id"]),
                     "exp": int((datetime.now() + timedelta(minutes=2)).timestamp())}
                 return jwt.encode(payload, settings.SIMPLE_JWT["SIGNING_KEY"], algorithm=settings.SIMPLE_JWT["ALGORITHM"])
             case "start":
@@ -53,7 +123,16 @@ class AuthService:
                     "token_type": "start",
                     "room_num": old_payload["room_num"],
                     "endpoint_id": old_payload["endpoint_id"],
-                    "appliance_name": old_payload["appliance_name"],
+                    "appliance_name": dict["appliance_name"],
+                    "ver": old_payload["ver"],
                     #timedelta is set to units + 1 minute for possible delays between start and finish requests
                     "exp": int((datetime.now() + timedelta(seconds=60+dict["units"])).timestamp())}
-                return jwt.encode(payload, settings.SIMPLE_JWT["SIGNING_KEY"], algorithm=settings.SIMPLE_JWT["ALGORITHM"])
\ No newline at end of file
+                return jwt.encode(payload, settings.SIMPLE_JWT["SIGNING_KEY"], algorithm=settings.SIMPLE_JWT["ALGORITHM"])
+            case "endpoint":
+                payload = {
+                    "iss"  : "Backend",
+                    "token_type": "endpoint",
+                    "endpoint_id": old_payload["endpoint_id"],
+                    "ver": old_payload["ver"] if "ver" in old_payload else EndpointTokenRegistry.version(old_payload["endpoint_id"]),
+                    "exp": int((datetime.now() + settings.ENDPOINT_TOKEN_LIFETIME).timestamp())}
+                return jwt.encode(payload, settings.SIMPLE_JWT["SIGNING_KEY"], algorithm=settings.SIMPLE_JWT["ALGORITHM"])
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = "default"
+
+
+class ReadConsistency:
+    """
+    Per-call hint where reads may go.
+
+    Reads go to the primary unless the caller opted in with
+    `with ReadConsistency.replica():` for a read-only path that tolerates
+    up to DATABASE_REPLICA_MAX_LAG seconds of staleness. primary() forces
+    the primary again inside such a block.
+    """
+
+    PRIMARY = "primary"
+    REPLICA = "replica"
+
+    _mode: contextvars.ContextVar[str] = contextvars.ContextVar("read_consistency", default=PRIMARY)
+
+    @classmethod
+    @contextmanager
+    def replica(cls):
+        token = cls._mode.set(cls.REPLICA)
+        try:
+            yield
+        finally:
+            cls._mode.reset(token)
+
+    @classmethod
+    @contextmanager
+    def primary(cls):
+        token = cls._mode.set(cls.PRIMARY)
+        try:
+            yield
+        finally:
+            cls._mode.reset(token)
+
+    @classmethod
+    def allows_replica(cls) -> bool:
+        return cls._mode.get() == cls.REPLICA
+
+
+class ReplicaRouter:
+    """
+    Sends opted-in reads (ReadConsistency.replica()) to a random replica
+    whose replication lag is under DATABASE_REPLICA_MAX_LAG; everything
+    else, and every read inside a transaction on the primary, goes to the
+    primary.
+
+    Lag is measured per replica at most every
+    DATABASE_REPLICA_LAG_CHECK_INTERVAL seconds per process; a replica
+    that cannot be queried counts as lagging until the next check.
+    Replicas are never migrated.
+    """
+
+    _lock = threading.Lock()
+    # alias -> (lag in seconds, monotonic time of the check)
+    _lag: dict[str, tuple[float, float]] = {}
+
+    @staticmethod
+    def replicas() -> list[str]:
+        return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+    @classmethod
+    def _measure(cls, alias: str) -> float:
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return 0.0
+        with connection.cursor() as cursor:
+            # an idle primary does not advance the replay timestamp, so only
+            # WAL received but not yet replayed counts as lag
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )
+            return float(cursor.fetchone()[0])
+
+    @classmethod
+    def lag(cls, alias: str) -> float:
+        now = time.monotonic()
+        cached = cls._lag.get(alias)
+        if cached is not None and now - cached[1] < settings.DATABASE_REPLICA_LAG_CHECK_INTERVAL:
+            return cached[0]
+        try:
+            lag = cls._measure(alias)
+        except DatabaseError as e:
+            logger.warning("Replica %s unavailable: %s", alias, e)
+            lag = float("inf")
+        with cls._lock:
+            cls._lag[alias] = (lag, now)
+        return lag
+
+    @classmethod
+    def healthy_replicas(cls) -> list[str]:
+        max_lag = settings.DATABASE_REPLICA_MAX_LAG
+        return [alias for alias in cls.replicas() if cls.lag(alias) <= max_lag]
+
+    def db_for_read(self, model, **hints):
+        if not ReadConsistency.allows_replica() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        healthy = self.healthy_replicas()
+        return random.choice(healthy) if healthy else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Fans events out to subscribers in this process.
+
+    publish() may be called from any thread (sync views run in a thread
+    pool under ASGI); events are handed to each subscriber's event loop.
+    A slow subscriber loses its oldest events instead of growing without
+    bound.
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: dict) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def publish(self, endpoint_id: int, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(endpoint_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    async def listen(self, endpoint_id: int, timeout: float):
+        """
+        Yields events for the endpoint, or None after timeout seconds
+        without one (for keep-alives).
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[endpoint_id].add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[endpoint_id].discard(subscriber)
+                if not self._subscribers[endpoint_id]:
+                    del self._subscribers[endpoint_id]
+
+
+class RedisBroker:
+    """
+    Redis pub/sub broker with the interface of InProcessBroker, for more
+    than one web process or events published from Celery workers.
+
+    Each process holds one Redis subscription (a pattern over all endpoint
+    channels, read by a daemon thread) and fans the messages out to its
+    stream subscribers through an InProcessBroker, so open streams do not
+    cost a Redis connection each.
+    """
+
+    CHANNEL = "endpoint-events:{}"
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, url: str) -> None:
+        self._client = redis.Redis.from_url(url)
+        self._local = InProcessBroker()
+        self._lock = threading.Lock()
+        self._reader: threading.Thread | None = None
+
+    def publish(self, endpoint_id: int, event: dict) -> None:
+        self._client.publish(self.CHANNEL.format(endpoint_id), json.dumps(event))
+
+    def listen(self, endpoint_id: int, timeout: float):
+        with self._lock:
+            if self._reader is None:
+                self._reader = threading.Thread(target=self._read, name="endpoint-events", daemon=True)
+                self._reader.start()
+        return self._local.listen(endpoint_id, timeout)
+
+    def _read(self) -> None:
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.CHANNEL.format("*"))
+                for message in pubsub.listen():
+                    self._dispatch(message)
+            except redis.RedisError:
+                logger.warning("Endpoint event subscription lost, reconnecting", exc_info=True)
+                time.sleep(self.RECONNECT_DELAY)
+            finally:
+                pubsub.close()
+
+    def _dispatch(self, message: dict) -> None:
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        endpoint_id = int(channel.rsplit(":", 1)[1])
+        self._local.publish(endpoint_id, json.loads(message["data"]))
+
+
+class EndpointEvents:
+    """
+    Start / finish / abort notifications pushed to endpoints.
+
+    Events are published only after the transaction that caused them
+    commits. The broker is in-process unless ENDPOINT_EVENTS_REDIS_URL is
+    set, which is only correct while emitters and listeners share one
+    process (runserver, a single ASGI worker); gunicorn with more workers
+    and Celery workers refuse to start without Redis.
+    """
+
+    START = "start"
+    FINISH = "finish"
+    ABORT = "abort"
+
+    _lock = threading.Lock()
+    _broker: InProcessBroker | RedisBroker | None = None
+
+    @classmethod
+    def broker(cls) -> InProcessBroker | RedisBroker:
+        with cls._lock:
+            if cls._broker is None:
+                url = settings.ENDPOINT_EVENTS_REDIS_URL
+                cls._broker = RedisBroker(url) if url else InProcessBroker()
+            return cls._broker
+
+    @classmethod
+    def emit(cls, endpoint_id: int, kind: str, **data) -> None:
+        event = {"type": kind, "endpoint_id": endpoint_id, **data}
+        # robust: a broker outage must not fail a request whose data is committed
+        transaction.on_commit(lambda: cls.broker().publish(endpoint_id, event), robust=True)
+
+    @classmethod
+    def listen(cls, endpoint_id: int, timeout: float):
+        return cls.broker().listen(endpoint_id, timeout)
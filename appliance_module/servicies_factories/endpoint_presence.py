@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, GenericIPAddressField, Value, When
+
+from appliance_module.model.endpoint import Endpoint
+
+
+class EndpointPresence:
+    """
+    Tracks which endpoints are online from their heartbeats.
+
+    A heartbeat only sets a key in the presence cache (ENDPOINT_PRESENCE_CACHE,
+    expiring after ENDPOINT_PRESENCE_TIMEOUT seconds), so neither beating
+    nor checking presence touches the database. Endpoint.connection /
+    ip_add are written in bulk by flush(), which the Celery beat task
+    flush_endpoint_presence runs every ENDPOINT_PRESENCE_FLUSH_INTERVAL
+    seconds. The presence cache has to be shared (Redis) with the workers.
+    """
+
+    KEY = "endpoint-presence:{}"
+
+    @staticmethod
+    def _cache():
+        return caches[settings.ENDPOINT_PRESENCE_CACHE]
+
+    @classmethod
+    def beat(cls, endpoint_id: int, ip: str | None) -> None:
+        cls._cache().set(cls.KEY.format(endpoint_id), ip or "", settings.ENDPOINT_PRESENCE_TIMEOUT)
+
+    @classmethod
+    async def abeat(cls, endpoint_id: int, ip: str | None) -> None:
+        await cls._cache().aset(cls.KEY.format(endpoint_id), ip or "", settings.ENDPOINT_PRESENCE_TIMEOUT)
+
+    @classmethod
+    def is_online(cls, endpoint_id: int) -> bool:
+        return cls._cache().get(cls.KEY.format(endpoint_id)) is not None
+
+    @classmethod
+    def flush(cls) -> tuple[int, int]:
+        """
+        Marks endpoints with a live heartbeat as connected (with their
+        latest IP) and endpoints whose presence expired as disconnected,
+        with one UPDATE each; rows that are already right are not written.
+
+        Returns:
+            (endpoints marked online, endpoints marked offline)
+        """
+        endpoints = list(Endpoint.objects.values_list("endpoint_id", "connection", "ip_add"))
+        present = cls._cache().get_many([cls.KEY.format(pk) for pk, _, _ in endpoints])
+
+        online = {}
+        gone = []
+        for pk, connected, ip_add in endpoints:
+            key = cls.KEY.format(pk)
+            if key in present:
+                ip = present[key] or None
+                if not connected or ip_add != ip:
+                    online[pk] = ip
+            elif connected:
+                gone.append(pk)
+
+        if online:
+            Endpoint.objects.filter(pk__in=online).update(
+                connection=True,
+                ip_add=Case(
+                    *(When(pk=endpoint_id, then=Value(ip)) for endpoint_id, ip in online.items()),
+                    output_field=GenericIPAddressField(),
+                ),
+            )
+        if gone:
+            Endpoint.objects.filter(pk__in=gone).update(connection=False)
+        return len(online), len(gone)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import csv
+import json
+from typing import Callable, Iterable
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, for csv.writer in
+    streaming responses.
+    """
+
+    def write(self, value):
+        return value
+
+
+def as_csv(columns: tuple[str, ...], rows: Iterable[tuple]):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def as_jsonl(columns: tuple[str, ...], rows: Iterable[tuple]):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+
+
+def formats(columns: tuple[str, ...], row: Callable = tuple) -> dict[str, tuple[Callable, str]]:
+    """
+    Streaming export formats: name -> (render, content type), where
+    render(items) yields the text chunks of the items turned into rows by
+    row(item).
+    """
+    return {
+        "csv": (lambda items: as_csv(columns, map(row, items)), "text/csv; charset=utf-8"),
+        "jsonl": (lambda items: as_jsonl(columns, map(row, items)), "application/x-ndjson"),
+    }
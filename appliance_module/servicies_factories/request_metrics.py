@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows; METRICS_DIR is set up by gunicorn, which needs POSIX anyway
+    fcntl = None
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram with one series per label value.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...], label: str = "route") -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._lock = threading.Lock()
+        # label value -> [per-bucket counts..., +Inf count, sum]
+        self._series: dict[str, list[float]] = {}
+
+    def observe(self, label_value: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> dict[str, list[float]]:
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    def render(self, snapshot: dict[str, list[float]] | None = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        if snapshot is None:
+            snapshot = self.snapshot()
+        for label_value, series in sorted(snapshot.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class RequestCost:
+    """
+    Costs accumulated while serving one request.
+    """
+
+    __slots__ = ("queries", "db", "token", "totp", "txn", "timing")
+
+    def __init__(self) -> None:
+        self.timing: set[str] = set()
+        self.queries = 0
+        self.db = 0.0
+        self.token = 0.0
+        self.totp = 0.0
+        self.txn = 0.0
+
+
+SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNTS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100)
+
+
+class RequestMetrics:
+    """
+    Per-route cost histograms of API requests, exported in Prometheus text
+    format.
+
+    MetricsMiddleware opens a RequestCost for each request in a context
+    variable (which asgiref carries into sync_to_async threads); the DB
+    execute wrapper and the timed() hooks add to it and the middleware
+    observes the totals when the response is ready. Outside a request
+    (Celery, management commands) the hooks cost one ContextVar lookup.
+
+    Values are per process unless METRICS_DIR is set: then every process
+    writes its histograms to its own file there at most every
+    METRICS_FLUSH_INTERVAL seconds and render() sums the files of all
+    processes, including exited ones, so counters never go back when a
+    scrape lands on another worker or a worker is recycled. The files of
+    exited workers are folded into one ACCUMULATED file by compact() (the
+    gunicorn master calls it from child_exit), so the number of files and
+    the cost of a scrape stay bounded.
+    """
+
+    current: contextvars.ContextVar[RequestCost | None] = contextvars.ContextVar(
+        "request_cost", default=None,
+    )
+
+    request_seconds = Histogram("api_request_seconds", "Request latency.", SECONDS)
+    db_queries = Histogram("api_db_queries", "SQL statements per request.", COUNTS)
+    db_seconds = Histogram("api_db_seconds", "Time in SQL statements per request.", SECONDS)
+    token_seconds = Histogram("api_token_seconds", "Time in JWT encode/decode per request.", SECONDS)
+    totp_seconds = Histogram("api_totp_seconds", "Time in TOTP verification per request.", SECONDS)
+    txn_seconds = Histogram(
+        "api_appliance_txn_seconds",
+        "Time in ApplianceService start/finish transactions per request.",
+        SECONDS,
+    )
+
+    HISTOGRAMS = (request_seconds, db_queries, db_seconds, token_seconds, totp_seconds, txn_seconds)
+
+    ACCUMULATED = "accumulated.json"
+
+    _flush_lock = threading.Lock()
+    _flushed_at: float = 0.0
+    # (pid, file); a new name after fork, so a reused pid never overwrites an exited worker
+    _file: tuple[int, Path] | None = None
+
+    @classmethod
+    def begin(cls) -> tuple[RequestCost, contextvars.Token]:
+        cost = RequestCost()
+        return cost, cls.current.set(cost)
+
+    @classmethod
+    def end(cls, route: str, cost: RequestCost, token: contextvars.Token, elapsed: float) -> None:
+        cls.current.reset(token)
+        cls.request_seconds.observe(route, elapsed)
+        cls.db_queries.observe(route, cost.queries)
+        cls.db_seconds.observe(route, cost.db)
+        if cost.token:
+            cls.token_seconds.observe(route, cost.token)
+        if cost.totp:
+            cls.totp_seconds.observe(route, cost.totp)
+        if cost.txn:
+            cls.txn_seconds.observe(route, cost.txn)
+        if settings.METRICS_DIR and time.monotonic() - cls._flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            cls.flush()
+
+    @classmethod
+    def _path(cls) -> Path:
+        pid = os.getpid()
+        directory = Path(settings.METRICS_DIR)
+        if cls._file is None or cls._file[0] != pid or cls._file[1].parent != directory:
+            cls._file = (pid, directory / f"{pid}-{secrets.token_hex(4)}.json")
+        return cls._file[1]
+
+    @classmethod
+    def flush(cls) -> None:
+        """
+        Writes this process's histograms to its file in METRICS_DIR.
+        """
+        if not settings.METRICS_DIR:
+            return
+        with cls._flush_lock:
+            cls._flushed_at = time.monotonic()
+            path = cls._path()
+            data = {histogram.name: histogram.snapshot() for histogram in cls.HISTOGRAMS}
+            temporary = path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(data))
+            os.replace(temporary, path)
+
+    @staticmethod
+    @contextmanager
+    def _locked(shared: bool):
+        """
+        Scrapes read the directory under a shared lock and compact() rewrites
+        it under an exclusive one, so a scrape never sees a worker both in
+        its own file and in ACCUMULATED, or in neither.
+        """
+        with open(Path(settings.METRICS_DIR) / ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _sum(paths) -> dict[str, dict[str, list[float]]]:
+        merged: dict[str, dict[str, list[float]]] = {}
+        for path in paths:
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, snapshot in data.items():
+                series = merged.setdefault(name, {})
+                for label_value, values in snapshot.items():
+                    total = series.get(label_value)
+                    series[label_value] = values if total is None else [a + b for a, b in zip(total, values)]
+        return merged
+
+    @classmethod
+    def _merged(cls) -> dict[str, dict[str, list[float]]]:
+        cls.flush()
+        with cls._locked(shared=True):
+            return cls._sum(Path(settings.METRICS_DIR).glob("*.json"))
+
+    @classmethod
+    def compact(cls, pid: int) -> None:
+        """
+        Adds the files of the exited process pid to ACCUMULATED and removes
+        them.
+        """
+        if not settings.METRICS_DIR:
+            return
+        directory = Path(settings.METRICS_DIR)
+        exited = list(directory.glob(f"{pid}-*.json"))
+        if not exited:
+            return
+        with cls._locked(shared=False):
+            accumulated = directory / cls.ACCUMULATED
+            data = cls._sum([accumulated, *exited])
+            temporary = accumulated.with_suffix(".tmp")
+            temporary.write_text(json.dumps(data))
+            os.replace(temporary, accumulated)
+            for path in exited:
+                path.unlink(missing_ok=True)
+
+    @classmethod
+    def render(cls) -> str:
+        merged = cls._merged() if settings.METRICS_DIR else {}
+        lines = []
+        for histogram in cls.HISTOGRAMS:
+            lines += histogram.render(merged.get(histogram.name, {}) if settings.METRICS_DIR else None)
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def execute_wrapper(cls, execute, sql, params, many, context):
+        cost = cls.current.get()
+        if cost is None:
+            return execute(sql, params, many, context)
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            cost.db += time.perf_counter() - began
+            cost.queries += 1
+
+    @classmethod
+    def install(cls, sender=None, connection=None, **kwargs) -> None:
+        """
+        connection_created receiver: counts statements of every connection.
+        """
+        if cls.execute_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(cls.execute_wrapper)
+
+
+def timed(kind: str):
+    """
+    Adds the run time of the decorated function to the current request's
+    cost under `kind` ("token", "totp" or "txn"). Nested timed calls of
+    the same kind are counted once.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            raise TypeError("timed() supports only synchronous functions")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cost = RequestMetrics.current.get()
+            if cost is None or kind in cost.timing:
+                return func(*args, **kwargs)
+            cost.timing.add(kind)
+            began = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                cost.timing.discard(kind)
+                setattr(cost, kind, getattr(cost, kind) + time.perf_counter() - began)
+
+        return wrapper
+
+    return decorator
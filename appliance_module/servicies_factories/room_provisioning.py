@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Iterable, NamedTuple
+
+import pyotp
+from django.conf import settings
+from django.db import transaction
+
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.roomtotp import RoomTOTP
+from .export_formats import formats
+
+
+COLUMNS = ("room", "status", "secret", "uri")
+
+
+class Provisioned(NamedTuple):
+    key: int
+    # created / rotated / secret added / unchanged
+    status: str
+    secret: str
+
+    @property
+    def uri(self) -> str:
+        """
+        otpauth:// provisioning URI, also the payload of the room's QR code.
+        """
+        return pyotp.TOTP(self.secret).provisioning_uri(name=f"Pokoj {self.key}", issuer_name=settings.TOTP_ISSUER)
+
+
+class RoomProvisioning:
+    """
+    Creates rooms and their TOTP secrets in bulk.
+
+    Everything runs in one transaction with a fixed number of statements
+    per batch: one lookup of existing rooms and secrets, one insert of new
+    rooms, one of their OPENING ledger entries and one upsert of secrets.
+    Per-object save() is avoided on purpose, so the post_save receivers
+    do not run; the OPENING entries are written here instead. TOTPVerifier
+    reads the secret on every verify, so a rotated one applies at once.
+    """
+
+    CREATED = "created"
+    ROTATED = "rotated"
+    SECRET_ADDED = "secret added"
+    UNCHANGED = "unchanged"
+
+    @classmethod
+    def provision(
+        cls,
+        keys: Iterable[int],
+        balance: int = 0,
+        rotate: bool = False,
+        batch_size: int | None = None,
+    ) -> list[Provisioned]:
+        """
+        Creates missing rooms with an opening balance and gives every room
+        a TOTP secret. Existing rooms keep their balance and, unless
+        rotate is set, their secret.
+
+        Returns:
+            One Provisioned per distinct key, in input order.
+        """
+        batch_size = batch_size or settings.ROOM_PROVISIONING_BATCH
+        keys = list(dict.fromkeys(keys))
+
+        provisioned = []
+        with transaction.atomic():
+            for offset in range(0, len(keys), batch_size):
+                provisioned += cls._batch(keys[offset:offset + batch_size], balance, rotate)
+        return provisioned
+
+    @classmethod
+    def _batch(cls, keys: list[int], balance: int, rotate: bool) -> list[Provisioned]:
+        existing = {
+            key: (room_id, secret)
+            for key, room_id, secret in Room.objects.filter(key__in=keys).values_list("key", "room_id", "roomtotp__secret")
+        }
+
+        created = Room.objects.bulk_create(Room(key=key, balance=balance) for key in keys if key not in existing)
+        RoomLedger.objects.bulk_create(
+            RoomLedger(room=room, amount=room.balance, kind=RoomLedger.Kind.OPENING) for room in created
+        )
+        created_ids = {room.key: room.room_id for room in created}
+
+        result = []
+        secrets = []
+        for key in keys:
+            if key in created_ids:
+                room_id, secret, status = created_ids[key], None, cls.CREATED
+            else:
+                room_id, secret = existing[key]
+                status = cls.UNCHANGED if secret and not rotate else cls.ROTATED if secret else cls.SECRET_ADDED
+            if status != cls.UNCHANGED:
+                secret = pyotp.random_base32()
+                secrets.append(RoomTOTP(room_id=room_id, secret=secret))
+            result.append(Provisioned(key, status, secret))
+
+        RoomTOTP.objects.bulk_create(
+            secrets, update_conflicts=True, unique_fields=["room"], update_fields=["secret"],
+        )
+        return result
+
+
+FORMATS = formats(COLUMNS, lambda room: (room.key, room.status, room.secret, room.uri))
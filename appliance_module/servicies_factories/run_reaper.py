@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.model.usage import DailyUsage
+from .endpoint_events import EndpointEvents
+
+
+class RunReaper:
+    """
+    Finalizes RUNNING runs whose start token has expired, e.g. because the
+    terminal lost power before calling finish.
+
+    A run expires GRACE seconds after created_at + inic_units, matching the
+    start token lifetime. Reaped runs are marked ABORTED and their state
+    row is freed. Policy CHARGE keeps the full reserved price, REFUND
+    returns it to the room.
+    """
+
+    CHARGE = "charge"
+    REFUND = "refund"
+
+    @staticmethod
+    def expired(now=None):
+        now = now or timezone.now()
+        grace = timedelta(seconds=settings.RUN_REAPER_GRACE)
+        run_time = ExpressionWrapper(
+            F("inic_units") * timedelta(seconds=1),
+            output_field=DurationField(),
+        )
+        # state=RUNNING matches the partial index runs_logs_running_idx
+        return (
+            RunsLog.objects
+            .filter(state=RunsLog.State.RUNNING)
+            .alias(ends_at=F("created_at") + run_time)
+            .filter(ends_at__lt=now - grace)
+        )
+
+    @staticmethod
+    def reap(policy: str | None = None, batch_size: int | None = None) -> int:
+        """
+        Reaps expired runs in batches until none are left.
+
+        Returns:
+            Number of runs finalized.
+        """
+        policy = policy or settings.RUN_REAPER_POLICY
+        batch_size = batch_size or settings.RUN_REAPER_BATCH
+        if policy not in (RunReaper.CHARGE, RunReaper.REFUND):
+            raise ValueError(f"Unknown reaper policy {policy!r}")
+
+        total = 0
+        while True:
+            reaped, seen = RunReaper._reap_batch(policy, batch_size)
+            total += reaped
+            if seen < batch_size or not reaped:
+                return total
+
+    @staticmethod
+    @transaction.atomic
+    def _reap_batch(policy: str, batch_size: int) -> tuple[int, int]:
+        now = timezone.now()
+        candidates = list(
+            RunReaper.expired(now)
+            .order_by("created_at")
+            .values_list("logid", flat=True)[:batch_size]
+        )
+        if not candidates:
+            return 0, 0
+
+        # state rows held by an in-flight finish are skipped and retried next run
+        states = EndpointApplianceStateRoom.objects.filter(log_id__in=candidates)
+        referenced = set(states.values_list("log_id", flat=True))
+        locked = set(
+            states.select_for_update(skip_locked=True).values_list("log_id", flat=True)
+        )
+        log_ids = locked | (set(candidates) - referenced)
+
+        runs = list(
+            RunsLog.objects
+            .select_for_update()
+            .filter(logid__in=log_ids, state=RunsLog.State.RUNNING)
+            .values_list("logid", "room_id", "appliance_id", "endpoint_id", "inic_units", "inic_price")
+        )
+        log_ids = [run[0] for run in runs]
+        if not log_ids:
+            return 0, len(candidates)
+
+        if policy == RunReaper.REFUND:
+            RunsLog.objects.filter(logid__in=log_ids).update(
+                state=RunsLog.State.ABORTED,
+                finished_at=now,
+                final_units=0,
+                final_price=0,
+            )
+            refunds = {}
+            for _, room_id, _, _, _, price in runs:
+                refunds[room_id] = refunds.get(room_id, 0) + price
+            Room.objects.credit_many(refunds)
+            RoomLedger.objects.bulk_create(
+                RoomLedger(room_id=room_id, amount=price, kind=RoomLedger.Kind.REFUND, log_id=logid)
+                for logid, room_id, _, _, _, price in runs
+                if price
+            )
+        else:
+            RunsLog.objects.filter(logid__in=log_ids).update(
+                state=RunsLog.State.ABORTED,
+                finished_at=now,
+                final_units=F("inic_units"),
+                final_price=F("inic_price"),
+            )
+
+        day = timezone.localdate(now)
+        charge = policy == RunReaper.CHARGE
+        DailyUsage.objects.record_many(
+            (day, room_id, appliance_id, endpoint_id, 1, 1,
+             units if charge else 0, price if charge else 0, 0 if charge else price)
+            for _, room_id, appliance_id, endpoint_id, units, price in runs
+        )
+
+        EndpointApplianceStateRoom.objects.filter(log_id__in=log_ids).update(
+            is_occupied=False,
+            room=None,
+            log=None,
+        )
+        for logid, _, appliance_id, endpoint_id, _, _ in runs:
+            EndpointEvents.emit(
+                endpoint_id, EndpointEvents.ABORT,
+                appliance_id=appliance_id, log_id=logid, units=0, reason="expired",
+            )
+        return len(log_ids), len(candidates)
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from appliance_module.model.runslog import RunsLog
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    """
+    First day of the month `shift` months after the month of `day`.
+    """
+    months = day.year * 12 + day.month - 1 + shift
+    return date(months // 12, months % 12 + 1, 1)
+
+
+class Partition(NamedTuple):
+    name: str
+    start: date
+    end: date
+
+
+class RunsLogPartitions:
+    """
+    Monthly range partitions of runs_logs (PostgreSQL only).
+
+    Each month lives in runs_logs_yYYYYmMM covering [start, next month)
+    in UTC; rows outside every range land in runs_logs_default. Partitions
+    are created RUNS_LOG_PARTITIONS_AHEAD months in advance by ensure(),
+    old ones are exported to gzip-compressed JSON lines and dropped by
+    archive(). If a month was missed, ensure() moves its rows out of the
+    default partition when it creates it.
+    """
+
+    DEFAULT = "runs_logs_default"
+    NAME_RE = re.compile(r"^runs_logs_y(\d{4})m(\d{2})$")
+
+    @staticmethod
+    def _connection():
+        return connections[router.db_for_write(RunsLog)]
+
+    @classmethod
+    def supported(cls) -> bool:
+        connection = cls._connection()
+        if connection.vendor != "postgresql":
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+                [RunsLog._meta.db_table],
+            )
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def name_for(month: date) -> str:
+        return f"runs_logs_y{month.year:04d}m{month.month:02d}"
+
+    @classmethod
+    def create_sql(cls, month: date) -> str:
+        qn = cls._connection().ops.quote_name
+        start, end = month_start(month), month_start(month, 1)
+        return (
+            f"CREATE TABLE IF NOT EXISTS {qn(cls.name_for(start))} "
+            f"PARTITION OF {qn(RunsLog._meta.db_table)} "
+            f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') "
+            f"TO ('{end.isoformat()} 00:00:00+00')"
+        )
+
+    @classmethod
+    def partitions(cls) -> list[Partition]:
+        with cls._connection().cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                """,
+                [RunsLog._meta.db_table],
+            )
+            names = [name for name, in cursor.fetchall()]
+
+        result = []
+        for name in names:
+            match = cls.NAME_RE.match(name)
+            if match:
+                start = date(int(match[1]), int(match[2]), 1)
+                result.append(Partition(name, start, month_start(start, 1)))
+        return sorted(result, key=lambda p: p.start)
+
+    @classmethod
+    def ensure(cls, months_ahead: int | None = None) -> list[str]:
+        """
+        Creates partitions from the current month up to months_ahead months
+        in advance, and for every month that already has rows in the
+        default partition (the month was missed).
+
+        Returns:
+            Names of the partitions that did not exist before.
+        """
+        if months_ahead is None:
+            months_ahead = settings.RUNS_LOG_PARTITIONS_AHEAD
+
+        existing = {p.name for p in cls.partitions()}
+        today = timezone.now().date()
+        months = {month_start(today, shift) for shift in range(months_ahead + 1)}
+        stranded = cls._default_months()
+        created = []
+        with cls._connection().cursor() as cursor:
+            for month in sorted(months | stranded):
+                if cls.name_for(month) in existing:
+                    continue
+                if month in stranded:
+                    cls._create_from_default(month)
+                else:
+                    cursor.execute(cls.create_sql(month))
+                created.append(cls.name_for(month))
+        return created
+
+    @classmethod
+    def _default_months(cls) -> set[date]:
+        """
+        Months (UTC) of the rows in the default partition.
+        """
+        qn = cls._connection().ops.quote_name
+        with cls._connection().cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+                f"FROM {qn(cls.DEFAULT)}"
+            )
+            return {month for month, in cursor.fetchall()}
+
+    @classmethod
+    def _create_from_default(cls, month: date) -> None:
+        """
+        Creates the partition of a month whose rows are in the default
+        partition: CREATE ... PARTITION OF would fail on them. The default
+        partition is detached, the partition created, the rows moved into
+        it and the default attached again, in one transaction; inserts
+        into runs_logs wait for it.
+        """
+        connection = cls._connection()
+        qn = connection.ops.quote_name
+        table, default = qn(RunsLog._meta.db_table), qn(cls.DEFAULT)
+        bounds = [datetime(d.year, d.month, 1, tzinfo=dt_timezone.utc) for d in (month, month_start(month, 1))]
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {default}")
+            cursor.execute(cls.create_sql(month))
+            cursor.execute(
+                f"INSERT INTO {table} SELECT * FROM {default} WHERE created_at >= %s AND created_at < %s",
+                bounds,
+            )
+            cursor.execute(f"DELETE FROM {default} WHERE created_at >= %s AND created_at < %s", bounds)
+            cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT")
+
+    @classmethod
+    def archive(
+        cls,
+        directory: str | os.PathLike | None = None,
+        retention_months: int | None = None,
+        dry_run: bool = False,
+    ) -> list[tuple[str, int]]:
+        """
+        Exports every partition that ended more than retention_months ago
+        to <directory>/<partition>.jsonl.gz and drops it.
+
+        Finished runs are never written again, so a partition is exported
+        without a lock and then detached, checked against the exported row
+        count and dropped in one short transaction. The file is only moved
+        into place once complete. Partitions that still contain RUNNING rows
+        are skipped.
+
+        Returns:
+            (partition, exported rows) for each archived partition.
+        """
+        directory = Path(directory or settings.RUNS_LOG_ARCHIVE_DIR)
+        if retention_months is None:
+            retention_months = settings.RUNS_LOG_RETENTION_MONTHS
+        cutoff = month_start(timezone.now().date(), -retention_months)
+
+        old = [p for p in cls.partitions() if p.end <= cutoff]
+        if dry_run:
+            return [(p.name, -1) for p in old]
+
+        directory.mkdir(parents=True, exist_ok=True)
+        archived = []
+        for partition in old:
+            rows = cls._archive_one(partition, directory)
+            if rows is not None:
+                archived.append((partition.name, rows))
+        return archived
+
+    @classmethod
+    def _archive_one(cls, partition: Partition, directory: Path) -> int | None:
+        connection = cls._connection()
+        qn = connection.ops.quote_name
+        table = qn(partition.name)
+        target = directory / f"{partition.name}.jsonl.gz"
+        partial = target.with_name(target.name + ".part")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT 1 FROM {table} WHERE state = %s LIMIT 1",
+                [RunsLog.State.RUNNING],
+            )
+            if cursor.fetchone():
+                return None
+
+        try:
+            rows = cls._export(connection, table, partial)
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                # DETACH locks the parent before the partition, like every
+                # other statement on runs_logs, so it cannot deadlock with them
+                cursor.execute(
+                    f"ALTER TABLE {qn(RunsLog._meta.db_table)} DETACH PARTITION {table}"
+                )
+                cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                if cursor.fetchone()[0] != rows:
+                    raise RuntimeError(f"{partition.name} changed while being archived")
+                os.replace(partial, target)
+                cursor.execute(f"DROP TABLE {table}")
+        finally:
+            partial.unlink(missing_ok=True)
+        return rows
+
+    @staticmethod
+    def _export(connection, table: str, path: Path) -> int:
+        rows = 0
+        # server-side cursor, the partition is streamed in fetchmany() chunks
+        cursor = connection.chunked_cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {table} ORDER BY logid")
+            columns = [col[0] for col in cursor.description]
+            with open(path, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb") as out:
+                    while chunk := cursor.fetchmany(2000):
+                        for row in chunk:
+                            record = dict(zip(columns, row))
+                            for key, value in record.items():
+                                if isinstance(value, datetime):
+                                    record[key] = value.astimezone(dt_timezone.utc).isoformat()
+                            out.write(json.dumps(record, separators=(",", ":")).encode())
+                            out.write(b"\n")
+                            rows += 1
+                raw.flush()
+                os.fsync(raw.fileno())
+        finally:
+            cursor.close()
+        return rows
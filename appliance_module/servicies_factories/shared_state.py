@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# caches whose state has to be the same in every web worker and Celery process
+SHARED_CACHES = ("ENDPOINT_PRESENCE_CACHE", "TOTP_REPLAY_CACHE", "ENDPOINT_TOKEN_CACHE")
+
+
+def cache_is_shared(alias: str) -> bool:
+    """
+    Whether the cache is visible to other processes (not LocMem / dummy).
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def process_local_state() -> list[str]:
+    """
+    Settings whose state currently stays inside one process: per-process
+    caches and the in-process endpoint event broker.
+    """
+    local = [name for name in SHARED_CACHES if not cache_is_shared(getattr(settings, name))]
+    if not settings.ENDPOINT_EVENTS_REDIS_URL:
+        local.append("ENDPOINT_EVENTS_REDIS_URL")
+    return local
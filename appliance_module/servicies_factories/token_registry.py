@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import QuerySet
+
+from appliance_module.model.endpoint import Endpoint
+from .db_router import ReadConsistency
+
+
+class EndpointTokenRegistry:
+    """
+    In-process table of endpoint token versions (Endpoint.token).
+
+    Tokens carry the version they were issued for; a token whose version
+    no longer matches has been revoked by Endpoint.change_token or
+    rotate(). Every change publishes the complete table to the shared
+    cache (ENDPOINT_TOKEN_CACHE) under a new generation; workers compare
+    the generation at most every ENDPOINT_TOKEN_SYNC_INTERVAL seconds and
+    adopt a newer table without touching the database. The table is also
+    reloaded from the database every TTL seconds, always from the primary
+    since replica reads may be stale. With more than one worker process
+    the cache has to be shared (Redis).
+    """
+
+    TTL = 30
+    GENERATION_KEY = "endpoint-token-generation"
+    VERSIONS_KEY = "endpoint-token-versions:{}"
+    # a published table only has to outlive the sync interval of every worker
+    PUBLISHED_TIMEOUT = 3600
+
+    _lock = threading.Lock()
+    _versions: dict[int, int] = {}
+    _loaded_at: float | None = None
+    _generation: str | None = None
+    _synced_at: float = 0.0
+
+    @staticmethod
+    def _cache():
+        return caches[settings.ENDPOINT_TOKEN_CACHE]
+
+    @classmethod
+    def refresh(cls, sender=None, instance: Endpoint | None = None, **kwargs) -> None:
+        """
+        Publishes the table after an endpoint was saved. Usable as a signal
+        receiver; without an instance the table is reloaded on next use.
+        """
+        if instance is None:
+            with cls._lock:
+                cls._loaded_at = None
+            return
+
+        transaction.on_commit(cls.publish)
+
+    @classmethod
+    def forget(cls, sender=None, instance: Endpoint | None = None, **kwargs) -> None:
+        with cls._lock:
+            if instance is not None:
+                cls._versions.pop(instance.endpoint_id, None)
+
+    @classmethod
+    def rotate(cls, endpoints: QuerySet[Endpoint] | None = None) -> dict[int, int]:
+        """
+        Rotates the token versions of endpoints (all when None) in one
+        UPDATE and publishes the new table once the transaction commits.
+
+        Returns:
+            endpoint_id -> new version.
+        """
+        if endpoints is None:
+            endpoints = Endpoint.objects.all()
+        versions = endpoints.rotate_tokens()
+        if versions:
+            transaction.on_commit(cls.publish)
+        return versions
+
+    @classmethod
+    def publish(cls) -> str:
+        """
+        Loads the table from the database, uses it in this process and
+        publishes it to the other workers in one step: the table is stored
+        under a new generation first, then the generation key is switched.
+
+        Returns:
+            The new generation.
+        """
+        with ReadConsistency.primary():
+            versions = dict(Endpoint.objects.values_list("endpoint_id", "token"))
+        generation = secrets.token_hex(8)
+        cache = cls._cache()
+        cache.set(cls.VERSIONS_KEY.format(generation), versions, cls.PUBLISHED_TIMEOUT)
+        cache.set(cls.GENERATION_KEY, generation, None)
+        cls._store(versions, generation)
+        return generation
+
+    @classmethod
+    def _fresh(cls) -> bool:
+        return cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls.TTL
+
+    @classmethod
+    def _sync_due(cls) -> bool:
+        return time.monotonic() - cls._synced_at >= settings.ENDPOINT_TOKEN_SYNC_INTERVAL
+
+    @classmethod
+    def _store(cls, versions: dict[int, int], generation: str | None) -> None:
+        now = time.monotonic()
+        with cls._lock:
+            cls._versions = versions
+            cls._loaded_at = now
+            cls._generation = generation
+            cls._synced_at = now
+
+    @classmethod
+    def _adopt(cls, generation: str | None, versions: dict[int, int] | None) -> bool:
+        """
+        Takes over a table published by another worker.
+
+        Returns:
+            False if the table has to be reloaded from the database.
+        """
+        if generation is None or generation == cls._generation:
+            cls._synced_at = time.monotonic()
+            return True
+        if versions is None:
+            return False
+        cls._store(versions, generation)
+        return True
+
+    @classmethod
+    def _remember(cls, endpoint_id: int, token: int | None) -> int:
+        if token is None:
+            raise Endpoint.DoesNotExist("Endpoint matching query does not exist.")
+        with cls._lock:
+            cls._versions[endpoint_id] = token
+        return token
+
+    @classmethod
+    def _load(cls) -> None:
+        if cls._fresh() and not cls._sync_due():
+            return
+        cache = cls._cache()
+        generation = cache.get(cls.GENERATION_KEY)
+        if cls._fresh():
+            versions = None
+            if generation is not None and generation != cls._generation:
+                versions = cache.get(cls.VERSIONS_KEY.format(generation))
+            if cls._adopt(generation, versions):
+                return
+        # read the generation first: a table published meanwhile is adopted on the next sync;
+        # always from the primary, a lagging replica's table would be kept under this generation
+        with ReadConsistency.primary():
+            cls._store(dict(Endpoint.objects.values_list("endpoint_id", "token")), generation)
+
+    @classmethod
+    def version(cls, endpoint_id: int) -> int:
+        """
+        Raises:
+            Endpoint.DoesNotExist: if the endpoint does not exist.
+        """
+        cls._load()
+        try:
+            return cls._versions[endpoint_id]
+        except KeyError:
+            pass
+
+        with ReadConsistency.primary():
+            token = Endpoint.objects.filter(pk=endpoint_id).values_list("token", flat=True).first()
+        return cls._remember(endpoint_id, token)
+
+    @classmethod
+    async def _aload(cls) -> None:
+        if cls._fresh() and not cls._sync_due():
+            return
+        cache = cls._cache()
+        generation = await cache.aget(cls.GENERATION_KEY)
+        if cls._fresh():
+            versions = None
+            if generation is not None and generation != cls._generation:
+                versions = await cache.aget(cls.VERSIONS_KEY.format(generation))
+            if cls._adopt(generation, versions):
+                return
+        with ReadConsistency.primary():
+            cls._store({
+                pk: token
+                async for pk, token in Endpoint.objects.values_list("endpoint_id", "token")
+            }, generation)
+
+    @classmethod
+    async def aversion(cls, endpoint_id: int) -> int:
+        await cls._aload()
+        try:
+            return cls._versions[endpoint_id]
+        except KeyError:
+            pass
+
+        with ReadConsistency.primary():
+            token = await Endpoint.objects.filter(pk=endpoint_id).values_list("token", flat=True).afirst()
+        return cls._remember(endpoint_id, token)
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already verified tokens, keyed by token digest.
+
+    An entry is used only until the token's exp; the endpoint version is
+    still checked on every hit, so revocation applies to cached tokens too.
+    """
+
+    MAX_ENTRIES = 10000
+
+    _lock = threading.Lock()
+    _cache: OrderedDict[bytes, dict] = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    @classmethod
+    def get(cls, token: str) -> dict | None:
+        key = cls._digest(token)
+        with cls._lock:
+            payload = cls._cache.get(key)
+            if payload is None:
+                return None
+            if payload["exp"] <= time.time():
+                del cls._cache[key]
+                return None
+            cls._cache.move_to_end(key)
+            return dict(payload)
+
+    @classmethod
+    def put(cls, token: str, payload: dict) -> None:
+        key = cls._digest(token)
+        with cls._lock:
+            cls._cache[key] = payload
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.MAX_ENTRIES:
+                cls._cache.popitem(last=False)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._cache.clear()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import time
+
+import pyotp
+from django.conf import settings
+from django.core.cache import caches
+from pyotp import utils
+
+from appliance_module.model.roomtotp import RoomTOTP
+from .request_metrics import timed
+
+
+class TOTPVerifier:
+    """
+    Verifies room TOTP codes with one joined query per login.
+
+    The query returns the secret with the room, so the TOTP is built from
+    it on every verify and a changed secret applies immediately. Accepted
+    time steps are recorded in TOTP_REPLAY_CACHE (one key per room and
+    step, added atomically), so a code cannot be used twice while it is
+    still inside valid_window, on another worker neither when the cache
+    is shared (Redis).
+    """
+
+    VALID_WINDOW = 1
+    # room, time step and code: a rotated secret gives a new code for the same step
+    USED_KEY = "totp-used:{}:{}:{}"
+
+    @classmethod
+    def verify(cls, room_num: int, code: int | str) -> int:
+        """
+        Checks code for the room and marks its time step as used.
+
+        Returns:
+            Current room balance.
+
+        Raises:
+            RoomTOTP.DoesNotExist: if the room or its secret does not exist.
+            ValueError: if the code is invalid or was already used.
+        """
+        used_key, timeout, balance = cls._check(cls._query(room_num).first(), code)
+        if not cls._used_cache().add(used_key, 1, timeout):
+            raise ValueError("Authorization code already used")
+        return balance
+
+    @classmethod
+    async def averify(cls, room_num: int, code: int | str) -> int:
+        used_key, timeout, balance = cls._check(await cls._query(room_num).afirst(), code)
+        if not await cls._used_cache().aadd(used_key, 1, timeout):
+            raise ValueError("Authorization code already used")
+        return balance
+
+    @staticmethod
+    def _used_cache():
+        return caches[settings.TOTP_REPLAY_CACHE]
+
+    @staticmethod
+    def _query(room_num: int):
+        return (
+            RoomTOTP.objects
+            .filter(room__key=room_num)
+            .values_list("room_id", "secret", "room__balance")
+        )
+
+    @classmethod
+    @timed("totp")
+    def _check(cls, row, code: int | str) -> tuple[str, int, int]:
+        """
+        Returns:
+            (replay key of the matched time step, seconds it has to be kept, balance)
+        """
+        if row is None:
+            raise RoomTOTP.DoesNotExist("RoomTOTP matching query does not exist.")
+        room_id, secret, balance = row
+
+        now = time.time()
+        totp = pyotp.TOTP(secret)
+        code = str(code).zfill(totp.digits)
+        current = int(now // totp.interval)
+
+        for offset in range(-cls.VALID_WINDOW, cls.VALID_WINDOW + 1):
+            if utils.strings_equal(code, totp.generate_otp(current + offset)):
+                matched = current + offset
+                break
+        else:
+            raise ValueError("Invalid authorization code")
+
+        # the step is accepted until it leaves the window of later steps
+        timeout = (matched - current + cls.VALID_WINDOW + 1) * totp.interval
+        return cls.USED_KEY.format(room_id, matched, code), timeout, balance
@@ -0,0 +1,22 @@
+from celery import shared_task
+
+from .servicies_factories.endpoint_presence import EndpointPresence
+from .servicies_factories.run_reaper import RunReaper
+from .servicies_factories.runs_partitions import RunsLogPartitions
+
+
+@shared_task(ignore_result=True)
+def reap_expired_runs() -> int:
+    return RunReaper.reap()
+
+
+@shared_task(ignore_result=True)
+def flush_endpoint_presence() -> tuple[int, int]:
+    return EndpointPresence.flush()
+
+
+@shared_task(ignore_result=True)
+def ensure_runs_partitions() -> list[str]:
+    if not RunsLogPartitions.supported():
+        return []
+    return RunsLogPartitions.ensure()
@@ -1,3 +1,374 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pyotp
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as dj_timezone
+
+from appliance_module.model.appliance import Appliance
+from appliance_module.model.endpoint import Endpoint
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from appliance_module.model.roomtotp import RoomTOTP
+from appliance_module.model.runslog import RunsLog
+from appliance_module.model.state import EndpointApplianceStateRoom
+from appliance_module.servicies_factories.appliance_catalog import ApplianceCatalog
+from appliance_module.servicies_factories.appliance_service import ApplianceService
+from appliance_module.servicies_factories.endpoint_events import EndpointEvents
+from appliance_module.servicies_factories.endpoint_presence import EndpointPresence
+from appliance_module.servicies_factories.run_reaper import RunReaper
+from appliance_module.servicies_factories.runs_partitions import RunsLogPartitions, month_start
+from appliance_module.servicies_factories.totp_verifier import TOTPVerifier
+
+
+class TOTPVerifierTests(TestCase):
+
+    def setUp(self):
+        caches[settings.TOTP_REPLAY_CACHE].clear()
+        self.room = Room.objects.create(key=101, balance=500)
+        self.totp = pyotp.TOTP(pyotp.random_base32())
+        RoomTOTP.objects.create(room=self.room, secret=self.totp.secret)
+
+    def test_valid_code_returns_balance(self):
+        self.assertEqual(TOTPVerifier.verify(101, self.totp.now()), 500)
+
+    def test_invalid_code_is_rejected(self):
+        wrong = str((int(self.totp.now()) + 1) % 1_000_000).zfill(6)
+        with self.assertRaisesMessage(ValueError, "Invalid authorization code"):
+            TOTPVerifier.verify(101, wrong)
+
+    def test_code_cannot_be_replayed(self):
+        code = self.totp.now()
+        TOTPVerifier.verify(101, code)
+        with self.assertRaisesMessage(ValueError, "already used"):
+            TOTPVerifier.verify(101, code)
+
+    def test_rotated_secret_applies_immediately(self):
+        rotated = pyotp.TOTP(pyotp.random_base32())
+        RoomTOTP.objects.filter(room=self.room).update(secret=rotated.secret)
+        self.assertEqual(TOTPVerifier.verify(101, rotated.now()), 500)
+
+    def test_unknown_room(self):
+        with self.assertRaises(RoomTOTP.DoesNotExist):
+            TOTPVerifier.verify(999, self.totp.now())
+
+
+class ApplianceCatalogTests(TestCase):
+
+    def setUp(self):
+        ApplianceCatalog.invalidate()
+        washer = Appliance.objects.create(name="washer", price_per_unit=5)
+        self.stale_row = (washer.appliance_id, "washer", 5)
+        Appliance.objects.filter(pk=washer.pk).update(price_per_unit=7)
+        self.current_rows = ApplianceCatalog._rows()
+
+    async def test_aget_never_loads_synchronously(self):
+        with mock.patch.object(ApplianceCatalog, "_load", side_effect=AssertionError("sync load")):
+            entry = await ApplianceCatalog.aget("washer")
+            self.assertEqual(entry.price_per_unit, 7)
+            with self.assertRaises(Appliance.DoesNotExist):
+                await ApplianceCatalog.aget("dryer")
+
+    async def test_aload_discards_rows_read_before_an_invalidation(self):
+        async def stale():
+            yield self.stale_row
+            # the price changes and is invalidated while the first load reads
+            ApplianceCatalog._drop()
+
+        with mock.patch.object(ApplianceCatalog, "_rows", side_effect=[stale(), self.current_rows]) as rows:
+            self.assertEqual((await ApplianceCatalog.aget("washer")).price_per_unit, 7)
+        self.assertEqual(rows.call_count, 2)
+
+
+class RoomLedgerTests(TestCase):
+
+    def setUp(self):
+        self.room = Room.objects.create(key=201, balance=1000)
+
+    def assertLedgerMatches(self, room):
+        room.refresh_from_db()
+        total = RoomLedger.objects.filter(room=room).aggregate(total=Sum("amount"))["total"]
+        self.assertEqual(total, room.balance)
+
+    def test_withdraw_and_deposit_are_recorded(self):
+        self.room.withdraw(300)
+        self.room.deposit(100)
+        self.assertEqual(self.room.balance, 800)
+        self.assertEqual(
+            list(RoomLedger.objects.filter(room=self.room).order_by("entry_id").values_list("kind", "amount")),
+            [(RoomLedger.Kind.OPENING, 1000), (RoomLedger.Kind.DEBIT, -300), (RoomLedger.Kind.REFUND, 100)],
+        )
+        self.assertLedgerMatches(self.room)
+
+    def test_insufficient_withdraw_records_nothing(self):
+        with self.assertRaisesMessage(RuntimeError, "Insufficient balance"):
+            self.room.withdraw(1001)
+        self.assertEqual(RoomLedger.objects.filter(room=self.room).count(), 1)
+        self.assertLedgerMatches(self.room)
+
+
+class RunReaperTests(TestCase):
+
+    def setUp(self):
+        self.appliance = Appliance.objects.create(name="washer", price_per_unit=5)
+        self.endpoint = Endpoint.objects.create()
+        EndpointApplianceStateRoom.objects.create(endpoint=self.endpoint, appliance=self.appliance)
+        EndpointPresence.beat(self.endpoint.endpoint_id, "127.0.0.1")
+        self.room = Room.objects.create(key=301, balance=1000)
+        ApplianceService.claim_start(
+            endpoint_id=self.endpoint.endpoint_id,
+            appliance_id=self.appliance.appliance_id,
+            room_num=301,
+            units=60,
+            price=300,
+        )
+        self.log = RunsLog.objects.get(room=self.room)
+
+    def expire(self):
+        RunsLog.objects.filter(pk=self.log.pk).update(created_at=dj_timezone.now() - timedelta(hours=1))
+
+    def assertStateFree(self):
+        state = EndpointApplianceStateRoom.objects.get(endpoint=self.endpoint, appliance=self.appliance)
+        self.assertFalse(state.is_occupied)
+        self.assertIsNone(state.log_id)
+
+    def test_refund_aborts_and_returns_the_price(self):
+        self.expire()
+        with mock.patch.object(EndpointEvents, "emit") as emit:
+            self.assertEqual(RunReaper.reap(policy=RunReaper.REFUND), 1)
+
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.state, RunsLog.State.ABORTED)
+        self.assertEqual((self.log.final_units, self.log.final_price), (0, 0))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.balance, 1000)
+        self.assertTrue(
+            RoomLedger.objects.filter(room=self.room, kind=RoomLedger.Kind.REFUND, amount=300, log=self.log).exists()
+        )
+        self.assertStateFree()
+        emit.assert_called_once_with(
+            self.endpoint.endpoint_id, EndpointEvents.ABORT,
+            appliance_id=self.appliance.appliance_id, log_id=self.log.pk, units=0, reason="expired",
+        )
+
+    def test_charge_keeps_the_price(self):
+        self.expire()
+        self.assertEqual(RunReaper.reap(policy=RunReaper.CHARGE), 1)
+
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.state, RunsLog.State.ABORTED)
+        self.assertEqual((self.log.final_units, self.log.final_price), (60, 300))
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.balance, 700)
+        self.assertFalse(RoomLedger.objects.filter(room=self.room, kind=RoomLedger.Kind.REFUND).exists())
+        self.assertStateFree()
+
+    def test_runs_within_their_time_are_kept(self):
+        self.assertEqual(RunReaper.reap(policy=RunReaper.REFUND), 0)
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.state, RunsLog.State.RUNNING)
+
+    def test_unknown_policy(self):
+        with self.assertRaisesMessage(ValueError, "Unknown reaper policy"):
+            RunReaper.reap(policy="keep")
+
+
+
+class EndpointPresenceTests(TestCase):
+
+    def setUp(self):
+        caches[settings.ENDPOINT_PRESENCE_CACHE].clear()
+        self.appliance = Appliance.objects.create(name="washer", price_per_unit=5)
+        self.endpoint = Endpoint.objects.create()
+        self.other = Endpoint.objects.create()
+        EndpointApplianceStateRoom.objects.create(endpoint=self.endpoint, appliance=self.appliance)
+        Room.objects.create(key=351, balance=1000)
+
+    def _start(self):
+        return ApplianceService.claim_start(
+            endpoint_id=self.endpoint.endpoint_id,
+            appliance_id=self.appliance.appliance_id,
+            room_num=351,
+            units=60,
+            price=300,
+        )
+
+    @override_settings(ENDPOINT_REQUIRE_PRESENCE=True)
+    def test_start_requires_a_heartbeat(self):
+        with self.assertRaisesMessage(RuntimeError, "Endpoint is offline"):
+            self._start()
+        self.assertFalse(RunsLog.objects.exists())
+
+        EndpointPresence.beat(self.endpoint.endpoint_id, "10.0.0.5")
+        self.assertEqual(self._start(), 700)
+
+    def assertConnections(self, expected):
+        self.assertEqual(
+            list(Endpoint.objects.order_by("endpoint_id").values_list("connection", "ip_add")), expected,
+        )
+
+    def test_flush_marks_endpoints_online_and_offline(self):
+        EndpointPresence.beat(self.endpoint.endpoint_id, "10.0.0.5")
+        EndpointPresence.beat(self.other.endpoint_id, "10.0.0.6")
+        self.assertEqual(EndpointPresence.flush(), (2, 0))
+        self.assertConnections([(True, "10.0.0.5"), (True, "10.0.0.6")])
+
+        # nothing changed, nothing written
+        with self.assertNumQueries(1):
+            self.assertEqual(EndpointPresence.flush(), (0, 0))
+
+        EndpointPresence.beat(self.endpoint.endpoint_id, "10.0.0.7")
+        caches[settings.ENDPOINT_PRESENCE_CACHE].delete(EndpointPresence.KEY.format(self.other.endpoint_id))
+        self.assertEqual(EndpointPresence.flush(), (1, 1))
+        self.assertConnections([(True, "10.0.0.7"), (False, "10.0.0.6")])
+
+
+
+class ClaimStartManyTests(TestCase):
+
+    def setUp(self):
+        self.endpoint = Endpoint.objects.create()
+        self.appliances = [Appliance.objects.create(name=f"washer-{i}", price_per_unit=1) for i in range(4)]
+        for appliance in self.appliances:
+            EndpointApplianceStateRoom.objects.create(endpoint=self.endpoint, appliance=appliance)
+        for key in (701, 702, 703):
+            Room.objects.create(key=key, balance=500)
+
+    def _op(self, appliance, room_num, price=200):
+        return {
+            "endpoint_id": self.endpoint.endpoint_id,
+            "appliance_id": appliance.appliance_id,
+            "room_num": room_num,
+            "units": 60,
+            "price": price,
+        }
+
+    def test_statements_do_not_grow_with_the_batch(self):
+        with CaptureQueriesContext(connection) as single:
+            ApplianceService.claim_start_many([self._op(self.appliances[0], 701)])
+        with CaptureQueriesContext(connection) as batch:
+            ApplianceService.claim_start_many([self._op(a, key) for a, key in zip(self.appliances[1:], (701, 702, 703))])
+        self.assertEqual(len(batch), len(single))
+        self.assertEqual(RunsLog.objects.count(), 4)
+        self.assertEqual(dict(Room.objects.values_list("key", "balance")), {701: 100, 702: 300, 703: 300})
+        for room in Room.objects.all():
+            total = RoomLedger.objects.filter(room=room).aggregate(total=Sum("amount"))["total"]
+            self.assertEqual(total, room.balance)
+        state = EndpointApplianceStateRoom.objects.get(appliance=self.appliances[3])
+        self.assertEqual((state.is_occupied, state.room.key, state.log.inic_price), (True, 703, 200))
+
+    def test_operations_fail_on_their_own(self):
+        results = ApplianceService.claim_start_many([
+            self._op(self.appliances[0], 701, price=300),
+            self._op(self.appliances[0], 702),
+            self._op(self.appliances[1], 701, price=300),
+            self._op(self.appliances[2], 999),
+        ])
+        self.assertEqual(results[0], 200)
+        self.assertEqual(
+            [str(result) for result in results[1:]],
+            ["Appliance already running", "Insufficient balance", "Room matching query does not exist."],
+        )
+        self.assertEqual(RunsLog.objects.count(), 1)
+        self.assertFalse(EndpointApplianceStateRoom.objects.get(appliance=self.appliances[1]).is_occupied)
+
+
+class LedgerReconciliationTests(TestCase):
+
+    def setUp(self):
+        self.room = Room.objects.create(key=401, balance=1000)
+        Room.objects.create(key=402, balance=0)
+        self.room.withdraw(250)
+        self.room.deposit(50)
+
+    def test_matching_ledger(self):
+        out = StringIO()
+        call_command("reconcile_ledger", stdout=out)
+        self.assertIn("All 2 rooms match the ledger", out.getvalue())
+
+    def test_reports_rooms_changed_outside_the_ledger(self):
+        Room.objects.filter(pk=self.room.pk).update(balance=F("balance") + 30)
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 of 2 rooms do not match the ledger"):
+            call_command("reconcile_ledger", stdout=out)
+        self.assertIn(f"Room {self.room.pk} (key=401): balance=830 ledger=800 diff=30", out.getvalue())
+
+
+@skipUnless(connection.vendor == "postgresql", "runs_logs is only partitioned on PostgreSQL")
+class RunsLogPartitionsTests(TransactionTestCase):
+    """
+    TransactionTestCase: the partition DDL runs in its own transactions,
+    as in the Celery task and archive_runs.
+    """
+
+    MONTH = datetime(2001, 1, 15, tzinfo=timezone.utc)
+    PARTITION = "runs_logs_y2001m01"
+
+    def setUp(self):
+        self.addCleanup(self._drop, self.PARTITION)
+        appliance = Appliance.objects.create(name="washer", price_per_unit=5)
+        endpoint = Endpoint.objects.create()
+        room = Room.objects.create(key=501, balance=0)
+        self.log = RunsLog.objects.create(
+            endpoint=endpoint, appliance=appliance, room=room, inic_units=60, inic_price=300,
+        )
+        # no partition covers 2001, so the row moves to runs_logs_default
+        RunsLog.objects.filter(pk=self.log.pk).update(
+            created_at=self.MONTH, state=RunsLog.State.FINISHED, final_units=60, final_price=300,
+        )
+
+    @staticmethod
+    def _drop(name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(name)}")
+
+    @staticmethod
+    def _count(table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def test_ensure_creates_upcoming_and_missed_months(self):
+        self.assertEqual(self._count(RunsLogPartitions.DEFAULT), 1)
+
+        created = RunsLogPartitions.ensure()
+
+        self.assertIn(self.PARTITION, created)
+        names = [p.name for p in RunsLogPartitions.partitions()]
+        today = dj_timezone.now().date()
+        for shift in range(settings.RUNS_LOG_PARTITIONS_AHEAD + 1):
+            self.assertIn(RunsLogPartitions.name_for(month_start(today, shift)), names)
+        self.assertEqual(self._count(self.PARTITION), 1)
+        self.assertEqual(self._count(RunsLogPartitions.DEFAULT), 0)
+        self.assertEqual(RunsLogPartitions.ensure(), [])
+
+    def test_archive_exports_and_drops_old_partitions(self):
+        RunsLogPartitions.ensure()
+        with tempfile.TemporaryDirectory() as directory:
+            archived = RunsLogPartitions.archive(directory=directory, retention_months=12)
+
+            self.assertIn((self.PARTITION, 1), archived)
+            with gzip.open(Path(directory) / f"{self.PARTITION}.jsonl.gz", "rt") as archive:
+                records = [json.loads(line) for line in archive]
+        self.assertEqual([record["logid"] for record in records], [self.log.pk])
+        self.assertNotIn(self.PARTITION, [p.name for p in RunsLogPartitions.partitions()])
+        self.assertFalse(RunsLog.objects.filter(pk=self.log.pk).exists())
+
+    def test_partitions_with_running_rows_are_kept(self):
+        RunsLogPartitions.ensure()
+        RunsLog.objects.filter(pk=self.log.pk).update(state=RunsLog.State.RUNNING)
+        with tempfile.TemporaryDirectory() as directory:
+            archived = RunsLogPartitions.archive(directory=directory, retention_months=12)
+        self.assertNotIn(self.PARTITION, [name for name, _ in archived])
+        self.assertTrue(RunsLog.objects.filter(pk=self.log.pk).exists())
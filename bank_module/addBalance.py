@@ -1,58 +1,122 @@
 import json
+import logging
 from decimal import Decimal
 from datetime import datetime,timezone
+from itertools import islice
 
-from django.db import transaction
+import ijson
+from django.db import connections, router, transaction
+from django.utils import timezone as dj_timezone
 
+from appliance_module.model.ledger import RoomLedger
 from appliance_module.model.room import Room
 from .models import ValidPayments, InvalidPayments
 
 
+logger = logging.getLogger(__name__)
+
+TRANSACTIONS_PATH = "accountStatement.transactionList.transaction.item"
+CHUNK_SIZE = 1000
+
+
 def update_rooms_from_json(json_str: str):
     parsed = json.loads(json_str)
     transactions = parsed.get("accountStatement", {}).get("transactionList", {}).get("transaction", [])
 
     if not transactions:
-        print("Žádné transakce.")
-        return
+        logger.info("Žádné transakce.")
+        return 0, 0, 0
+
+    valid, invalid, rooms = _ingest_chunk(transactions)
+
+    logger.info("Inserted valid=%s, invalid=%s, rooms updated=%s", valid, invalid, rooms)
+    return valid, invalid, rooms
+
+
+def update_rooms_from_stream(stream, chunk_size: int = CHUNK_SIZE):
+    """
+    Streaming variant of update_rooms_from_json for large statements.
+
+    The transaction array is parsed incrementally from a binary file-like
+    object and processed in chunks of chunk_size, each in its own
+    transaction, so memory does not depend on statement size. Re-running
+    after a failure is safe, already stored transaction ids are skipped.
+    """
+    return ingest_transactions(ijson.items(stream, TRANSACTIONS_PATH), chunk_size)
+
+
+def ingest_transactions(transactions, chunk_size: int = CHUNK_SIZE):
+    """
+    Processes an iterable of statement transactions in chunks.
+
+    Returns:
+        (valid payments, invalid payments, room updates)
+    """
+    transactions = iter(transactions)
+    valid = invalid = rooms = 0
+
+    while chunk := list(islice(transactions, chunk_size)):
+        chunk_valid, chunk_invalid, chunk_rooms = _ingest_chunk(chunk)
+        valid += chunk_valid
+        invalid += chunk_invalid
+        rooms += chunk_rooms
+
+    logger.info("Inserted valid=%s, invalid=%s, room updates=%s", valid, invalid, rooms)
+    return valid, invalid, rooms
+
 
+def _ingest_chunk(transactions) -> tuple[int, int, int]:
+    """
+    Deduplicates, credits rooms and stores payments for one batch of
+    statement transactions.
+
+    Payments are inserted with ON CONFLICT DO NOTHING and only the rows
+    actually inserted are credited, in one set-based UPDATE inside the
+    same transaction, so concurrent ingests of the same statement cannot
+    credit a payment twice.
+
+    Returns:
+        (valid payments, invalid payments, rooms updated)
+    """
     txn_ids = [
         str(txn.get("column22", {}).get("value"))
         for txn in transactions
         if txn.get("column22")
     ]
 
-    existing_ids = set(
-        ValidPayments.objects.filter(transaction_id__in=txn_ids)
-        .values_list("transaction_id", flat=True)
-    ) | set(
-        InvalidPayments.objects.filter(transaction_id__in=txn_ids)
-        .values_list("transaction_id", flat=True)
-    )
-
     vs_list = [
         str(txn.get("column5", {}).get("value"))
         for txn in transactions
         if txn.get("column5")
     ]
 
-    room_map = {
-        str(room.key): room
-        for room in Room.objects.select_for_update().filter(key__in=vs_list)
-    }
-
     valid_payments = []
     invalid_payments = []
-    deposits = {}
 
     with transaction.atomic():
 
+        existing_ids = set(
+            ValidPayments.objects.filter(transaction_id__in=txn_ids)
+            .values_list("transaction_id", flat=True)
+        ) | set(
+            InvalidPayments.objects.filter(transaction_id__in=txn_ids)
+            .values_list("transaction_id", flat=True)
+        )
+
+        room_map = {
+            str(key): room_id
+            for key, room_id in Room.objects.filter(key__in=vs_list).values_list("key", "room_id")
+        }
+
         for txn in transactions:
 
-            txn_id = str(txn.get("column22", {}).get("value"))
+            if not txn.get("column22"):
+                continue
+            txn_id = str(txn["column22"].get("value"))
 
-            if not txn_id or txn_id in existing_ids:
+            if txn_id in existing_ids:
                 continue
+            existing_ids.add(txn_id)
 
             amount = txn.get("column1", {}).get("value")
             vs = txn.get("column5", {}).get("value")
@@ -63,22 +127,19 @@ def update_rooms_from_json(json_str: str):
                 continue
 
             payment_time = datetime.fromtimestamp(
-                timestamp / 1000,
+                float(timestamp) / 1000,
                 tz=timezone.utc
             )
+            amount_cents = int(Decimal(str(amount)) * 100)
 
-            room = room_map.get(str(vs))
-
-            if room and currency == "CZK":
-                deposits.setdefault(room, 0)
-                amount_cents = int(Decimal(str(amount)) * 100)
-                deposits[room] += amount_cents
+            room_id = room_map.get(str(vs))
 
+            if room_id and currency == "CZK":
                 valid_payments.append(
                     ValidPayments(
                         transaction_id=txn_id,
                         amount=amount_cents,
-                        key=room,
+                        key_id=room_id,
                         payment_time=payment_time,
                     )
                 )
@@ -93,17 +154,62 @@ def update_rooms_from_json(json_str: str):
                     )
                 )
 
-        for room, total in deposits.items():
-            room.deposit(total)  
-
-        if valid_payments:
-            ValidPayments.objects.bulk_create(valid_payments)
+        deposits = _insert_valid_payments(valid_payments)
+        Room.objects.credit_many({room_id: total for room_id, (_, total) in deposits.items()})
 
         if invalid_payments:
-            InvalidPayments.objects.bulk_create(invalid_payments)
-
-    print(
-        f"Inserted valid={len(valid_payments)}, "
-        f"invalid={len(invalid_payments)}, "
-        f"rooms updated={len(deposits)}"
+            InvalidPayments.objects.bulk_create(invalid_payments, ignore_conflicts=True)
+
+    inserted = sum(count for count, _ in deposits.values())
+    return inserted, len(invalid_payments), len(deposits)
+
+
+def _insert_valid_payments(payments) -> dict[int, tuple[int, int]]:
+    """
+    Inserts payments, skipping transaction ids that already exist, and
+    records a ledger credit for each inserted one.
+
+    Returns:
+        room_id -> (inserted payments, inserted amount) for rows actually inserted.
+    """
+    if not payments:
+        return {}
+
+    connection = connections[router.db_for_write(ValidPayments)]
+    qn = connection.ops.quote_name
+    now = connection.ops.adapt_datetimefield_value(dj_timezone.now())
+
+    rows = []
+    params = []
+    # a stable order keeps concurrent ingests from deadlocking on the unique index
+    for payment in sorted(payments, key=lambda p: p.transaction_id):
+        rows.append("(%s, %s, %s, %s, %s)")
+        params += [
+            payment.transaction_id,
+            payment.amount,
+            payment.key_id,
+            connection.ops.adapt_datetimefield_value(payment.payment_time),
+            now,
+        ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(ValidPayments._meta.db_table)} "
+            f"(transaction_id, amount, key_id, payment_time, {qn('timestamp')}) "
+            f"VALUES {', '.join(rows)} "
+            f"ON CONFLICT (transaction_id) DO NOTHING "
+            f"RETURNING key_id, amount, transaction_id",
+            params,
+        )
+        inserted = cursor.fetchall()
+
+    RoomLedger.objects.bulk_create(
+        RoomLedger(room_id=room_id, amount=amount, kind=RoomLedger.Kind.CREDIT, reference=txn_id)
+        for room_id, amount, txn_id in inserted
     )
+
+    deposits = {}
+    for room_id, amount, _txn_id in inserted:
+        count, total = deposits.get(room_id, (0, 0))
+        deposits[room_id] = (count + 1, total + amount)
+    return deposits
@@ -1,3 +1,28 @@
 from django.contrib import admin
 
-# Register your models here.
+from appliance_module.admin import ReadOnlyAdmin
+from .models import BankFetchRun, InvalidPayments, ValidPayments
+
+
+@admin.register(ValidPayments)
+class ValidPaymentsAdmin(ReadOnlyAdmin):
+    list_display = ("transaction_id", "key", "amount", "payment_time", "timestamp")
+    list_select_related = ("key",)
+    search_fields = ("=transaction_id", "=key__key")
+    # validpay_time_idx
+    date_hierarchy = "payment_time"
+    ordering = ("-payment_time",)
+
+
+@admin.register(InvalidPayments)
+class InvalidPaymentsAdmin(ReadOnlyAdmin):
+    list_display = ("transaction_id", "key", "amount", "payment_time", "timestamp")
+    search_fields = ("=transaction_id", "=key")
+    ordering = ("-id",)
+
+
+@admin.register(BankFetchRun)
+class BankFetchRunAdmin(ReadOnlyAdmin):
+    list_display = ("started_at", "success", "fetched", "valid", "invalid", "duration_ms", "last_transaction_id")
+    list_filter = ("success",)
+    ordering = ("-id",)
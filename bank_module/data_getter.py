@@ -0,0 +1,105 @@
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import ijson
+import requests
+from celery import shared_task
+from django.conf import settings
+
+from .addBalance import TRANSACTIONS_PATH, ingest_transactions
+from .models import BankFetchRun
+
+
+def statement_url(date_from: date, date_to: date) -> str:
+    return (
+        f"{settings.BANK_API_URL}/periods/{settings.BANK_API_TOKEN}/"
+        f"{date_from:%Y-%m-%d}/{date_to:%Y-%m-%d}/transactions.json"
+    )
+
+
+def _redacted(message: str) -> str:
+    """
+    The API token is part of the URL path, which requests repeats in its
+    error messages.
+    """
+    if settings.BANK_API_TOKEN:
+        message = message.replace(settings.BANK_API_TOKEN, "***")
+    return message
+
+
+def _cursor() -> tuple[int | None, date]:
+    """
+    Last processed transaction id and date from the last successful run.
+    """
+    last = (
+        BankFetchRun.objects.filter(success=True)
+        .exclude(last_date=None)
+        .order_by("-id")
+        .first()
+    )
+    if last is None:
+        return None, date.today() - timedelta(days=settings.BANK_FETCH_INITIAL_DAYS)
+    return last.last_transaction_id, last.last_date
+
+
+@shared_task(ignore_result=True)
+def fetch_new_transactions() -> dict:
+    """
+    Fetches transactions newer than the persisted cursor and credits rooms.
+
+    The statement is requested from the cursor date (the bank filters by
+    day), transactions with id <= cursor id are dropped and the rest is
+    streamed into the chunked ingest. The cursor only moves on success;
+    a failed run is retried from the old cursor and deduplicated by id.
+    """
+    last_id, date_from = _cursor()
+    run = BankFetchRun.objects.create(last_transaction_id=last_id, last_date=date_from)
+    began = time.perf_counter()
+
+    def new_only(transactions):
+        for txn in transactions:
+            txn_id = txn.get("column22", {}).get("value")
+            if txn_id is None:
+                continue
+            if last_id is not None and int(txn_id) <= last_id:
+                continue
+
+            run.fetched += 1
+            run.last_transaction_id = max(run.last_transaction_id or 0, int(txn_id))
+            timestamp = txn.get("column0", {}).get("value")
+            if timestamp:
+                day = datetime.fromtimestamp(float(timestamp) / 1000, tz=timezone.utc).date()
+                run.last_date = max(run.last_date, day)
+            yield txn
+
+    try:
+        with requests.get(
+            statement_url(date_from, date.today()),
+            stream=True,
+            timeout=settings.BANK_API_TIMEOUT,
+        ) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            run.valid, run.invalid, _rooms = ingest_transactions(
+                new_only(ijson.items(response.raw, TRANSACTIONS_PATH))
+            )
+        run.success = True
+
+    except Exception as e:
+        run.error = _redacted(str(e))
+        # the original exception (and its traceback, logged by Celery) carries the token
+        raise RuntimeError(run.error) from None
+
+    finally:
+        run.duration_ms = int((time.perf_counter() - began) * 1000)
+        if not run.success:
+            run.last_transaction_id, run.last_date = last_id, date_from
+        run.save()
+
+    return {
+        "fetched": run.fetched,
+        "valid": run.valid,
+        "invalid": run.invalid,
+        "duration_ms": run.duration_ms,
+        "last_transaction_id": run.last_transaction_id,
+    }
@@ -0,0 +1,41 @@
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bank_module.room_statement import CHUNK_SIZE, FORMATS, statement_rows
+
+
+def _day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Streams a statement (charges, refunds, payments by time) for one room or all rooms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--room", type=int, help="Room key; all rooms when omitted.")
+        parser.add_argument("--since", type=_day, help="First day, YYYY-MM-DD.")
+        parser.add_argument("--until", type=_day, help="Last day, YYYY-MM-DD.")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", default="-", help="Output file, or - for stdout.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        render, _ = FORMATS[options["format"]]
+        rows = statement_rows(
+            room_key=options["room"],
+            since=options["since"],
+            until=options["until"],
+            chunk_size=options["chunk_size"],
+        )
+
+        if options["output"] == "-":
+            sys.stdout.writelines(render(rows))
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as out:
+            out.writelines(render(rows))
@@ -0,0 +1,44 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves a statement file as a local stand-in for the bank API: "
+        "every GET .../transactions.json returns the file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Statement file (accountStatement JSON).")
+        parser.add_argument("--port", type=int, default=8099)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if not self.path.endswith("/transactions.json"):
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as statement:
+                    body = statement.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                stdout.write(format % args)
+
+        server = ThreadingHTTPServer(("127.0.0.1", options["port"]), Handler)
+        self.stdout.write(f"Fake bank on http://127.0.0.1:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
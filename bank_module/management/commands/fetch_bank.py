@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from bank_module.data_getter import fetch_new_transactions
+
+
+class Command(BaseCommand):
+    help = "Runs one incremental bank fetch in the foreground (same code as the scheduled task)."
+
+    def handle(self, *args, **options):
+        result = fetch_new_transactions()
+        self.stdout.write(
+            f"fetched={result['fetched']} valid={result['valid']} "
+            f"invalid={result['invalid']} in {result['duration_ms']} ms "
+            f"(cursor={result['last_transaction_id']})"
+        )
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from bank_module.addBalance import CHUNK_SIZE, update_rooms_from_stream
+
+
+class Command(BaseCommand):
+    help = "Streams a bank statement (accountStatement JSON) from a file or stdin and credits rooms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Statement file, or - for stdin.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            valid, invalid, rooms = update_rooms_from_stream(sys.stdin.buffer, options["chunk_size"])
+        else:
+            with open(options["path"], "rb") as stream:
+                valid, invalid, rooms = update_rooms_from_stream(stream, options["chunk_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted valid={valid}, invalid={invalid}, room updates={rooms}"
+        ))
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_module', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankFetchRun',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('duration_ms', models.IntegerField(blank=True, null=True)),
+                ('success', models.BooleanField(default=False)),
+                ('fetched', models.IntegerField(default=0)),
+                ('valid', models.IntegerField(default=0)),
+                ('invalid', models.IntegerField(default=0)),
+                ('last_transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+        ),
+    ]
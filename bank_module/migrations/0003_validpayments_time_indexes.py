@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_module', '0002_bankfetchrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='validpayments',
+            index=models.Index(fields=['key', 'payment_time'], name='validpay_room_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='validpayments',
+            index=models.Index(fields=['payment_time'], name='validpay_time_idx'),
+        ),
+    ]
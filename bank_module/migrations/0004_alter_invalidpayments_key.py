@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank_module', '0003_validpayments_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invalidpayments',
+            name='key',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -9,6 +9,13 @@ class ValidPayments(models.Model):
     payment_time = models.DateTimeField(auto_now_add=False)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # time-ordered statement export, per room and for all rooms
+        indexes = [
+            models.Index(fields=["key", "payment_time"], name="validpay_room_time_idx"),
+            models.Index(fields=["payment_time"], name="validpay_time_idx"),
+        ]
+
     def __str__(self):
         return f"Payment of {self.amount} at {self.timestamp}"
 
@@ -21,4 +28,23 @@ class InvalidPayments(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Invalid Payment of {self.amount} at {self.timestamp} but really at {self.payment_time}"
\ No newline at end of file
+        return f"Invalid Payment of {self.amount} at {self.timestamp} but really at {self.payment_time}"
+
+class BankFetchRun(models.Model):
+    """
+    One run of the scheduled bank fetch. The last successful run holds
+    the cursor (last transaction id and date) for the next fetch.
+    """
+    id = models.AutoField(primary_key=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    duration_ms = models.IntegerField(null=True, blank=True)
+    success = models.BooleanField(default=False)
+    fetched = models.IntegerField(default=0)
+    valid = models.IntegerField(default=0)
+    invalid = models.IntegerField(default=0)
+    last_transaction_id = models.BigIntegerField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Bank fetch at {self.started_at}: fetched={self.fetched} success={self.success}"
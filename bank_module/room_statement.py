@@ -0,0 +1,88 @@
+import heapq
+from datetime import date, datetime, time
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils import timezone
+
+from appliance_module.model.runslog import RunsLog
+from appliance_module.servicies_factories.export_formats import formats
+from .models import ValidPayments
+
+
+COLUMNS = ("time", "room", "kind", "amount", "appliance", "units", "log_id", "transaction_id")
+CHUNK_SIZE = 2000
+
+
+def _start_of(day: date, shift: int = 0) -> datetime:
+    return timezone.make_aware(datetime.combine(date.fromordinal(day.toordinal() + shift), time.min))
+
+
+def _ordered(queryset, time_field, room_field, room_key, since, until):
+    if room_key is not None:
+        queryset = queryset.filter(**{f"{room_field}__key": room_key})
+    if since is not None:
+        queryset = queryset.filter(**{f"{time_field}__gte": _start_of(since)})
+    if until is not None:
+        queryset = queryset.filter(**{f"{time_field}__lt": _start_of(until, 1)})
+    return queryset.order_by(time_field)
+
+
+def statement_rows(room_key=None, since: date | None = None, until: date | None = None,
+                   chunk_size: int = CHUNK_SIZE):
+    """
+    Yields statement rows of one room (or all rooms) ordered by time:
+    run charges (created_at), refunds of unused price (finished_at) and
+    bank payments (payment_time). Amounts are in haléře, negative for
+    charges.
+
+    Each source is read through its own server-side cursor in chunk_size
+    batches and the three ordered streams are merged lazily, so memory
+    does not depend on the size of the export.
+    """
+    charges = _ordered(
+        RunsLog.objects, "created_at", "room", room_key, since, until,
+    ).values_list("created_at", "room__key", "inic_price", "appliance__name", "inic_units", "logid")
+    refunds = _ordered(
+        RunsLog.objects.filter(final_price__lt=F("inic_price")), "finished_at", "room", room_key, since, until,
+    ).values_list("finished_at", "room__key", "inic_price", "final_price", "appliance__name", "final_units", "logid")
+    payments = _ordered(
+        ValidPayments.objects, "payment_time", "key", room_key, since, until,
+    ).values_list("payment_time", "key__key", "amount", "transaction_id")
+
+    def charge_rows():
+        for created_at, key, price, appliance, units, logid in charges.iterator(chunk_size=chunk_size):
+            yield created_at, key, "charge", -price, appliance, units, logid, None
+
+    def refund_rows():
+        for finished_at, key, inic, final, appliance, units, logid in refunds.iterator(chunk_size=chunk_size):
+            yield finished_at, key, "refund", inic - (final or 0), appliance, units, logid, None
+
+    def payment_rows():
+        for paid_at, key, amount, txn_id in payments.iterator(chunk_size=chunk_size):
+            yield paid_at, key, "payment", amount, None, None, None, txn_id
+
+    return heapq.merge(charge_rows(), refund_rows(), payment_rows(), key=lambda row: row[0])
+
+
+def _formatted(row):
+    return (timezone.localtime(row[0]).isoformat(), *row[1:])
+
+
+FORMATS = formats(COLUMNS, _formatted)
+
+
+async def astream(chunks, batch_size: int = CHUNK_SIZE):
+    """
+    Async iterator over rendered statement chunks for the ASGI server.
+
+    Django drains a synchronous iterator into a list before sending it
+    from an ASGI handler, buffering the whole export. Here batch_size
+    chunks at a time are pulled through sync_to_async (always the same
+    thread, which owns the server-side cursors) and sent as they come.
+    """
+    iterator = iter(chunks)
+    pull = sync_to_async(lambda: list(islice(iterator, batch_size)))
+    while batch := await pull():
+        yield "".join(batch)
@@ -1,3 +1,105 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, datetime, timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from appliance_module.model.ledger import RoomLedger
+from appliance_module.model.room import Room
+from bank_module.addBalance import update_rooms_from_json, update_rooms_from_stream
+from bank_module.data_getter import fetch_new_transactions, statement_url
+from bank_module.models import BankFetchRun, InvalidPayments, ValidPayments
+
+
+def transaction(txn_id, vs, amount, currency="CZK"):
+    return {
+        "column22": {"value": txn_id},
+        "column0": {"value": int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000) + txn_id},
+        "column1": {"value": amount},
+        "column5": {"value": vs},
+        "column14": {"value": currency},
+    }
+
+
+def statement(*transactions):
+    return json.dumps({"accountStatement": {"transactionList": {"transaction": list(transactions)}}})
+
+
+class StatementIngestTests(TestCase):
+
+    def setUp(self):
+        self.room = Room.objects.create(key=101, balance=0)
+        self.other = Room.objects.create(key=102, balance=500)
+        self.statement = statement(
+            transaction(1, "101", 10.5),
+            transaction(2, "101", 2),
+            transaction(3, "102", 1.25),
+            transaction(4, "999", 3),
+            transaction(5, "101", 4, currency="EUR"),
+            transaction(6, "101", -7),
+        )
+
+    def assertCredited(self):
+        self.room.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.room.balance, self.other.balance), (1250, 625))
+        self.assertEqual(
+            sorted(ValidPayments.objects.values_list("transaction_id", "key__key", "amount")),
+            [("1", 101, 1050), ("2", 101, 200), ("3", 102, 125)],
+        )
+        self.assertEqual(sorted(InvalidPayments.objects.values_list("transaction_id", "key")), [("4", "999"), ("5", "101")])
+        for room in (self.room, self.other):
+            total = RoomLedger.objects.filter(room=room).aggregate(total=Sum("amount"))["total"]
+            self.assertEqual(total, room.balance)
+        self.assertEqual(
+            sorted(RoomLedger.objects.filter(kind=RoomLedger.Kind.CREDIT).values_list("reference", "amount")),
+            [("1", 1050), ("2", 200), ("3", 125)],
+        )
+
+    def test_credits_rooms_and_sorts_out_invalid_payments(self):
+        self.assertEqual(update_rooms_from_json(self.statement), (3, 2, 2))
+        self.assertCredited()
+
+    def test_repeated_statement_is_not_credited_twice(self):
+        update_rooms_from_json(self.statement)
+        self.assertEqual(update_rooms_from_json(self.statement), (0, 0, 0))
+        self.assertCredited()
+
+    def test_empty_statement(self):
+        self.assertEqual(update_rooms_from_json(statement()), (0, 0, 0))
+
+    def test_stream_in_chunks(self):
+        self.assertEqual(update_rooms_from_stream(BytesIO(self.statement.encode()), chunk_size=2), (3, 2, 2))
+        self.assertCredited()
+
+    def test_ingest_statement_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            file.write(self.statement)
+            file.flush()
+            out = StringIO()
+            call_command("ingest_statement", file.name, "--chunk-size", "100", stdout=out)
+        self.assertIn("Inserted valid=3, invalid=2, room updates=2", out.getvalue())
+        self.assertCredited()
+
+
+@override_settings(BANK_API_TOKEN="s3cret-token")
+class BankFetchTests(TestCase):
+
+    def test_failure_does_not_leak_the_token(self):
+        url = statement_url(date(2025, 1, 1), date(2025, 1, 2))
+        error = requests.HTTPError(f"404 Client Error: Not Found for url: {url}")
+        with mock.patch("bank_module.data_getter.requests.get", side_effect=error):
+            with self.assertRaises(RuntimeError) as raised:
+                fetch_new_transactions()
+
+        self.assertNotIn("s3cret-token", str(raised.exception))
+        self.assertIsNone(raised.exception.__cause__)
+        run = BankFetchRun.objects.get()
+        self.assertFalse(run.success)
+        self.assertIn("/periods/***/", run.error)
+        self.assertNotIn("s3cret-token", run.error)
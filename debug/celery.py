@@ -0,0 +1,27 @@
+import os
+
+from celery import Celery
+from celery.signals import worker_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'debug.settings')
+
+app = Celery('debug')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+app.autodiscover_tasks(related_name='data_getter')
+
+
+@worker_init.connect
+def require_shared_state(**kwargs):
+    # tasks run apart from the web workers: reaper events, presence flushes and token
+    # publications sent to per-process state would never reach them
+    from django.core.exceptions import ImproperlyConfigured
+
+    from appliance_module.servicies_factories.shared_state import process_local_state
+
+    local = process_local_state()
+    if local:
+        raise ImproperlyConfigured(
+            f"Celery workers need shared state, but {', '.join(local)} are per process; "
+            f"set PRESENCE_REDIS_URL and ENDPOINT_EVENTS_REDIS_URL"
+        )
@@ -0,0 +1,74 @@
+"""
+Production server: gunicorn pre-forking ASGI (uvicorn) workers.
+
+    gunicorn -c debug/gunicorn.conf.py debug.asgi:application
+
+Django is imported in the master before forking (preload_app), every
+worker then warms up its own connections and caches before it is handed
+connections; see debug/warmup.py. More than one worker is refused unless
+the caches and the event broker they share are in Redis (on_starting).
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# worker heartbeat; async workers keep beating while SSE streams are open
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then, jittered so they do not restart together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+# every worker writes its request metrics here so that /metrics sums all of them;
+# a fresh directory per master, the workers inherit it through the environment
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="prs1-metrics-"))
+
+accesslog = "-"
+loglevel = os.environ.get("DJANGO_LOGLEVEL", "info")
+
+
+def on_starting(server):
+    # presence, TOTP replay, token versions and endpoint events have to be shared
+    # between workers; with per-process state only one worker is safe
+    from appliance_module.servicies_factories.shared_state import process_local_state
+
+    local = process_local_state()
+    if server.cfg.workers > 1 and local:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need shared state, but {', '.join(local)} "
+            f"are per process; set PRESENCE_REDIS_URL and ENDPOINT_EVENTS_REDIS_URL "
+            f"or WEB_CONCURRENCY=1"
+        )
+
+
+def post_fork(server, worker):
+    # connections opened in the master must not be shared with the workers
+    from django.db import connections
+
+    connections.close_all()
+
+
+def worker_exit(server, worker):
+    # the last observations of a recycled worker still count
+    from appliance_module.servicies_factories.request_metrics import RequestMetrics
+
+    RequestMetrics.flush()
+
+
+def child_exit(server, worker):
+    # fold the exited worker's metrics file into the accumulated one (runs in the master)
+    from appliance_module.servicies_factories.request_metrics import RequestMetrics
+
+    RequestMetrics.compact(worker.pid)
+
+
+def post_worker_init(worker):
+    from debug.warmup import warm_up
+
+    worker.log.info("Worker %s warmed up in %.3fs", worker.pid, warm_up())
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,13 +22,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "tohleprostenefunguje"
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', 'False') == 'True'
 
-ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
+# SECURITY WARNING: keep the secret key used in production secret!
+# Only a DEBUG run falls back to the development key; production fails closed.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY') or ("tohleprostenefunguje" if DEBUG else None)
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY (or DEBUG=True for development)")
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
 
 # Application definition
@@ -49,19 +55,104 @@ REST_FRAMEWORK = {
 }
 SIMPLE_JWT = {"ACCESS_TOKEN_LIFETIME": timedelta(minutes = 5),
               "ALGORITHM": "HS256",
-              "SIGNING_KEY": "tohlenedelej",}
-#CELERY_BEAT_SCHEDULE = {
-#    'fetch-api-data-every-30-seconds': {
-#        'task': 'bank_module.data_getter.fetch_data_from_api',
-#        'schedule': 30.0,
-#       'args': ('http://example.com/api/data',)
-#   },
-#}
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+              "SIGNING_KEY": os.environ.get('JWT_SIGNING_KEY') or SECRET_KEY,}
+BANK_API_URL = os.environ.get('BANK_API_URL', 'https://fioapi.fio.cz/v1/rest')
+BANK_API_TOKEN = os.environ.get('BANK_API_TOKEN', '')
+BANK_API_TIMEOUT = 30
+BANK_FETCH_INTERVAL = float(os.environ.get('BANK_FETCH_INTERVAL', 60))
+BANK_FETCH_INITIAL_DAYS = 7
+
+# abandoned RUNNING runs: policy 'refund' returns the reserved price, 'charge' keeps it
+RUN_REAPER_POLICY = os.environ.get('RUN_REAPER_POLICY', 'refund')
+RUN_REAPER_GRACE = 60
+RUN_REAPER_BATCH = 500
+RUN_REAPER_INTERVAL = 30.0
+
+# Endpoint heartbeats: presence lives in this cache, Endpoint.connection/ip_add
+# are flushed in bulk by a beat task. Use a shared (Redis) cache with more than one process.
+ENDPOINT_PRESENCE_CACHE = 'presence'
+ENDPOINT_PRESENCE_TIMEOUT = 30
+ENDPOINT_PRESENCE_FLUSH_INTERVAL = 10.0
+# reject starts on endpoints without a recent heartbeat; on by default only with a
+# shared presence cache, a per-process one would see each worker's own beats only
+ENDPOINT_REQUIRE_PRESENCE = os.environ.get(
+    'ENDPOINT_REQUIRE_PRESENCE', '1' if os.environ.get('PRESENCE_REDIS_URL') else '0'
+) == '1'
+# endpoint credentials (heartbeat, event stream) from manage.py issue_endpoint_tokens;
+# rotating the endpoint token version revokes them early
+ENDPOINT_TOKEN_LIFETIME = timedelta(days=365)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'presence': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+         'LOCATION': os.environ['PRESENCE_REDIS_URL']}
+        if os.environ.get('PRESENCE_REDIS_URL') else
+        {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+         'LOCATION': 'endpoint-presence'}
+    ),
+}
+
+# accepted TOTP time steps (replay protection); shared with presence, so Redis with
+# more than one process, otherwise a code can be reused once per worker
+TOTP_REPLAY_CACHE = ENDPOINT_PRESENCE_CACHE
+
+# endpoint token versions are published to other workers through this cache (shared
+# with presence, so Redis with more than one process) and picked up within the interval
+ENDPOINT_TOKEN_CACHE = ENDPOINT_PRESENCE_CACHE
+ENDPOINT_TOKEN_SYNC_INTERVAL = 1.0
+
+# start/finish/abort push to endpoints; in-process unless a Redis URL is given
+ENDPOINT_EVENTS_REDIS_URL = os.environ.get('ENDPOINT_EVENTS_REDIS_URL', '')
+ENDPOINT_EVENTS_KEEPALIVE = 15
+
+# runs_logs monthly partitions (PostgreSQL): created ahead, archived after retention
+RUNS_LOG_PARTITIONS_AHEAD = 2
+RUNS_LOG_RETENTION_MONTHS = int(os.environ.get('RUNS_LOG_RETENTION_MONTHS', 12))
+RUNS_LOG_ARCHIVE_DIR = os.environ.get('RUNS_LOG_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'runs_logs'))
+
+# issuer shown in authenticator apps for provisioned room secrets
+TOTP_ISSUER = os.environ.get('TOTP_ISSUER', 'PRS1')
+ROOM_PROVISIONING_BATCH = 1000
+
+# /metrics (Prometheus); scrapers must send METRICS_TOKEN as a bearer token, without
+# it the endpoint is open only with DEBUG
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# directory where every worker process writes its histograms so that /metrics sums all
+# of them (gunicorn sets one up); empty = values of the answering process only
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 1.0
+
+CELERY_BEAT_SCHEDULE = {
+    'fetch-bank-transactions': {
+        'task': 'bank_module.data_getter.fetch_new_transactions',
+        'schedule': BANK_FETCH_INTERVAL,
+        'options': {'expires': BANK_FETCH_INTERVAL},
+    },
+    'reap-expired-runs': {
+        'task': 'appliance_module.tasks.reap_expired_runs',
+        'schedule': RUN_REAPER_INTERVAL,
+        'options': {'expires': RUN_REAPER_INTERVAL},
+    },
+    'flush-endpoint-presence': {
+        'task': 'appliance_module.tasks.flush_endpoint_presence',
+        'schedule': ENDPOINT_PRESENCE_FLUSH_INTERVAL,
+        'options': {'expires': ENDPOINT_PRESENCE_FLUSH_INTERVAL},
+    },
+    'ensure-runs-partitions': {
+        'task': 'appliance_module.tasks.ensure_runs_partitions',
+        'schedule': 24 * 3600.0,
+    },
+}
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER') == '1'
 
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,17 +185,56 @@ WSGI_APPLICATION = 'debug.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_ENGINE takes a full backend path or a short name (postgresql, sqlite3);
+# the old postgresql_psycopg2 alias is the postgresql backend.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'postgresql')
+if DATABASE_ENGINE == 'postgresql_psycopg2':
+    DATABASE_ENGINE = 'postgresql'
+if '.' not in DATABASE_ENGINE:
+    DATABASE_ENGINE = f'django.db.backends.{DATABASE_ENGINE}'
+
 DATABASES = {
-     'default': 
-     {
-        'ENGINE': 'django.db.backends.postgresql', 
-        'NAME': 'debug_db',
-        'USER': 'debug_dbuser',
-        'PASSWORD': 'debug_dbpassword',
-        'HOST': 'localhost',          # use 'localhost' if not running docker
-        'PORT': '5432',
+    'default': {
+        'ENGINE': DATABASE_ENGINE,
+        'NAME': os.environ.get('DATABASE_NAME', 'debug_db'),
+        'USER': os.environ.get('DATABASE_USERNAME', 'debug_dbuser'),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'debug_dbpassword'),
+        'HOST': os.environ.get('DATABASE_HOST', 'localhost'),          # 'db' in docker compose
+        'PORT': os.environ.get('DATABASE_PORT', '5432'),
+        # persistent connections (seconds, 0 = one per request); checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# psycopg 3 connection pool per process, DATABASE_POOL_MAX_SIZE > 0 enables it.
+# Use it instead of CONN_MAX_AGE under ASGI, where requests run in changing threads;
+# CONN_HEALTH_CHECKS makes the pool check a connection before handing it out.
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', 0))
+if DATABASE_POOL_MAX_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            'max_idle': 300,
+        },
+    }
+
+# Read replicas as host[:port],... ; only reads opted in with ReadConsistency.replica()
+# go there, and only while a replica lags less than DATABASE_REPLICA_MAX_LAG seconds.
+for number, address in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
     }
- }
+DATABASE_ROUTERS = ['appliance_module.servicies_factories.db_router.ReplicaRouter']
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 2.0))
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = 5.0
 
 
 # Password validation
@@ -0,0 +1,51 @@
+"""
+Per-process warm-up run by the production server before a worker takes
+traffic (see debug/gunicorn.conf.py).
+
+Everything the first requests of a fresh worker would otherwise pay for:
+opening the database connection (or filling the pool), importing the
+URLconf and views, loading the appliance catalog and endpoint token
+versions, and the first JWT encode/decode.
+"""
+import time
+
+import jwt
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.urls import get_resolver
+
+from appliance_module.servicies_factories.appliance_catalog import ApplianceCatalog
+from appliance_module.servicies_factories.token_registry import EndpointTokenRegistry
+
+
+def warm_up() -> float:
+    """
+    Returns:
+        Seconds the warm-up took.
+    """
+    began = time.perf_counter()
+
+    # imports the URLconf and with it every view module
+    get_resolver().url_patterns
+
+    _prime_database()
+
+    signing_key = settings.SIMPLE_JWT["SIGNING_KEY"]
+    algorithm = settings.SIMPLE_JWT["ALGORITHM"]
+    jwt.decode(jwt.encode({"iss": "warmup"}, signing_key, algorithm=algorithm), signing_key, algorithms=[algorithm])
+
+    caches[settings.ENDPOINT_PRESENCE_CACHE].get("warmup")
+
+    return time.perf_counter() - began
+
+
+def _prime_database() -> None:
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    ApplianceCatalog.items()
+    EndpointTokenRegistry._load()
+    # requests run in other threads; with a pool this hands the connection
+    # back for them, without one it is not kept open idle
+    connections.close_all()